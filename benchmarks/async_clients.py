@@ -0,0 +1,108 @@
+"""Measures the throughput and latency of `AsyncStorageEngine` with many concurrent clients, for each durability policy.
+
+Usage: python -m benchmarks.async_clients [--nb-clients C] [--nb-operations-per-client N] [--read-ratio R]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+from contextlib import redirect_stdout
+from time import perf_counter
+
+from benchmarks.utils import summarize_latencies, temporary_store_directory
+from src.async_storage_engine import AsyncStorageEngine
+from src.io_handling.durability import DurabilityPolicy
+from src.storage_engine import StorageEngine
+
+
+async def run_client(
+    database: AsyncStorageEngine,
+    client_id: int,
+    nb_operations: int,
+    read_ratio: float,
+    value: bytes,
+    latencies: list[float],
+) -> None:
+    randomizer = random.Random(client_id)
+    for i in range(nb_operations):
+        key = f"key-{client_id}-{randomizer.randrange(max(i, 1))}"
+        start = perf_counter()
+        if randomizer.random() < read_ratio:
+            await database.get(key=key)
+        else:
+            await database.put(key=key, value=value)
+        latencies.append(perf_counter() - start)
+
+
+async def run(
+    durability_policy: DurabilityPolicy,
+    nb_clients: int,
+    nb_operations_per_client: int,
+    read_ratio: float,
+    value_size: int,
+) -> dict:
+    value = b"v" * value_size
+    latencies = []
+
+    # The boot up logs of the engine must not be mixed with the JSON results
+    with temporary_store_directory() as directory, redirect_stdout(sys.stderr):
+        storage_engine = StorageEngine(
+            directory=directory,
+            max_file_size=64 * 1024 * 1024,
+            durability_policy=durability_policy,
+        )
+        async with AsyncStorageEngine(storage_engine=storage_engine) as database:
+            start = perf_counter()
+            await asyncio.gather(
+                *(
+                    run_client(
+                        database=database,
+                        client_id=client_id,
+                        nb_operations=nb_operations_per_client,
+                        read_ratio=read_ratio,
+                        value=value,
+                        latencies=latencies,
+                    )
+                    for client_id in range(nb_clients)
+                )
+            )
+            duration = perf_counter() - start
+
+    nb_operations = nb_clients * nb_operations_per_client
+    return {
+        "durability_policy": durability_policy.value,
+        "nb_clients": nb_clients,
+        "nb_operations": nb_operations,
+        "read_ratio": read_ratio,
+        "operations_per_second": round(nb_operations / duration, 1),
+        **summarize_latencies(latencies),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nb-clients", type=int, default=64)
+    parser.add_argument("--nb-operations-per-client", type=int, default=200)
+    parser.add_argument("--read-ratio", type=float, default=0.5)
+    parser.add_argument("--value-size", type=int, default=100)
+    args = parser.parse_args()
+
+    results = [
+        asyncio.run(
+            run(
+                durability_policy=durability_policy,
+                nb_clients=args.nb_clients,
+                nb_operations_per_client=args.nb_operations_per_client,
+                read_ratio=args.read_ratio,
+                value_size=args.value_size,
+            )
+        )
+        for durability_policy in DurabilityPolicy
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Measures the throughput (records per second) of the record codec: encoding and decoding data file and hint file items.
+
+Usage: python -m benchmarks.codec [--nb-records 100000] [--value-size 100] [--repeat 5]
+"""
+
+import argparse
+import json
+from time import perf_counter
+
+from src.io_handling.data_file import DataFileItem
+from src.io_handling.hint_file import HintFileItem
+
+
+def best_records_per_second(operation, nb_records: int, repeat: int) -> float:
+    """Runs `operation` `repeat` times, and returns the throughput of the fastest run."""
+    best_duration = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        operation()
+        best_duration = min(best_duration, perf_counter() - start)
+    return round(nb_records / best_duration)
+
+
+def run(nb_records: int, value_size: int, repeat: int) -> dict:
+    items = [
+        DataFileItem(
+            key=f"key-{i:012d}", value=b"v" * value_size, timestamp=1_700_000_000
+        )
+        for i in range(nb_records)
+    ]
+    hint_items = [
+        HintFileItem(
+            key=item.key,
+            timestamp=item.timestamp,
+            value_size=item.value_size,
+            value_position=i * item.size + item.value_position,
+        )
+        for i, item in enumerate(items)
+    ]
+    buffer = bytearray(sum(item.size for item in items))
+    hint_buffer = bytearray(sum(item.size for item in hint_items))
+
+    def encode_to_bytes():
+        for item in items:
+            item.to_bytes()
+
+    def encode_into_buffer():
+        offset = 0
+        for item in items:
+            offset = item.pack_into(buffer, offset)
+
+    def decode_from_buffer():
+        offset = 0
+        for _ in range(nb_records):
+            item = DataFileItem.unpack_from(buffer, offset)
+            offset += item.size
+
+    def decode_values_from_buffer():
+        offset = 0
+        for item in items:
+            DataFileItem.decode_value(buffer, offset)
+            offset += item.size
+
+    def encode_hints_into_buffer():
+        offset = 0
+        for hint_item in hint_items:
+            offset = hint_item.pack_into(hint_buffer, offset)
+
+    def decode_hints_from_buffer():
+        offset = 0
+        for _ in range(nb_records):
+            offset += HintFileItem.unpack_from(hint_buffer, offset).size
+
+    operations = {
+        "data_encode_to_bytes": encode_to_bytes,
+        "data_encode_pack_into": encode_into_buffer,
+        "data_decode_unpack_from": decode_from_buffer,
+        "data_decode_value": decode_values_from_buffer,
+        "hint_encode_pack_into": encode_hints_into_buffer,
+        "hint_decode_unpack_from": decode_hints_from_buffer,
+    }
+    return {
+        "nb_records": nb_records,
+        "value_size": value_size,
+        "records_per_second": {
+            name: best_records_per_second(
+                operation=operation, nb_records=nb_records, repeat=repeat
+            )
+            for name, operation in operations.items()
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nb-records", type=int, default=100_000)
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        json.dumps(
+            run(
+                nb_records=args.nb_records,
+                value_size=args.value_size,
+                repeat=args.repeat,
+            ),
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Measures write throughput and latency of `Storage.append` for each durability policy.
+
+Usage: python -m benchmarks.durability [--nb-writes N] [--nb-writers W] [--value-size S]
+"""
+
+import argparse
+import json
+import threading
+from time import perf_counter
+
+from benchmarks.utils import summarize_latencies, temporary_store_directory
+from src.io_handling.durability import DurabilityPolicy, GroupCommitter
+from src.storage import Storage
+
+
+def run(
+    durability_policy: DurabilityPolicy,
+    nb_writes: int,
+    nb_writers: int,
+    value_size: int,
+    group_commit_interval_ms: float = GroupCommitter.DEFAULT_INTERVAL_MS,
+) -> dict:
+    value = b"v" * value_size
+    latencies = [[] for _ in range(nb_writers)]
+    nb_writes_per_writer = nb_writes // nb_writers
+
+    with temporary_store_directory() as directory:
+        storage = Storage(
+            directory=directory,
+            max_file_size=64 * 1024 * 1024,
+            durability_policy=durability_policy,
+            group_commit_interval_ms=group_commit_interval_ms,
+        )
+
+        def write(writer_id: int) -> None:
+            for i in range(nb_writes_per_writer):
+                start = perf_counter()
+                storage.append(key=f"key-{writer_id}-{i}", value=value)
+                latencies[writer_id].append(perf_counter() - start)
+
+        writers = [
+            threading.Thread(target=write, args=(writer_id,))
+            for writer_id in range(nb_writers)
+        ]
+        start = perf_counter()
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        duration = perf_counter() - start
+        storage.close()
+
+    return {
+        "durability_policy": durability_policy.value,
+        "nb_writers": nb_writers,
+        "nb_writes": nb_writes_per_writer * nb_writers,
+        "writes_per_second": round(nb_writes_per_writer * nb_writers / duration, 1),
+        **summarize_latencies([latency for ls in latencies for latency in ls]),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nb-writes", type=int, default=2_000)
+    parser.add_argument("--nb-writers", type=int, default=4)
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument(
+        "--group-commit-interval-ms",
+        type=float,
+        default=GroupCommitter.DEFAULT_INTERVAL_MS,
+    )
+    args = parser.parse_args()
+
+    results = [
+        run(
+            durability_policy=durability_policy,
+            nb_writes=args.nb_writes,
+            nb_writers=args.nb_writers,
+            value_size=args.value_size,
+            group_commit_interval_ms=args.group_commit_interval_ms,
+        )
+        for durability_policy in DurabilityPolicy
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
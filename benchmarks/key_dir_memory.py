@@ -0,0 +1,57 @@
+"""Measures the memory used per key by the standard and the compact KeyDir.
+
+Usage: python -m benchmarks.key_dir_memory [--nb-keys 1000000 10000000] [--nb-files N]
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+
+from src.key_dir import KeyDir, CompactKeyDir
+
+
+def run(key_dir_class: type[KeyDir], nb_keys: int, nb_files: int) -> dict:
+    # Keys are created beforehand so that their own memory is not attributed to the KeyDir
+    keys = [f"key-{i:012d}" for i in range(nb_keys)]
+    file_paths = [f"./datafiles/store/{i}.data" for i in range(nb_files)]
+    gc.collect()
+
+    tracemalloc.start()
+    key_dir = key_dir_class()
+    for i, key in enumerate(keys):
+        key_dir.update(
+            key=key,
+            file_path=file_paths[i % nb_files],
+            value_position=(i * 137) % 2_000_000_000,
+            value_size=100 + i % 900,
+            timestamp=1_700_000_000 + i,
+        )
+    memory_used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "key_dir": key_dir_class.__name__,
+        "nb_keys": nb_keys,
+        "bytes_per_key": round(memory_used / nb_keys, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--nb-keys", type=int, nargs="+", default=[1_000_000, 10_000_000]
+    )
+    parser.add_argument("--nb-files", type=int, default=100)
+    args = parser.parse_args()
+
+    results = [
+        run(key_dir_class=key_dir_class, nb_keys=nb_keys, nb_files=args.nb_files)
+        for nb_keys in args.nb_keys
+        for key_dir_class in [KeyDir, CompactKeyDir]
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
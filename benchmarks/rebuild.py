@@ -0,0 +1,71 @@
+"""Compares the boot time (`Storage.rebuild_index`) of the serial and the parallel index rebuild.
+
+Usage: python -m benchmarks.rebuild [--nb-keys N] [--value-size S] [--max-file-size B] [--workers W ...]
+"""
+
+import argparse
+import json
+import os
+from time import perf_counter
+
+from benchmarks.utils import temporary_store_directory
+from src.storage import Storage
+
+
+def fill_store(directory: str, nb_keys: int, value_size: int, max_file_size: int):
+    storage = Storage(directory=directory, max_file_size=max_file_size)
+    value = b"v" * value_size
+    for i in range(nb_keys):
+        storage.append(key=f"key-{i}", value=value)
+    storage.close()
+
+
+def run(directory: str, rebuild_workers: int, max_file_size: int) -> dict:
+    storage = Storage(
+        directory=directory,
+        max_file_size=max_file_size,
+        rebuild_workers=rebuild_workers,
+    )
+    start = perf_counter()
+    storage.rebuild_index()
+    duration = perf_counter() - start
+    nb_keys = len(storage.key_dir)
+    storage.close()
+    return {
+        "rebuild_workers": rebuild_workers,
+        "nb_files": len(os.listdir(directory)),
+        "nb_keys": nb_keys,
+        "duration_s": round(duration, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nb-keys", type=int, default=200_000)
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument("--max-file-size", type=int, default=1024 * 1024)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1]
+    )
+    args = parser.parse_args()
+
+    with temporary_store_directory() as directory:
+        fill_store(
+            directory=directory,
+            nb_keys=args.nb_keys,
+            value_size=args.value_size,
+            max_file_size=args.max_file_size,
+        )
+        results = [
+            run(
+                directory=directory,
+                rebuild_workers=rebuild_workers,
+                max_file_size=args.max_file_size,
+            )
+            for rebuild_workers in args.workers
+        ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
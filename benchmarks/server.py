@@ -0,0 +1,121 @@
+"""Load test of the RESP server: many clients send pipelines of GET/SET commands over TCP.
+
+Usage: python -m benchmarks.server [--nb-clients C] [--nb-pipelines-per-client N] [--pipeline-depth D]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+from contextlib import redirect_stdout
+from time import perf_counter
+
+from benchmarks.utils import summarize_latencies, temporary_store_directory
+from src.async_storage_engine import AsyncStorageEngine
+from src.client import StorageClient
+from src.server import StorageServer
+from src.storage_engine import StorageEngine
+
+
+async def run_client(
+    address: tuple[str, int],
+    client_id: int,
+    nb_pipelines: int,
+    pipeline_depth: int,
+    read_ratio: float,
+    value: bytes,
+    latencies: list[float],
+) -> None:
+    randomizer = random.Random(client_id)
+    client = await StorageClient.connect(*address)
+    try:
+        for i in range(nb_pipelines):
+            commands = []
+            for _ in range(pipeline_depth):
+                key = f"key-{client_id}-{randomizer.randrange(max(i, 1))}"
+                if randomizer.random() < read_ratio:
+                    commands.append(("GET", key))
+                else:
+                    commands.append(("SET", key, value))
+            start = perf_counter()
+            await client.execute_pipeline(commands=commands)
+            latencies.append(perf_counter() - start)
+    finally:
+        await client.close()
+
+
+async def run(
+    nb_clients: int,
+    nb_pipelines_per_client: int,
+    pipeline_depth: int,
+    read_ratio: float,
+    value_size: int,
+) -> dict:
+    value = b"v" * value_size
+    latencies = []
+
+    # The boot up logs of the engine must not be mixed with the JSON results
+    with temporary_store_directory() as directory, redirect_stdout(sys.stderr):
+        storage_engine = StorageEngine(
+            directory=directory, max_file_size=64 * 1024 * 1024
+        )
+        async with AsyncStorageEngine(storage_engine=storage_engine) as database:
+            server = StorageServer(database=database, port=0)
+            await server.start()
+            start = perf_counter()
+            await asyncio.gather(
+                *(
+                    run_client(
+                        address=server.address,
+                        client_id=client_id,
+                        nb_pipelines=nb_pipelines_per_client,
+                        pipeline_depth=pipeline_depth,
+                        read_ratio=read_ratio,
+                        value=value,
+                        latencies=latencies,
+                    )
+                    for client_id in range(nb_clients)
+                )
+            )
+            duration = perf_counter() - start
+            await server.close()
+
+    nb_commands = nb_clients * nb_pipelines_per_client * pipeline_depth
+    return {
+        "nb_clients": nb_clients,
+        "pipeline_depth": pipeline_depth,
+        "nb_commands": nb_commands,
+        "read_ratio": read_ratio,
+        "commands_per_second": round(nb_commands / duration, 1),
+        # Latency of a whole pipeline (round trip)
+        **summarize_latencies(latencies),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nb-clients", type=int, default=32)
+    parser.add_argument("--nb-pipelines-per-client", type=int, default=50)
+    parser.add_argument("--pipeline-depth", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--read-ratio", type=float, default=0.5)
+    parser.add_argument("--value-size", type=int, default=100)
+    args = parser.parse_args()
+
+    results = [
+        asyncio.run(
+            run(
+                nb_clients=args.nb_clients,
+                nb_pipelines_per_client=args.nb_pipelines_per_client,
+                pipeline_depth=pipeline_depth,
+                read_ratio=args.read_ratio,
+                value_size=args.value_size,
+            )
+        )
+        for pipeline_depth in args.pipeline_depth
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
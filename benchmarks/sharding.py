@@ -0,0 +1,93 @@
+"""Measures the write throughput of a `ShardedStorageEngine` for a growing number of shards (one worker process each).
+
+Usage: python -m benchmarks.sharding [--nb-writes N] [--nb-writers W] [--value-size S] [--max-shards M]
+"""
+
+import argparse
+import json
+import threading
+from time import perf_counter
+
+from benchmarks.utils import summarize_latencies, temporary_store_directory
+from src.io_handling.durability import DurabilityPolicy
+from src.sharded_storage_engine import ShardedStorageEngine
+
+
+def run(
+    nb_shards: int,
+    nb_writes: int,
+    nb_writers: int,
+    value_size: int,
+    durability_policy: DurabilityPolicy,
+) -> dict:
+    value = b"v" * value_size
+    latencies = [[] for _ in range(nb_writers)]
+    nb_writes_per_writer = nb_writes // nb_writers
+
+    with temporary_store_directory() as directory:
+        database = ShardedStorageEngine(
+            directory=directory,
+            nb_shards=nb_shards,
+            use_processes=True,
+            max_file_size=64 * 1024 * 1024,
+            durability_policy=durability_policy,
+        )
+
+        def write(writer_id: int) -> None:
+            for i in range(nb_writes_per_writer):
+                start = perf_counter()
+                database.append(key=f"key-{writer_id}-{i}", value=value)
+                latencies[writer_id].append(perf_counter() - start)
+
+        writers = [
+            threading.Thread(target=write, args=(writer_id,))
+            for writer_id in range(nb_writers)
+        ]
+        start = perf_counter()
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        duration = perf_counter() - start
+        database.close()
+
+    return {
+        "nb_shards": nb_shards,
+        "nb_writers": nb_writers,
+        "nb_writes": nb_writes_per_writer * nb_writers,
+        "writes_per_second": round(nb_writes_per_writer * nb_writers / duration, 1),
+        **summarize_latencies([latency for ls in latencies for latency in ls]),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nb-writes", type=int, default=20_000)
+    parser.add_argument("--nb-writers", type=int, default=16)
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument("--max-shards", type=int, default=8)
+    parser.add_argument(
+        "--durability-policy",
+        choices=[policy.value for policy in DurabilityPolicy],
+        default=DurabilityPolicy.FLUSH_PER_WRITE.value,
+    )
+    args = parser.parse_args()
+
+    results = []
+    nb_shards = 1
+    while nb_shards <= args.max_shards:
+        results.append(
+            run(
+                nb_shards=nb_shards,
+                nb_writes=args.nb_writes,
+                nb_writers=args.nb_writers,
+                value_size=args.value_size,
+                durability_policy=DurabilityPolicy(args.durability_policy),
+            )
+        )
+        nb_shards *= 2
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""Runs the reference workloads of `Storage`, `KeyDir` and `MergeWorker`, and prints the results as JSON.
+
+Every workload runs on a fresh store, and all random draws are seeded, so that two runs with the same parameters
+perform exactly the same operations (results can thus be compared across releases to spot regressions).
+
+Usage: python -m benchmarks.suite [--workloads W ...] [--nb-keys N] [--value-size S] [--max-file-size B] [--output F]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+from time import perf_counter
+
+from benchmarks.utils import (
+    ZipfianSampler,
+    summarize_latencies,
+    temporary_store_directory,
+)
+from src.io_handling.compression import Codec, CompressionPolicy
+from src.merge_worker import MergeWorker
+from src.storage import Storage
+
+
+def get_key(index: int) -> str:
+    return f"key-{index:012d}"
+
+
+def open_storage(directory: str, args: argparse.Namespace) -> Storage:
+    storage = Storage(
+        directory=directory,
+        max_file_size=args.max_file_size,
+        compact_key_dir=args.compact_key_dir,
+        compression_policy=(
+            CompressionPolicy(codec=Codec[args.codec.upper()])
+            if args.codec != "none"
+            else None
+        ),
+        value_cache_size=args.value_cache_size,
+    )
+    storage.rebuild_index()
+    return storage
+
+
+def fill_storage(storage: Storage, args: argparse.Namespace) -> None:
+    value = b"v" * args.value_size
+    for index in range(args.nb_keys):
+        storage.append(key=get_key(index), value=value)
+
+
+def get_cache_hit_ratio(storage: Storage) -> float or None:
+    """Returns the fraction of reads served by the value cache (None if it is disabled)."""
+    if storage.value_cache is None:
+        return None
+    hits = storage.metrics.counters["cache_hits"].value
+    misses = storage.metrics.counters["cache_misses"].value
+    return round(hits / (hits + misses), 3) if hits + misses else 0.0
+
+
+def measure_operations(workload: str, operations: list) -> dict:
+    """Runs the operations (callables) one by one, and summarizes their throughput and latencies."""
+    latencies = []
+    start = perf_counter()
+    for operation in operations:
+        operation_start = perf_counter()
+        operation()
+        latencies.append(perf_counter() - operation_start)
+    duration = perf_counter() - start
+    return {
+        "workload": workload,
+        "nb_operations": len(operations),
+        "operations_per_second": round(len(operations) / duration, 1),
+        **summarize_latencies(latencies),
+    }
+
+
+# ~~~~~~~~~~~~~~~~~~~
+# ~~~ Workloads
+# ~~~~~~~~~~~~~~~~~~~
+
+
+def run_sequential_put(directory: str, args: argparse.Namespace) -> dict:
+    storage = open_storage(directory=directory, args=args)
+    value = b"v" * args.value_size
+    result = measure_operations(
+        workload="sequential_put",
+        operations=[
+            lambda index=index: storage.append(key=get_key(index), value=value)
+            for index in range(args.nb_keys)
+        ],
+    )
+    storage.close()
+    return result
+
+
+def run_random_put(directory: str, args: argparse.Namespace) -> dict:
+    storage = open_storage(directory=directory, args=args)
+    randomizer = random.Random(args.seed)
+    value = b"v" * args.value_size
+    result = measure_operations(
+        workload="random_put",
+        operations=[
+            lambda index=randomizer.randrange(args.nb_keys): storage.append(
+                key=get_key(index), value=value
+            )
+            for _ in range(args.nb_operations)
+        ],
+    )
+    storage.close()
+    return result
+
+
+def run_uniform_get(directory: str, args: argparse.Namespace) -> dict:
+    storage = open_storage(directory=directory, args=args)
+    fill_storage(storage=storage, args=args)
+    randomizer = random.Random(args.seed)
+    result = measure_operations(
+        workload="uniform_get",
+        operations=[
+            lambda index=randomizer.randrange(args.nb_keys): storage.get(
+                key=get_key(index)
+            )
+            for _ in range(args.nb_operations)
+        ],
+    )
+    storage.close()
+    return result
+
+
+def run_zipfian_get(directory: str, args: argparse.Namespace) -> dict:
+    storage = open_storage(directory=directory, args=args)
+    fill_storage(storage=storage, args=args)
+    sampler = ZipfianSampler(
+        nb_items=args.nb_keys,
+        exponent=args.zipf_exponent,
+        randomizer=random.Random(args.seed),
+    )
+    result = measure_operations(
+        workload="zipfian_get",
+        operations=[
+            lambda index=sampler.sample(): storage.get(key=get_key(index))
+            for _ in range(args.nb_operations)
+        ],
+    )
+    storage.close()
+    return {
+        **result,
+        "zipf_exponent": args.zipf_exponent,
+        "cache_hit_ratio": get_cache_hit_ratio(storage=storage),
+    }
+
+
+def run_mixed(directory: str, args: argparse.Namespace) -> dict:
+    """Zipfian reads and writes (updates and a few deletes), in the proportions given by `read_ratio`."""
+    storage = open_storage(directory=directory, args=args)
+    fill_storage(storage=storage, args=args)
+    randomizer = random.Random(args.seed)
+    sampler = ZipfianSampler(
+        nb_items=args.nb_keys, exponent=args.zipf_exponent, randomizer=randomizer
+    )
+    value = b"w" * args.value_size
+    operations = []
+    for _ in range(args.nb_operations):
+        key = get_key(sampler.sample())
+        draw = randomizer.random()
+        if draw < args.read_ratio:
+            operations.append(lambda key=key: storage.get(key=key))
+        elif draw < args.read_ratio + (1 - args.read_ratio) * 0.9:
+            operations.append(lambda key=key: storage.append(key=key, value=value))
+        else:
+            # Deleting a key that does not exist raises
+            operations.append(
+                lambda key=key: key in storage and storage.delete(key=key)
+            )
+    result = measure_operations(workload="mixed", operations=operations)
+    storage.close()
+    return {
+        **result,
+        "read_ratio": args.read_ratio,
+        "cache_hit_ratio": get_cache_hit_ratio(storage=storage),
+    }
+
+
+def run_rebuild_index(directory: str, args: argparse.Namespace) -> dict:
+    storage = open_storage(directory=directory, args=args)
+    fill_storage(storage=storage, args=args)
+    storage.close()
+
+    storage = open_storage(directory=directory, args=args)
+    start = perf_counter()
+    storage.rebuild_index()
+    duration = perf_counter() - start
+    result = {
+        "workload": "rebuild_index",
+        "nb_files": len(os.listdir(directory)),
+        "nb_keys": len(storage.key_dir),
+        "duration_s": round(duration, 3),
+    }
+    storage.close()
+    return result
+
+
+def run_merge(directory: str, args: argparse.Namespace) -> dict:
+    """Merges a store where every key has been overwritten once, and `deleted_ratio` of them deleted."""
+    storage = open_storage(directory=directory, args=args)
+    fill_storage(storage=storage, args=args)
+    fill_storage(storage=storage, args=args)
+    randomizer = random.Random(args.seed)
+    for index in randomizer.sample(
+        range(args.nb_keys), k=int(args.nb_keys * args.deleted_ratio)
+    ):
+        storage.delete(key=get_key(index))
+    # The active file is not merged: reopening the store makes it immutable
+    storage.close()
+    storage = open_storage(directory=directory, args=args)
+    nb_files_before = len(os.listdir(directory))
+
+    start = perf_counter()
+    report = MergeWorker(
+        storage=storage, file_size_threshold=args.max_file_size
+    ).do_merge()
+    duration = perf_counter() - start
+    result = {
+        "workload": "merge",
+        "nb_files_before": nb_files_before,
+        "nb_files_after": len(os.listdir(directory)),
+        "duration_s": round(duration, 3),
+        "merged_bytes_per_second": round(report.input_bytes / duration, 1),
+        "nb_merged_files": report.nb_merged_files,
+        "input_bytes": report.input_bytes,
+        "output_bytes": report.output_bytes,
+        "reclaimed_bytes": report.reclaimed_bytes,
+        "nb_live_records": report.nb_live_records,
+        "nb_dead_records": report.nb_dead_records,
+        "nb_dropped_tombstones": report.nb_dropped_tombstones,
+    }
+    storage.close()
+    return result
+
+
+WORKLOADS = {
+    "sequential_put": run_sequential_put,
+    "random_put": run_random_put,
+    "uniform_get": run_uniform_get,
+    "zipfian_get": run_zipfian_get,
+    "mixed": run_mixed,
+    "rebuild_index": run_rebuild_index,
+    "merge": run_merge,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS)
+    )
+    parser.add_argument("--nb-keys", type=int, default=20_000)
+    parser.add_argument(
+        "--nb-operations",
+        type=int,
+        default=None,
+        help="Number of operations of the put, get and mixed workloads (defaults to the number of keys)",
+    )
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument("--max-file-size", type=int, default=1024 * 1024)
+    parser.add_argument("--compact-key-dir", action="store_true")
+    parser.add_argument(
+        "--codec", choices=[codec.name.lower() for codec in Codec], default="none"
+    )
+    parser.add_argument(
+        "--value-cache-size",
+        type=int,
+        default=0,
+        help="Size of the value cache in bytes (disabled by default)",
+    )
+    parser.add_argument("--zipf-exponent", type=float, default=0.99)
+    parser.add_argument("--read-ratio", type=float, default=0.9)
+    parser.add_argument("--deleted-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="File to write the results to (as well)")
+    args = parser.parse_args()
+    if args.nb_operations is None:
+        args.nb_operations = args.nb_keys
+
+    results = []
+    for workload in args.workloads:
+        with temporary_store_directory() as directory:
+            results.append(WORKLOADS[workload](directory=directory, args=args))
+    report = {
+        "parameters": vars(args),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
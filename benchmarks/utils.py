@@ -0,0 +1,51 @@
+import bisect
+import itertools
+import os
+import random
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Returns the value below which `fraction` of the (already sorted) values fall."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def summarize_latencies(latencies_in_seconds: list[float]) -> dict:
+    """Summarizes a list of latencies (in seconds) into percentiles expressed in microseconds."""
+    latencies = sorted(latencies_in_seconds)
+    return {
+        f"{name}_us": round(percentile(latencies, fraction) * 1_000_000, 2)
+        for name, fraction in [("p50", 0.5), ("p99", 0.99), ("max", 1.0)]
+    }
+
+
+@contextmanager
+def temporary_store_directory() -> Iterator[str]:
+    """Yields a fresh directory for a store, deleted once the benchmark is over."""
+    directory = tempfile.mkdtemp(prefix="pytcask-bench-")
+    try:
+        yield os.path.join(directory, "store")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class ZipfianSampler:
+    """Draws indexes in [0, nb_items) following a Zipf distribution: index `i` is drawn with a probability proportional
+    to 1 / (i + 1) ** exponent, so that a few indexes (the first ones) get most of the draws.
+    """
+
+    def __init__(self, nb_items: int, exponent: float, randomizer: random.Random):
+        self.randomizer = randomizer
+        self.cumulative_weights = list(
+            itertools.accumulate(1 / (i + 1) ** exponent for i in range(nb_items))
+        )
+
+    def sample(self) -> int:
+        point = self.randomizer.random() * self.cumulative_weights[-1]
+        return bisect.bisect_left(self.cumulative_weights, point)
@@ -1,6 +1,137 @@
+"""Starts a storage server speaking RESP (the Redis protocol).
+
+Usage: python main.py [--host HOST] [--port PORT] [--directory DIRECTORY] [--max-file-size SIZE] [--metrics-port PORT]
+    [--durability POLICY] [--checkpoint-interval SECONDS] [--no-merge] [--fragmentation-trigger RATIO]
+    [--fragmentation-threshold RATIO] [--dead-bytes-trigger BYTES] [--dead-bytes-threshold BYTES]
+    [--merge-window START_HOUR END_HOUR] [--merge-max-bytes-per-second BYTES]
+"""
+
+import argparse
+import asyncio
+
+from src.async_storage_engine import AsyncStorageEngine
+from src.io_handling.durability import DurabilityPolicy
+from src.merge_scheduler import MergePolicy
+from src.server import MetricsServer, StorageServer
 from src.storage_engine import StorageEngine
 
+# Files are rotated (and their hint files written) once they reach that size: small files mean many rotations, each
+# recorded (and fsynced) in the manifest
+DEFAULT_MAX_FILE_SIZE = 64 * 1024 * 1024
+DEFAULT_CHECKPOINT_INTERVAL = 300
+
+
+async def serve(
+    host: str,
+    port: int,
+    directory: str,
+    max_file_size: int,
+    metrics_port: int or None = None,
+    durability_policy: DurabilityPolicy = DurabilityPolicy.FLUSH_PER_WRITE,
+    checkpoint_interval: float or None = None,
+    merge_policy: MergePolicy or None = None,
+) -> None:
+    storage_engine = StorageEngine(
+        directory=directory,
+        max_file_size=max_file_size,
+        durability_policy=durability_policy,
+        checkpoint_interval=checkpoint_interval,
+        merge_policy=merge_policy,
+    )
+    async with AsyncStorageEngine(storage_engine=storage_engine) as database:
+        server = StorageServer(database=database, host=host, port=port)
+        await server.start()
+        print(f"Listening on {server.address[0]}:{server.address[1]}")
+        # When set, the metrics are exposed to Prometheus on a dedicated HTTP port
+        metrics_server = None
+        if metrics_port is not None:
+            metrics_server = MetricsServer(
+                storage_engine=storage_engine, host=host, port=metrics_port
+            )
+            await metrics_server.start()
+            print(f"Serving metrics on http://{host}:{metrics_port}/metrics")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+            if metrics_server is not None:
+                await metrics_server.close()
+
+
+def get_merge_policy(args: argparse.Namespace) -> MergePolicy or None:
+    if args.no_merge:
+        return None
+    return MergePolicy(
+        fragmentation_trigger=args.fragmentation_trigger,
+        dead_bytes_trigger=args.dead_bytes_trigger,
+        fragmentation_threshold=args.fragmentation_threshold,
+        dead_bytes_threshold=args.dead_bytes_threshold,
+        merge_window=tuple(args.merge_window) if args.merge_window else None,
+        max_bytes_per_second=args.merge_max_bytes_per_second,
+    )
+
+
 if __name__ == "__main__":
-    database = StorageEngine()
-    # Not sure what I will do here yet...
-    # Probably a file to handle CLI arguments, or the server, I will see!
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=StorageServer.DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=StorageServer.DEFAULT_PORT)
+    parser.add_argument("--directory", default=StorageEngine.DEFAULT_DIRECTORY)
+    parser.add_argument("--max-file-size", type=int, default=DEFAULT_MAX_FILE_SIZE)
+    parser.add_argument("--metrics-port", type=int, default=None)
+    parser.add_argument(
+        "--durability",
+        choices=[policy.value for policy in DurabilityPolicy],
+        default=DurabilityPolicy.FLUSH_PER_WRITE.value,
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        default=DEFAULT_CHECKPOINT_INTERVAL,
+        help="Seconds between two snapshots of the key_dir (0 disables them)",
+    )
+    parser.add_argument(
+        "--no-merge", action="store_true", help="Disable background merges"
+    )
+    parser.add_argument(
+        "--fragmentation-trigger",
+        type=float,
+        default=MergePolicy.DEFAULT_FRAGMENTATION_TRIGGER,
+    )
+    parser.add_argument(
+        "--fragmentation-threshold",
+        type=float,
+        default=MergePolicy.DEFAULT_FRAGMENTATION_THRESHOLD,
+    )
+    parser.add_argument(
+        "--dead-bytes-trigger", type=int, default=MergePolicy.DEFAULT_DEAD_BYTES_TRIGGER
+    )
+    parser.add_argument(
+        "--dead-bytes-threshold",
+        type=int,
+        default=MergePolicy.DEFAULT_DEAD_BYTES_THRESHOLD,
+    )
+    parser.add_argument(
+        "--merge-window",
+        type=int,
+        nargs=2,
+        metavar=("START_HOUR", "END_HOUR"),
+        default=None,
+        help="Only start merges between these hours (both included)",
+    )
+    parser.add_argument("--merge-max-bytes-per-second", type=float, default=None)
+    args = parser.parse_args()
+    try:
+        asyncio.run(
+            serve(
+                host=args.host,
+                port=args.port,
+                directory=args.directory,
+                max_file_size=args.max_file_size,
+                metrics_port=args.metrics_port,
+                durability_policy=DurabilityPolicy(args.durability),
+                checkpoint_interval=args.checkpoint_interval or None,
+                merge_policy=get_merge_policy(args=args),
+            )
+        )
+    except KeyboardInterrupt:
+        pass
@@ -40,9 +40,11 @@ db_with_multiple_immutable_files_key_value_pairs = [
 
 @pytest.fixture
 def db_with_multiple_immutable_files(request):
-    database = Storage(directory=request.param, max_file_size=70)
+    database = Storage(directory=request.param, max_file_size=90)
     for key, value in db_with_multiple_immutable_files_key_value_pairs:
         database.append(key=key, value=value)
+    # Hint files of rotated files are written in the background
+    database._wait_for_hint_files()
 
     nb_files = len(os.listdir(database.directory))
     return database, nb_files
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+
+from src.async_storage_engine import AsyncStorageEngine
+from src.storage_engine import StorageEngine
+
+TEST_DIRECTORY = "./datafiles/test_async_storage_engine"
+
+
+def test_put_get_and_delete_do_not_block_the_event_loop():
+    async def scenario():
+        # GIVEN
+        async with AsyncStorageEngine(
+            storage_engine=StorageEngine(directory=TEST_DIRECTORY, max_file_size=100)
+        ) as database:
+            # WHEN
+            await asyncio.gather(
+                *(database.put(key=f"key{i}", value=b"value%d" % i) for i in range(20))
+            )
+            await database.delete(key="key0")
+
+            # THEN
+            assert await database.get(key="key0") is None
+            assert await database.get(key="key1") == b"value1"
+            assert await database.multi_get(keys=["key2", "key3"]) == {
+                "key2": b"value2",
+                "key3": b"value3",
+            }
+
+    asyncio.run(scenario())
+
+    # THEN — writes are durable once the engine is closed
+    storage_engine = StorageEngine(directory=TEST_DIRECTORY, max_file_size=100)
+    assert storage_engine.storage.get(key="key0") is None
+    assert storage_engine.storage.get(key="key19") == b"value19"
+    storage_engine.close()
+    storage_engine.storage.clear()
+
+
+def test_queued_writes_are_batched():
+    async def scenario():
+        # GIVEN
+        database = AsyncStorageEngine(
+            storage_engine=StorageEngine(directory=TEST_DIRECTORY, max_file_size=1000)
+        )
+        batch_sizes = []
+        write_batch = database.storage.write_batch
+
+        def recording_write_batch(items):
+            batch_sizes.append(len(items))
+            write_batch(items)
+
+        database.storage.write_batch = recording_write_batch
+        await database.start()
+
+        # WHEN
+        await asyncio.gather(
+            *(database.put(key=f"key{i}", value=b"value") for i in range(50))
+        )
+
+        # THEN
+        assert sum(batch_sizes) == 50
+        assert len(batch_sizes) < 50
+        await database.close()
+        database.storage.clear()
+
+    asyncio.run(scenario())
+
+
+def test_backpressure_and_cancellation_of_queued_writes():
+    async def scenario():
+        # GIVEN — a writer blocked on its first batch
+        database = AsyncStorageEngine(
+            storage_engine=StorageEngine(directory=TEST_DIRECTORY, max_file_size=1000),
+            max_pending_writes=1,
+        )
+        is_writer_released = threading.Event()
+        write_batch = database.storage.write_batch
+
+        def blocking_write_batch(items):
+            is_writer_released.wait()
+            write_batch(items)
+
+        database.storage.write_batch = blocking_write_batch
+        await database.start()
+        first_write = asyncio.create_task(database.put(key="key1", value=b"value1"))
+        await asyncio.sleep(0.01)
+
+        # WHEN
+        queued_write = asyncio.create_task(database.put(key="key2", value=b"value2"))
+        waiting_write = asyncio.create_task(database.put(key="key3", value=b"value3"))
+        await asyncio.sleep(0.01)
+
+        # THEN — the queue is full: the last writer waits for some room
+        assert database._write_queue.full()
+        assert not waiting_write.done()
+
+        # WHEN — the queued write is cancelled before being picked up by the writer
+        queued_write.cancel()
+        is_writer_released.set()
+        await asyncio.gather(first_write, waiting_write)
+
+        # THEN
+        assert queued_write.cancelled()
+        assert await database.get(key="key1") == b"value1"
+        assert await database.get(key="key2") is None
+        assert await database.get(key="key3") == b"value3"
+        await database.close()
+        database.storage.clear()
+
+    asyncio.run(scenario())
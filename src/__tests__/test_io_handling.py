@@ -1,10 +1,16 @@
+import os
+
 import pytest
 
 from src.__fixtures__.database import (
     db_with_only_active_file_key_value_pairs,
     db_with_only_active_file,
 )
-from src.io_handling.data_file import DataFileItem, DataFile
+from src.io_handling.compression import Codec, CompressionPolicy
+from src.io_handling.data_file import CorruptedRecordError, DataFileItem, DataFile
+from src.io_handling.file_handle_pool import FileHandlePool
+from src.io_handling.hint_file import HintFileItem
+from src.item import Item, Tombstone
 
 TEST_DIRECTORY = "./datafiles/test_io_handling"
 
@@ -23,6 +29,149 @@ def test_can_decode_encoded_data():
     assert out_data_file_item == in_data_file_item
 
 
+def test_records_can_be_packed_into_and_unpacked_from_a_shared_buffer():
+    # GIVEN
+    items = [
+        DataFileItem(key="key", value=b"value"),
+        DataFileItem(key="clé", value=b"valeur"),
+        DataFileItem.from_tombstone(tombstone=Tombstone(key="key")),
+        DataFileItem(key="empty", value=b""),  # Not a tombstone
+    ]
+    hint_item = HintFileItem(timestamp=1, value_size=6, key="clé", value_position=42)
+    buffer = bytearray(sum(item.size for item in items) + hint_item.size)
+
+    # WHEN
+    offset = 0
+    for item in items:
+        offset = item.pack_into(buffer, offset)
+    hint_item.pack_into(buffer, offset)
+
+    # THEN
+    # Key sizes are counted in bytes, not in characters
+    assert items[1].key_size == 4
+    offset = 0
+    for item in items:
+        out_item = DataFileItem.unpack_from(buffer, offset)
+        assert (out_item.key, out_item.is_tombstone, out_item.size) == (
+            item.key,
+            item.is_tombstone,
+            item.size,
+        )
+        assert out_item.encoded_value == (item.encoded_value or b"")
+        offset += item.size
+    out_hint_item = HintFileItem.unpack_from(buffer, offset)
+    assert (
+        out_hint_item.key,
+        out_hint_item.value_position,
+        out_hint_item.is_tombstone,
+    ) == ("clé", 42, False)
+
+
+@pytest.mark.parametrize("codec", [Codec.ZLIB, Codec.LZMA])
+def test_can_decode_compressed_data(codec):
+    # GIVEN
+    value = b'{"key": "value", "other_key": "other_value"}' * 10
+    in_data_file_item = DataFileItem.from_item(
+        item=Item(key="key", value=value),
+        compression_policy=CompressionPolicy(codec=codec),
+    )
+    assert in_data_file_item.codec == codec
+    assert in_data_file_item.value_size < len(value)
+
+    # WHEN
+    in_bytes = in_data_file_item.to_bytes()
+    out_data_file_item = DataFileItem.from_bytes(in_bytes)
+
+    # THEN
+    assert out_data_file_item.codec == codec
+    assert out_data_file_item.value == value
+    assert DataFileItem.decode_value(in_bytes) == value
+
+
+def test_records_are_only_re_encoded_if_their_encoding_can_change(monkeypatch):
+    # GIVEN
+    value = b'{"key": "value", "other_key": "other_value"}' * 10
+    lzma_item = DataFileItem.from_item(
+        item=Item(key="key", value=value),
+        compression_policy=CompressionPolicy(codec=Codec.LZMA),
+    )
+    small_item = DataFileItem(key="key", value=b"value")
+    monkeypatch.setattr(
+        CompressionPolicy,
+        "compress",
+        lambda self, value: pytest.fail("value re-encoded"),
+    )
+
+    # WHEN/THEN
+    assert (
+        lzma_item.compressed_with(CompressionPolicy(codec=Codec.LZMA, level=9))
+        is lzma_item
+    )
+    assert small_item.compressed_with(CompressionPolicy(codec=Codec.ZLIB)) is small_item
+    monkeypatch.undo()
+    uncompressed_item = lzma_item.compressed_with(CompressionPolicy(codec=Codec.NONE))
+    assert uncompressed_item.codec == Codec.NONE
+    assert uncompressed_item.encoded_value == value
+
+
+def test_decoding_a_value_with_an_unknown_codec_raises():
+    # GIVEN
+    in_bytes = bytearray(DataFileItem(key="key", value=b"value").to_bytes())
+    # The codec follows the checksum and the format version
+    in_bytes[DataFileItem.CHECKSUM_FORMAT.size + 1] = 99
+
+    # WHEN/THEN
+    with pytest.raises(CorruptedRecordError):
+        DataFileItem.decode_value(in_bytes)
+
+
+def test_compression_policy_skips_small_and_incompressible_values():
+    # GIVEN
+    compression_policy = CompressionPolicy(codec=Codec.ZLIB, min_value_size=100)
+
+    # WHEN/THEN
+    assert compression_policy.compress(value=b"v" * 99) == (Codec.NONE, b"v" * 99)
+    assert compression_policy.compress(value=b"v" * 100)[0] == Codec.ZLIB
+    incompressible_value = os.urandom(1000)
+    assert compression_policy.compress(value=incompressible_value) == (
+        Codec.NONE,
+        incompressible_value,
+    )
+
+
+def test_decoding_a_corrupted_record_raises():
+    # GIVEN
+    in_bytes = bytearray(DataFileItem(key="key", value=b"value").to_bytes())
+    in_bytes[-1] ^= 0xFF
+
+    # WHEN/THEN
+    with pytest.raises(CorruptedRecordError):
+        DataFileItem.from_bytes(in_bytes)
+    assert DataFileItem.from_bytes(in_bytes, verify_checksum=False).key == "key"
+
+
+@pytest.mark.parametrize("db_with_only_active_file", [TEST_DIRECTORY], indirect=True)
+def test_iteration_raises_at_the_first_corrupted_record(db_with_only_active_file):
+    # GIVEN
+    database = db_with_only_active_file
+    path = database.active_data_file.path
+    database.close()
+    first_record_size = DataFileItem(key="key1", value=b"value1").size
+    with open(path, "r+b") as file:
+        file.seek(first_record_size + DataFileItem.METADATA_SIZE)
+        file.write(b"X")
+
+    # WHEN/THEN
+    items = iter(DataFile(path))
+    assert next(items).key == "key1"
+    with pytest.raises(CorruptedRecordError):
+        next(items)
+    # Only the recovery of the active file stops at it
+    assert DataFile(path).get_valid_size() == first_record_size
+
+    database.clear()
+
+
 @pytest.mark.parametrize("db_with_only_active_file", [TEST_DIRECTORY], indirect=True)
 def test_can_iterate_on_file_and_decode_item(db_with_only_active_file):
     # GIVEN
@@ -35,3 +184,100 @@ def test_can_iterate_on_file_and_decode_item(db_with_only_active_file):
         assert item.key == db_with_only_active_file_key_value_pairs[i][0]
         assert item.value == db_with_only_active_file_key_value_pairs[i][1]
         i += 1
+
+
+def test_file_handle_pool_evicts_least_recently_used_file():
+    # GIVEN
+    os.makedirs(TEST_DIRECTORY, exist_ok=True)
+    paths = [f"{TEST_DIRECTORY}/file{i}.data" for i in range(3)]
+    for i, path in enumerate(paths):
+        with open(path, "wb") as file:
+            file.write(bytes(f"content{i}", encoding="utf-8"))
+    pool = FileHandlePool(max_open_files=2)
+
+    # WHEN
+    assert pool.read(path=paths[0], start=0, size=8) == b"content0"
+    assert pool.read(path=paths[1], start=0, size=8) == b"content1"
+    assert pool.read(path=paths[0], start=7, size=1) == b"0"
+    assert pool.read(path=paths[2], start=0, size=8) == b"content2"
+
+    # THEN
+    assert len(pool) == 2
+    assert paths[0] in pool and paths[2] in pool
+    assert paths[1] not in pool
+
+    pool.close()
+    for path in paths:
+        os.remove(path)
+
+
+def test_file_handle_pool_does_not_serve_invalidated_file():
+    # GIVEN
+    os.makedirs(TEST_DIRECTORY, exist_ok=True)
+    path = f"{TEST_DIRECTORY}/file.data"
+    with open(path, "wb") as file:
+        file.write(b"old_content")
+    pool = FileHandlePool()
+    assert pool.read(path=path, start=0, size=3) == b"old"
+
+    # WHEN
+    os.rename(path, f"{path}.renamed")
+    with open(path, "wb") as file:
+        file.write(b"new_content")
+    pool.invalidate(path=path)
+
+    # THEN
+    assert pool.read(path=path, start=0, size=3) == b"new"
+
+    pool.close()
+    os.remove(path)
+    os.remove(f"{path}.renamed")
+
+
+def test_file_handle_pool_keeps_pinned_handle_open_until_released():
+    # GIVEN
+    os.makedirs(TEST_DIRECTORY, exist_ok=True)
+    path = f"{TEST_DIRECTORY}/file.data"
+    with open(path, "wb") as file:
+        file.write(b"content")
+    pool = FileHandlePool()
+    file_handle = pool._acquire(path=path)
+
+    # WHEN — the file is deleted (e.g. by a merge) while being read
+    pool.invalidate(path=path)
+    os.remove(path)
+
+    # THEN
+    assert path not in pool
+    assert os.pread(file_handle.file_descriptor, 7, 0) == b"content"
+    pool._release(file_handle=file_handle)
+    with pytest.raises(OSError):
+        os.fstat(file_handle.file_descriptor)
+
+    pool.close()
+
+
+@pytest.mark.parametrize("db_with_only_active_file", [TEST_DIRECTORY], indirect=True)
+def test_can_iterate_on_file_with_records_spanning_several_buffers(
+    db_with_only_active_file, monkeypatch
+):
+    # GIVEN
+    database = db_with_only_active_file
+    file = DataFile(database.active_data_file.path)
+    monkeypatch.setattr(DataFile, "READ_BUFFER_SIZE", 7)
+
+    # WHEN
+    items_with_offsets = list(file.iter_with_offsets())
+
+    # THEN
+    assert len(items_with_offsets) == len(db_with_only_active_file_key_value_pairs)
+    expected_offset = 0
+    for (offset, item), (key, value) in zip(
+        items_with_offsets, db_with_only_active_file_key_value_pairs
+    ):
+        assert offset == expected_offset
+        assert item.key == key
+        assert item.value == value
+        expected_offset += item.size
+
+    database.clear()
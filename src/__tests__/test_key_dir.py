@@ -0,0 +1,105 @@
+import pytest
+
+from src.key_dir import KeyDir, CompactKeyDir, FileTable
+
+
+@pytest.mark.parametrize("key_dir_class", [KeyDir, CompactKeyDir])
+def test_update_get_and_delete_entries(key_dir_class):
+    # GIVEN
+    key_dir = key_dir_class()
+
+    # WHEN
+    key_dir.update(
+        key="key1", file_path="file1", value_position=12, value_size=5, timestamp=1
+    )
+    key_dir.update(
+        key="key2", file_path="file2", value_position=40, value_size=3, timestamp=2
+    )
+    key_dir.update(
+        key="key1", file_path="file2", value_position=60, value_size=7, timestamp=3
+    )
+    key_dir.delete(key="key2")
+
+    # THEN
+    assert len(key_dir) == 1
+    assert key_dir.get("key1") == KeyDir.KeyDirEntry(
+        file_path="file2", value_position=60, value_size=7, timestamp=3
+    )
+    assert key_dir.get("key2") is None
+    assert list(key_dir) == [("key1", key_dir.get("key1"))]
+
+
+@pytest.mark.parametrize("key_dir_class", [KeyDir, CompactKeyDir])
+def test_bulk_updates_and_file_path_updates(key_dir_class):
+    # GIVEN
+    key_dir = key_dir_class()
+    key_dir.update_many(
+        file_path="active",
+        entries=[("key1", 12, 5, 1), ("key2", 40, 3, 1), ("key3", 60, 3, 1)],
+    )
+    key_dir.update(
+        key="key3", file_path="other", value_position=0, value_size=1, timestamp=2
+    )
+
+    # WHEN
+    key_dir.delete_many(keys=["key2", "missing_key"])
+    key_dir.update_file_path(previous_path="active", new_path="immutable")
+
+    # THEN
+    assert key_dir.get("key1").file_path == "immutable"
+    assert key_dir.get("key1").value_position == 12
+    assert key_dir.get("key2") is None
+    assert key_dir.get("key3").file_path == "other"
+
+
+def test_compact_key_dir_recycles_deleted_entries():
+    # GIVEN
+    key_dir = CompactKeyDir()
+    key_dir.update_many(
+        file_path="file", entries=[("key1", 1, 1, 1), ("key2", 2, 2, 2)]
+    )
+
+    # WHEN
+    key_dir.delete(key="key1")
+    key_dir.update(
+        key="key3", file_path="file", value_position=3, value_size=3, timestamp=3
+    )
+
+    # THEN
+    assert len(key_dir.value_positions) == 2
+    assert key_dir.get("key2").value_position == 2
+    assert key_dir.get("key3").value_position == 3
+
+
+def test_file_table_interns_paths():
+    # GIVEN
+    file_table = FileTable()
+
+    # WHEN
+    file_id1 = file_table.get_file_id("file1")
+    file_id2 = file_table.get_file_id("file2")
+
+    # THEN
+    assert file_id1 != file_id2
+    assert file_table.get_file_id("file1") == file_id1
+    assert file_table.get_path(file_id2) == "file2"
+
+
+@pytest.mark.parametrize("key_dir_class", [KeyDir, CompactKeyDir])
+def test_path_of_renamed_file_can_be_reused(key_dir_class):
+    # GIVEN
+    key_dir = key_dir_class()
+    key_dir.update(
+        key="key1", file_path="active", value_position=1, value_size=1, timestamp=1
+    )
+    key_dir.update_file_path(previous_path="active", new_path="immutable")
+
+    # WHEN
+    key_dir.update(
+        key="key2", file_path="active", value_position=2, value_size=2, timestamp=2
+    )
+
+    # THEN
+    assert key_dir.get("key1").file_path == "immutable"
+    assert key_dir.get("key2").file_path == "active"
+    assert len(key_dir.file_table) == 2
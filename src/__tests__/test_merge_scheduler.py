@@ -0,0 +1,142 @@
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from src.__fixtures__.database import (
+    db_with_multiple_immutable_files,
+    db_with_multiple_immutable_files_key_value_pairs,
+)
+from src.io_handling.data_file import CorruptedRecordError
+from src.merge_scheduler import MergePolicy, MergeScheduler
+
+TEST_DIRECTORY = "./datafiles/test_merge_scheduler"
+
+
+def _get_non_zero_dead_bytes(database) -> dict[str, int]:
+    return {path: nb for path, nb in database.dead_bytes.items() if nb}
+
+
+@pytest.mark.parametrize(
+    "db_with_multiple_immutable_files", [TEST_DIRECTORY], indirect=True
+)
+def test_tracked_dead_bytes_match_dead_bytes_computed_at_boot(
+    db_with_multiple_immutable_files,
+):
+    # GIVEN
+    database, _ = db_with_multiple_immutable_files
+    database.delete(key="key2")
+    database.write_batch(items=[("k2", b"v2_bis"), ("k2", None), ("k3", b"val3")])
+    tracked_dead_bytes = _get_non_zero_dead_bytes(database)
+
+    # WHEN
+    database.rebuild_index()
+
+    # THEN
+    assert tracked_dead_bytes != {}
+    assert _get_non_zero_dead_bytes(database) == tracked_dead_bytes
+    database.clear()
+
+
+@pytest.mark.parametrize(
+    "db_with_multiple_immutable_files", [TEST_DIRECTORY], indirect=True
+)
+def test_scheduler_only_merges_fragmented_files(db_with_multiple_immutable_files):
+    # GIVEN
+    database, _ = db_with_multiple_immutable_files
+    merge_policy = MergePolicy(fragmentation_trigger=0.6, fragmentation_threshold=0.45)
+    merge_scheduler = MergeScheduler(storage=database, merge_policy=merge_policy)
+    file_paths = [
+        path
+        for path in database._get_data_file_paths()
+        if path != database.active_data_file.path
+    ]
+    fragmented_file_paths = [
+        path
+        for path in file_paths
+        if database.dead_bytes[path] / os.path.getsize(path) >= 0.45
+    ]
+    assert 0 < len(fragmented_file_paths) < len(file_paths)
+
+    # WHEN
+    report = merge_scheduler.run_once()
+
+    # THEN
+    assert report.nb_merged_files == len(fragmented_file_paths)
+    assert report.reclaimed_bytes > 0
+    for path in file_paths:
+        assert os.path.exists(path) == (path not in fragmented_file_paths)
+    expected_values = dict(db_with_multiple_immutable_files_key_value_pairs)
+    for key, value in expected_values.items():
+        assert database.get(key=key) == value
+    database.clear()
+
+
+@pytest.mark.parametrize(
+    "db_with_multiple_immutable_files", [TEST_DIRECTORY], indirect=True
+)
+def test_scheduler_does_not_merge_below_triggers_or_outside_merge_window(
+    db_with_multiple_immutable_files,
+):
+    # GIVEN
+    database, nb = db_with_multiple_immutable_files
+    not_triggered_scheduler = MergeScheduler(
+        storage=database, merge_policy=MergePolicy(fragmentation_trigger=0.9)
+    )
+    outside_window_scheduler = MergeScheduler(
+        storage=database,
+        merge_policy=MergePolicy(
+            fragmentation_trigger=0.1, fragmentation_threshold=0.1, merge_window=(22, 2)
+        ),
+    )
+
+    # WHEN
+    not_triggered_report = not_triggered_scheduler.run_once()
+    outside_window_report = outside_window_scheduler.run_once(
+        now=datetime(2024, 1, 1, hour=12)
+    )
+
+    # THEN
+    assert not_triggered_report is None
+    assert outside_window_report is None
+    assert len(os.listdir(database.directory)) == nb
+    assert outside_window_scheduler.merge_policy.is_in_merge_window(
+        now=datetime(2024, 1, 1, hour=1)
+    )
+    database.clear()
+
+
+@pytest.mark.parametrize(
+    "db_with_multiple_immutable_files", [TEST_DIRECTORY], indirect=True
+)
+def test_scheduler_keeps_running_after_a_failed_merge(
+    db_with_multiple_immutable_files, monkeypatch
+):
+    # GIVEN
+    database, _ = db_with_multiple_immutable_files
+    merge_scheduler = MergeScheduler(
+        storage=database,
+        merge_policy=MergePolicy(
+            fragmentation_trigger=0.1, fragmentation_threshold=0.1, check_interval=0.01
+        ),
+    )
+    nb_merges = []
+
+    def failing_do_merge(data_files):
+        nb_merges.append(len(data_files))
+        raise CorruptedRecordError("Record checksum does not match at offset 0")
+
+    monkeypatch.setattr(merge_scheduler.merge_worker, "do_merge", failing_do_merge)
+
+    # WHEN
+    merge_scheduler.start()
+    deadline = time.monotonic() + 5
+    while len(nb_merges) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    merge_scheduler.stop()
+
+    # THEN
+    assert len(nb_merges) >= 2
+    assert database.metrics.counters["failed_merges"].value == len(nb_merges)
+    database.clear()
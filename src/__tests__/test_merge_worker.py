@@ -1,4 +1,5 @@
 import os.path
+import threading
 
 import pytest
 
@@ -7,8 +8,15 @@ from src.__fixtures__.database import (
     db_with_only_active_file_key_value_pairs,
     db_with_multiple_immutable_files,
 )
-from src.io_handling.data_file import DataFile
-from src.merge_worker import MergeWorker
+from src.io_handling.data_file import (
+    CorruptedRecordError,
+    DataFile,
+    DataFileItem,
+    ImmutableDataFile,
+)
+from src.io_handling.manifest import Manifest
+from src.merge_worker import MergeWorker, MergeReport
+from src.storage import Storage
 
 TEST_DIRECTORY = "./datafiles/test_merger"
 
@@ -47,12 +55,13 @@ def test_merge_multiple_files_results_in_one(db_with_multiple_immutable_files):
     # WHEN
     merge_worker.do_merge()
 
-    # THEN — check that we have 3 files: the active one and the merged one with data and hint
+    # THEN — check that we have 4 files: the manifest, the active one and the merged one with data and hint
     filenames = sorted(os.listdir(database.directory))
-    assert len(filenames) == 3
-    assert filenames[0] == "active.data"
-    assert filenames[1].startswith("merged-") and filenames[1].endswith("data")
-    assert filenames[2].startswith("merged-") and filenames[2].endswith("hint")
+    assert len(filenames) == 4
+    assert filenames[0] == Manifest.FILENAME
+    assert filenames[1] == "active.data"
+    assert filenames[2].startswith("merged-") and filenames[2].endswith("data")
+    assert filenames[3].startswith("merged-") and filenames[3].endswith("hint")
 
     database.clear()
 
@@ -179,3 +188,189 @@ def test_merge_process_uses_both_merged_and_new_immutable_files(
     assert database.get(key="key1") == b"yet_another_value1"
 
     database.clear()
+
+
+@pytest.mark.parametrize(
+    "db_with_multiple_immutable_files", [TEST_DIRECTORY], indirect=True
+)
+def test_merge_only_copies_live_records(db_with_multiple_immutable_files):
+    # GIVEN
+    database, _ = db_with_multiple_immutable_files
+    database.delete(key="key3")
+    database._generate_new_active_file()  # So that all records are mergeable
+    merge_worker = MergeWorker(storage=database, file_size_threshold=40)
+
+    # WHEN
+    report = merge_worker.do_merge()
+
+    # THEN
+    merged_files = [
+        DataFile(path=f"{database.directory}/{filename}")
+        for filename in os.listdir(database.directory)
+        if filename.startswith("merged-") and filename.endswith(".data")
+    ]
+    assert len(merged_files) > 1
+    merged_items = [item for merged_file in merged_files for item in merged_file]
+    merged_values = [item for item in merged_items if not item.is_tombstone]
+    assert sorted(item.key for item in merged_values) == sorted(
+        key for key, _ in database.key_dir
+    )
+    # All files older than the tombstone were merged: it is not needed anymore
+    assert [item for item in merged_items if item.is_tombstone] == []
+    assert report.nb_live_records == len(merged_items)
+    assert report.nb_dropped_tombstones == 1
+    assert report.output_bytes == sum(item.size for item in merged_items)
+    assert report.reclaimed_bytes > 0
+    assert 0 < report.live_ratio < 1
+
+    database.rebuild_index()
+    assert database.get(key="key3") is None
+    assert database.get(key="key1") == b"yet_another_value1"
+    assert database.get(key="k3") == b"yet_another_val3"
+
+    database.clear()
+
+
+def test_merge_keeps_tombstones_of_keys_held_by_unmerged_older_files():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=55)
+    database.append(key="key1", value=b"value1")
+    database.append(key="key2", value=b"value2")  # Rotates the file holding key1
+    database.delete(key="key1")
+    database.append(
+        key="key3", value=b"value3"
+    )  # Rotates the file holding the tombstone
+    tombstone_file = ImmutableDataFile(path=database.key_dir.get("key2").file_path)
+    merge_worker = MergeWorker(storage=database)
+
+    # WHEN
+    report = MergeReport()
+    merged_files = merge_worker._merge_files(data_files=[tombstone_file], report=report)
+
+    # THEN
+    merged_items = [item for merged_file in merged_files for item in merged_file]
+    assert [item.key for item in merged_items if item.is_tombstone] == ["key1"]
+    assert report.nb_dropped_tombstones == 0
+    database.rebuild_index()
+    assert database.get(key="key1") is None
+    assert database.get(key="key2") == b"value2"
+
+    database.clear()
+
+
+def test_merge_keeps_empty_values():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=1000)
+    database.append(key="key1", value=b"")
+    database.append(key="key2", value=b"value2")
+    database.delete(key="key2")
+    database._generate_new_active_file()
+    merge_worker = MergeWorker(storage=database)
+
+    # WHEN
+    merge_worker.do_merge()
+
+    # THEN
+    assert database.get(key="key1") == b""
+    assert database.get(key="key2") is None
+    database.rebuild_index()
+    assert database.get(key="key1") == b""
+    assert database.get(key="key2") is None
+
+    database.clear()
+
+
+@pytest.mark.parametrize("compact_key_dir", [False, True])
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_concurrent_reads_during_merge_never_fail_nor_return_stale_values(
+    compact_key_dir, use_mmap
+):
+    # GIVEN
+    database = Storage(
+        directory=TEST_DIRECTORY,
+        max_file_size=300,
+        use_mmap=use_mmap,
+        compact_key_dir=compact_key_dir,
+    )
+    keys = [f"key{i}" for i in range(20)]
+    nb_versions = 50
+    # Last version of each key whose write has returned
+    written_versions = {key: 0 for key in keys}
+    for key in keys:
+        database.append(key=key, value=bytes(f"{key}:0", encoding="utf-8"))
+    merge_worker = MergeWorker(storage=database, file_size_threshold=300)
+    is_writing = threading.Event()
+    is_writing.set()
+    errors = []
+
+    def write():
+        for version in range(1, nb_versions):
+            for key in keys:
+                database.append(
+                    key=key, value=bytes(f"{key}:{version}", encoding="utf-8")
+                )
+                written_versions[key] = version
+        is_writing.clear()
+
+    def read():
+        try:
+            while is_writing.is_set():
+                for key in keys:
+                    min_version = written_versions[key]
+                    value = database.get(key=key)
+                    value_key, version = str(value, encoding="utf-8").split(":")
+                    assert value_key == key and int(version) >= min_version
+                values = database.multi_get(keys=keys)
+                assert all(values[key].startswith(bytes(key, "utf-8")) for key in keys)
+        except Exception as error:
+            errors.append(error)
+
+    def merge():
+        try:
+            while is_writing.is_set():
+                merge_worker.do_merge()
+        except Exception as error:
+            errors.append(error)
+
+    # WHEN
+    threads = [threading.Thread(target=write), threading.Thread(target=merge)]
+    threads += [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # THEN
+    assert errors == []
+    last_values = {key: bytes(f"{key}:{nb_versions - 1}", "utf-8") for key in keys}
+    assert database.multi_get(keys=keys) == last_values
+    database.rebuild_index()
+    assert database.multi_get(keys=keys) == last_values
+
+    database.clear()
+
+
+def test_merge_keeps_files_with_a_corrupted_record():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=1000)
+    for i in range(7):
+        database.append(key=f"key{i}", value=f"value{i}".encode())
+    database._generate_new_active_file()
+    immutable_file_path = database.key_dir.get("key0").file_path
+    record_size = DataFileItem(key="key0", value=b"value0").size
+    with open(immutable_file_path, "r+b") as file:
+        file.seek(2 * record_size + DataFileItem.METADATA_SIZE)
+        file.write(b"X")
+    merge_worker = MergeWorker(storage=database)
+
+    # WHEN/THEN
+    with pytest.raises(CorruptedRecordError):
+        merge_worker.do_merge()
+    assert database.manifest.get_paths() == [immutable_file_path]
+    assert not any(
+        filename.startswith("merged-") for filename in os.listdir(database.directory)
+    )
+    for i in [0, 1, 3, 4, 5, 6]:
+        assert database.get(key=f"key{i}") == f"value{i}".encode()
+
+    database.clear()
@@ -0,0 +1,129 @@
+import asyncio
+import os
+from contextlib import contextmanager
+
+from src.io_handling.data_file import DataFileItem
+from src.merge_worker import MergeWorker
+from src.metrics import Histogram, render_prometheus
+from src.server import MetricsServer
+from src.storage_engine import StorageEngine
+
+TEST_DIRECTORY = "./datafiles/test_metrics"
+
+
+def get_data_files_size(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for name in os.listdir(directory)
+        if name.endswith(".data")
+    )
+
+
+def test_histogram_estimates_quantiles_with_bucket_bounds():
+    # GIVEN
+    histogram = Histogram()
+
+    # WHEN
+    for _ in range(98):
+        histogram.observe(value=3e-6)
+    histogram.observe(value=0.001)
+    histogram.observe(value=100)
+
+    # THEN
+    stats = histogram.to_dict()
+    assert stats["count"] == 100
+    assert stats["p50_us"] == 4
+    assert stats["p99_us"] == 1024
+    assert stats["buckets"]["4e-06"] == 98
+    assert histogram.get_quantile(1) == float("inf")
+
+
+def test_stats_count_operations_bytes_rotations_and_merges():
+    # GIVEN
+    storage_engine = StorageEngine(directory=TEST_DIRECTORY, max_file_size=100)
+    storage = storage_engine.storage
+    for i in range(10):
+        storage.append(key="key", value=b"value%d" % i)
+    storage.delete(key="key")
+    storage.append(key="other_key", value=b"value")
+    storage.get(key="other_key")
+    storage.active_data_file.flush_pending_writes()
+    written_bytes = get_data_files_size(directory=TEST_DIRECTORY)
+
+    # WHEN
+    MergeWorker(storage=storage, file_size_threshold=100).do_merge()
+
+    # THEN
+    stats = storage_engine.stats()
+    assert stats["operations"]["append"]["count"] == 11
+    assert stats["operations"]["delete"]["count"] == 1
+    assert stats["operations"]["get"]["count"] == 1
+    assert stats["operations"]["merge"]["count"] == 1
+    assert stats["counters"]["bytes_written"] == written_bytes
+    read_record = DataFileItem(key="other_key", value=b"value")
+    assert stats["counters"]["bytes_read"] == read_record.size
+    assert stats["counters"]["file_rotations"] > 0
+    assert stats["counters"]["merged_files"] > 0
+    assert stats["counters"]["reclaimed_bytes"] > 0
+    assert stats["key_dir_size"] == 1
+    assert set(stats["dead_bytes"]) <= {
+        os.path.join(TEST_DIRECTORY, name) for name in os.listdir(TEST_DIRECTORY)
+    }
+
+    storage_engine.close()
+    storage.clear()
+
+
+def test_sampling_hook_wraps_a_fraction_of_the_operations():
+    # GIVEN
+    storage_engine = StorageEngine(directory=TEST_DIRECTORY, max_file_size=1000)
+    storage = storage_engine.storage
+    sampled_operations = []
+
+    @contextmanager
+    def record_operation(operation: str):
+        sampled_operations.append(operation)
+        yield
+
+    # WHEN
+    storage.metrics.set_sampling_hook(hook=record_operation, sampling_rate=1)
+    storage.append(key="key", value=b"value")
+    storage.get(key="key")
+    storage.metrics.set_sampling_hook(hook=None)
+    storage.get(key="key")
+
+    # THEN
+    assert sampled_operations == ["append", "get"]
+    assert storage.metrics.latencies["get"].count == 2
+
+    storage_engine.close()
+    storage.clear()
+
+
+def test_metrics_server_exposes_stats_to_prometheus():
+    # GIVEN
+    storage_engine = StorageEngine(directory=TEST_DIRECTORY, max_file_size=1000)
+    storage_engine.storage.append(key="key", value=b"value")
+
+    async def scrape() -> bytes:
+        server = MetricsServer(storage_engine=storage_engine, port=0)
+        await server.start()
+        reader, writer = await asyncio.open_connection(*server.address)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+        await server.close()
+        return response
+
+    # WHEN
+    response = asyncio.run(scrape())
+
+    # THEN
+    headers, body = response.split(b"\r\n\r\n", 1)
+    assert headers.startswith(b"HTTP/1.1 200 OK")
+    assert body == bytes(render_prometheus(stats=storage_engine.stats()), "utf-8")
+    assert b'pytcask_operation_duration_seconds_count{operation="append"} 1' in body
+    assert b"pytcask_key_dir_size 1" in body
+
+    storage_engine.close()
+    storage_engine.storage.clear()
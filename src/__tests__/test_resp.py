@@ -0,0 +1,123 @@
+import pytest
+
+from src.resp import RespError, RespParser, encode, encode_command
+
+
+def test_encode_and_parse_every_type_of_value():
+    # GIVEN
+    values = [
+        "OK",
+        RespError("ERR oops"),
+        42,
+        b"bulk\r\nstring",
+        None,
+        [b"a", [1, None]],
+    ]
+    parser = RespParser()
+
+    # WHEN
+    parser.feed(b"".join(encode(value) for value in values))
+
+    # THEN
+    assert parser.get_values() == values
+    assert parser.buffer == b""
+
+
+def test_parser_waits_for_complete_values():
+    # GIVEN
+    parser = RespParser()
+    data = encode_command("SET", "key", b"value") + encode_command("GET", "key")
+
+    # WHEN
+    values = []
+    for i in range(len(data)):
+        parser.feed(data[i : i + 1])
+        values += parser.get_values()
+
+    # THEN
+    assert values == [[b"SET", b"key", b"value"], [b"GET", b"key"]]
+
+
+def test_parser_accepts_inline_commands():
+    # GIVEN
+    parser = RespParser()
+
+    # WHEN
+    parser.feed(b"SET key value\r\nPING\r\nGET ke")
+
+    # THEN
+    assert parser.get_values() == [[b"SET", b"key", b"value"], [b"PING"]]
+    assert parser.buffer == b"GET ke"
+
+
+def test_parser_raises_on_protocol_errors():
+    # GIVEN
+    parser = RespParser()
+
+    # WHEN
+    parser.feed(b"$abc\r\n")
+
+    # THEN
+    with pytest.raises(RespError):
+        parser.get_values()
+
+
+def test_parser_resumes_incomplete_arrays_from_the_last_complete_element():
+    # GIVEN
+    parser = RespParser()
+    parser.feed(b"*3\r\n$3\r\nSET\r\n$3\r\nkey\r\n$5\r\nva")
+
+    # WHEN
+    first_values = parser.get_values()
+    parser.feed(b"lue\r\n")
+
+    # THEN
+    assert first_values == []
+    # The complete elements are not kept in the buffer, to be parsed again
+    assert parser.buffer == b"$5\r\nvalue\r\n"
+    assert parser.get_values() == [[b"SET", b"key", b"value"]]
+    assert parser.buffer == b""
+
+
+def test_parser_parses_nested_arrays_fed_in_pieces():
+    # GIVEN
+    parser = RespParser()
+    data = encode([[b"a", [1, b"b"]], [], None, b"c"])
+
+    # WHEN
+    values = []
+    for i in range(len(data)):
+        parser.feed(data[i : i + 1])
+        values += parser.get_values()
+
+    # THEN
+    assert values == [[[b"a", [1, b"b"]], [], None, b"c"]]
+
+
+@pytest.mark.parametrize(
+    "data", [b"$11\r\n", b"*3\r\n", b"*1\r\n*3\r\n", b"GET " + b"k" * 20]
+)
+def test_parser_raises_on_too_big_values(data):
+    # GIVEN
+    parser = RespParser(max_bulk_size=10, max_array_size=2)
+    parser.MAX_LINE_SIZE = 16
+
+    # WHEN
+    parser.feed(data)
+
+    # THEN
+    with pytest.raises(RespError):
+        parser.get_values()
+
+
+def test_parser_raises_when_the_buffer_is_too_big():
+    # GIVEN
+    parser = RespParser(max_buffer_size=30)
+    for data in [b"*3\r\n$10\r\n0123456789\r\n", b"$10\r\n0123456789\r\n"]:
+        parser.feed(data)
+        assert parser.get_values() == []
+
+    # WHEN / THEN
+    # The elements already parsed count as well
+    with pytest.raises(RespError):
+        parser.feed(b"$10\r\n012345")
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from src.async_storage_engine import AsyncStorageEngine
+from src.client import StorageClient
+from src.resp import RespError
+from src.server import StorageServer
+from src.storage_engine import StorageEngine
+
+TEST_DIRECTORY = "./datafiles/test_server"
+
+
+def run_with_server(scenario) -> None:
+    """Runs `scenario(client)` against a server started on a random port, then clears the store."""
+
+    async def run():
+        storage_engine = StorageEngine(directory=TEST_DIRECTORY, max_file_size=1000)
+        async with AsyncStorageEngine(storage_engine=storage_engine) as database:
+            server = StorageServer(database=database, port=0)
+            await server.start()
+            client = await StorageClient.connect(*server.address)
+            try:
+                await scenario(client)
+            finally:
+                await client.close()
+                await server.close()
+        storage_engine.storage.clear()
+
+    asyncio.run(run())
+
+
+def test_server_executes_commands():
+    async def scenario(client: StorageClient):
+        # GIVEN
+        await client.set(key="key1", value=b"value1")
+        await client.set(key="key2", value=b"value2")
+
+        # WHEN
+        nb_deleted_keys = await client.delete("key2", "unknown")
+
+        # THEN
+        assert await client.ping() == "PONG"
+        assert nb_deleted_keys == 1
+        assert await client.get(key="key1") == b"value1"
+        assert await client.get(key="key2") is None
+        assert await client.multi_get(keys=["key1", "key2"]) == [b"value1", None]
+        # A key given several times is counted once
+        assert await client.delete("key1", "key1") == 1
+
+    run_with_server(scenario)
+
+
+def test_server_replies_to_pipelined_commands_in_order():
+    async def scenario(client: StorageClient):
+        # GIVEN
+        commands = [("SET", "key", i) for i in range(10)] + [
+            ("GET", "key"),
+            ("DEL", "key"),
+            ("DEL", "key"),
+            ("UNKNOWN",),
+            ("GET",),
+            ("GET", "key"),
+        ]
+
+        # WHEN
+        replies = await client.execute_pipeline(commands=commands)
+
+        # THEN
+        assert replies == ["OK"] * 10 + [
+            b"9",
+            1,
+            0,
+            RespError("ERR unknown command 'UNKNOWN'"),
+            RespError("ERR wrong number of arguments for 'GET' command"),
+            None,
+        ]
+
+    run_with_server(scenario)
+
+
+def test_scan_iterates_over_all_keys():
+    async def scenario(client: StorageClient):
+        # GIVEN
+        keys = [f"key{i:02}" for i in range(25)] + ["other"]
+        await client.execute_pipeline(commands=[("SET", key, b"v") for key in keys])
+
+        # WHEN
+        cursor, scanned_keys = 0, []
+        while True:
+            cursor, page = await client.scan(cursor=cursor, match="key*", count=10)
+            scanned_keys += page
+            if cursor == 0:
+                break
+
+        # THEN
+        assert scanned_keys == keys[:-1]
+        with pytest.raises(RespError):
+            await client.scan(cursor=0, count=0)
+
+    run_with_server(scenario)
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from src.sharded_storage_engine import ShardedStorageEngine
+
+TEST_DIRECTORY = "./datafiles/test_sharded_storage_engine"
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_keys_are_spread_over_shards_behind_the_storage_api(use_processes):
+    # GIVEN
+    database = ShardedStorageEngine(
+        directory=TEST_DIRECTORY,
+        nb_shards=3,
+        use_processes=use_processes,
+        max_file_size=100,
+    )
+
+    # WHEN
+    for index in range(30):
+        database.append(key=f"key{index}", value=b"value%d" % index)
+    database.delete(key="key0")
+    database.write_batch(items=[("key1", b"new_value1"), ("key2", None)])
+
+    # THEN
+    assert database.get(key="key0") is None
+    assert database.get(key="key1") == b"new_value1"
+    assert database.multi_get(keys=["key2", "key3", "key4"]) == {
+        "key2": None,
+        "key3": b"value3",
+        "key4": b"value4",
+    }
+    assert sorted(database.keys()) == sorted(
+        f"key{index}" for index in range(1, 30) if index != 2
+    )
+    stats = database.stats()
+    assert len(stats) == 3
+    assert sum(shard_stats["key_dir_size"] for shard_stats in stats) == 28
+    # Every shard gets some keys
+    assert all(shard_stats["key_dir_size"] > 0 for shard_stats in stats)
+
+    # WHEN — the shards are reopened
+    database.close()
+    database = ShardedStorageEngine(
+        directory=TEST_DIRECTORY,
+        nb_shards=3,
+        use_processes=use_processes,
+        max_file_size=100,
+    )
+
+    # THEN
+    assert database.get(key="key1") == b"new_value1"
+    assert database.get(key="key29") == b"value29"
+    assert sorted(os.listdir(TEST_DIRECTORY)) == ["shard-0", "shard-1", "shard-2"]
+
+    database.close()
+    database.clear()
+
+
+def test_a_directory_cannot_be_opened_with_another_number_of_shards():
+    # GIVEN
+    database = ShardedStorageEngine(
+        directory=TEST_DIRECTORY, nb_shards=2, max_file_size=100
+    )
+    database.append(key="key", value=b"value")
+    database.close()
+
+    # WHEN / THEN
+    with pytest.raises(ValueError):
+        ShardedStorageEngine(directory=TEST_DIRECTORY, nb_shards=3, max_file_size=100)
+
+    database.clear()
@@ -1,7 +1,22 @@
 import os
+import struct
+import threading
 
 import pytest
 
+from src.io_handling import durability
+from src.io_handling.compression import Codec, CompressionPolicy
+from src.io_handling.data_file import (
+    CorruptedRecordError,
+    DataFile,
+    DataFileItem,
+    ImmutableDataFile,
+    UnsupportedFormatError,
+)
+from src.io_handling.hint_file import HintFile
+from src.io_handling.durability import DurabilityPolicy
+from src.io_handling.key_dir_snapshot import KeyDirSnapshot
+from src.io_handling.manifest import Manifest
 from src.merge_worker import MergeWorker
 from src.storage import Storage
 from src.__fixtures__.database import (
@@ -151,3 +166,738 @@ def test_handle_tombstones(
     assert database.key_dir.get(key="key1") is None
 
     database.clear()
+
+
+def test_memory_mapped_reads_from_immutable_and_merged_files():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=70, use_mmap=True)
+    for key, value in db_with_multiple_immutable_files_key_value_pairs:
+        database.append(key=key, value=value)
+    expected_pairs = {
+        key: value for key, value in db_with_multiple_immutable_files_key_value_pairs
+    }
+
+    # WHEN/THEN — read from immutable files
+    for key, expected_value in expected_pairs.items():
+        assert database.get(key=key) == expected_value
+    assert len(database.file_handle_pool.memory_maps) > 0
+
+    # WHEN/THEN — merged files are unmapped and replaced by the merged one
+    MergeWorker(storage=database).do_merge()
+    for path in database.file_handle_pool.memory_maps:
+        assert os.path.exists(path)
+    for key, expected_value in expected_pairs.items():
+        assert database.get(key=key) == expected_value
+
+    database.clear()
+
+
+@pytest.mark.parametrize(
+    "db_with_multiple_immutable_files", [TEST_DIRECTORY], indirect=True
+)
+def test_build_index_from_unmerged_data_files(db_with_multiple_immutable_files):
+    # GIVEN
+    database, _ = db_with_multiple_immutable_files
+    expected_pairs = {
+        key: value for key, value in db_with_multiple_immutable_files_key_value_pairs
+    }
+    database._generate_new_active_file()  # So that all records are in immutable files
+
+    # WHEN
+    database.rebuild_index()
+
+    # THEN
+    for key, expected_value in expected_pairs.items():
+        assert database.get(key=key) == expected_value
+
+    database.clear()
+
+
+@pytest.mark.parametrize("durability_policy", list(DurabilityPolicy))
+def test_can_append_and_retrieve_keys_with_any_durability_policy(durability_policy):
+    # GIVEN
+    database = Storage(
+        directory=TEST_DIRECTORY, max_file_size=70, durability_policy=durability_policy
+    )
+
+    # WHEN
+    for key, value in db_with_multiple_immutable_files_key_value_pairs:
+        database.append(key=key, value=value)
+
+    # THEN
+    expected_pairs = {
+        key: value for key, value in db_with_multiple_immutable_files_key_value_pairs
+    }
+    for key, expected_value in expected_pairs.items():
+        assert database.get(key=key) == expected_value
+
+    database.close()
+    database.clear()
+
+
+def test_records_of_active_file_are_kept_after_restart():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=1000)
+    database.append(key="key1", value=b"value1")
+    database.append(key="key2", value=b"value2")
+    database.close()
+
+    # WHEN
+    restarted_database = Storage(directory=TEST_DIRECTORY, max_file_size=1000)
+    restarted_database.append(key="key2", value=b"another_value2")
+
+    # THEN
+    assert restarted_database.get(key="key1") == b"value1"
+    assert restarted_database.get(key="key2") == b"another_value2"
+
+    restarted_database.close()
+    restarted_database.clear()
+
+
+def test_concurrent_writers_share_group_commits(monkeypatch):
+    # GIVEN
+    nb_fsync_calls = 0
+    fsync = os.fsync
+
+    def counting_fsync(file_descriptor):
+        nonlocal nb_fsync_calls
+        nb_fsync_calls += 1
+        fsync(file_descriptor)
+
+    monkeypatch.setattr(durability.os, "fsync", counting_fsync)
+    database = Storage(
+        directory=TEST_DIRECTORY,
+        max_file_size=100_000,
+        durability_policy=DurabilityPolicy.GROUP_COMMIT,
+        group_commit_interval_ms=20,
+    )
+    nb_writers, nb_writes_per_writer = 8, 5
+
+    def write(writer_id):
+        for i in range(nb_writes_per_writer):
+            database.append(key=f"key{writer_id}-{i}", value=b"value")
+
+    # WHEN
+    writers = [threading.Thread(target=write, args=(i,)) for i in range(nb_writers)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    # THEN
+    assert nb_fsync_calls < nb_writers * nb_writes_per_writer
+    assert database.get(key="key3-4") == b"value"
+
+    database.close()
+    database.clear()
+
+
+def test_write_batch_appends_and_deletes_keys():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=1000)
+    database.append(key="key1", value=b"value1")
+
+    # WHEN
+    database.write_batch(
+        [
+            ("key2", b"value2"),
+            ("key1", None),
+            ("key3", b"value3"),
+            ("key2", b"another_value2"),
+        ]
+    )
+
+    # THEN
+    assert database.get(key="key1") is None
+    assert database.get(key="key2") == b"another_value2"
+    assert database.get(key="key3") == b"value3"
+    database.rebuild_index()
+    assert database.get(key="key2") == b"another_value2"
+    assert database.get(key="key3") == b"value3"
+
+    database.clear()
+
+
+def test_write_batch_never_spans_two_files():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=70)
+    database.append(key="key1", value=b"value1")
+
+    # WHEN
+    database.write_batch([(f"key{i}", b"value") for i in range(2, 6)])
+
+    # THEN
+    data_filenames = [
+        name for name in os.listdir(TEST_DIRECTORY) if name.endswith(".data")
+    ]
+    assert len(data_filenames) == 2  # The batch is alone in the active file
+    for i in range(2, 6):
+        key_dir_entry = database.key_dir.get(f"key{i}")
+        assert key_dir_entry.file_path == database.active_data_file.path
+
+    database.clear()
+
+
+def test_partially_written_batch_is_ignored_when_rebuilding_index():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=1000)
+    database.append(key="key1", value=b"value1")
+    database.write_batch([("key1", b"another_value1"), ("key2", b"value2")])
+    database.close()
+    # Simulate a crash in the middle of the batch write (the COMMIT marker is lost)
+    active_file_path = database.active_data_file.path
+    os.truncate(active_file_path, os.path.getsize(active_file_path) - 1)
+
+    # WHEN
+    restarted_database = Storage(directory=TEST_DIRECTORY, max_file_size=1000)
+
+    # THEN
+    assert restarted_database.get(key="key1") == b"value1"
+    assert restarted_database.get(key="key2") is None
+
+    restarted_database.clear()
+
+
+def test_active_file_of_a_previous_format_is_not_truncated_at_restart():
+    # GIVEN — records of the original format: timestamp, key size, value size, key, value (no checksum nor version)
+    os.makedirs(TEST_DIRECTORY, exist_ok=True)
+    active_file_path = f"{TEST_DIRECTORY}/active.data"
+    with open(active_file_path, "wb") as file:
+        for key, value in [(b"k", b"v"), (b"key2", b"value2")]:
+            file.write(struct.pack("iii", 1_700_000_000, len(key), len(value)))
+            file.write(key + value)
+    size = os.path.getsize(active_file_path)
+
+    # WHEN/THEN
+    with pytest.raises(UnsupportedFormatError):
+        Storage(directory=TEST_DIRECTORY, max_file_size=1000)
+    assert os.path.getsize(active_file_path) == size
+
+    os.remove(active_file_path)
+    os.remove(f"{TEST_DIRECTORY}/{Manifest.FILENAME}")
+
+
+def test_torn_write_at_the_end_of_active_file_is_truncated_at_restart():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=1000)
+    database.append(key="key1", value=b"value1")
+    database.append(key="key2", value=b"value2")
+    database.close()
+    valid_size = os.path.getsize(database.active_data_file.path)
+    # Simulate a crash in the middle of a write
+    with open(database.active_data_file.path, "ab") as file:
+        file.write(DataFileItem(key="key3", value=b"value3").to_bytes()[:-2])
+
+    # WHEN
+    restarted_database = Storage(directory=TEST_DIRECTORY, max_file_size=1000)
+    restarted_database.append(key="key3", value=b"another_value3")
+
+    # THEN
+    assert restarted_database.get(key="key1") == b"value1"
+    assert restarted_database.get(key="key3") == b"another_value3"
+    immutable_file_path = restarted_database.key_dir.get("key1").file_path
+    assert os.path.getsize(immutable_file_path) == valid_size
+    restarted_database.rebuild_index()
+    assert restarted_database.get(key="key3") == b"another_value3"
+
+    restarted_database.close()
+    restarted_database.clear()
+
+
+@pytest.mark.parametrize(
+    "db_with_multiple_immutable_files", [TEST_DIRECTORY], indirect=True
+)
+def test_reads_verify_checksums_when_enabled(db_with_multiple_immutable_files):
+    # GIVEN
+    database, _ = db_with_multiple_immutable_files
+    database.verify_checksums = True
+    key_dir_entry = database.key_dir.get("key2")
+    with open(key_dir_entry.file_path, "r+b") as file:
+        file.seek(key_dir_entry.value_position)
+        file.write(b"X")
+
+    # WHEN/THEN
+    assert database.get(key="k3") == b"yet_another_val3"
+    assert database.multi_get(keys=["k2", "k3"]) == {
+        "k2": b"v2",
+        "k3": b"yet_another_val3",
+    }
+    with pytest.raises(CorruptedRecordError):
+        database.get(key="key2")
+    with pytest.raises(CorruptedRecordError):
+        database.multi_get(keys=["key2", "k3"])
+    database.verify_checksums = False
+    assert database.get(key="key2") == b"Xnother_value2"
+
+    database.clear()
+
+
+def test_compressed_values_are_stored_in_less_bytes():
+    # GIVEN
+    database = Storage(
+        directory=TEST_DIRECTORY,
+        max_file_size=1000,
+        compression_policy=CompressionPolicy(codec=Codec.ZLIB, min_value_size=10),
+    )
+    value = b'{"field": "value"}' * 20
+
+    # WHEN
+    database.append(key="key1", value=value)
+    database.write_batch(items=[("key2", value), ("small_key", b"small")])
+    database.close()
+
+    # THEN
+    restarted_database = Storage(directory=TEST_DIRECTORY, max_file_size=1000)
+    assert restarted_database.get(key="key1") == value
+    assert restarted_database.multi_get(keys=["key2", "small_key"]) == {
+        "key2": value,
+        "small_key": b"small",
+    }
+    assert restarted_database.key_dir.get("key1").value_size < len(value)
+    assert restarted_database.key_dir.get("small_key").value_size == len(b"small")
+
+    restarted_database.close()
+    restarted_database.clear()
+
+
+def test_merge_compresses_values_with_merge_compression_policy():
+    # GIVEN
+    database = Storage(
+        directory=TEST_DIRECTORY,
+        max_file_size=500,
+        merge_compression_policy=CompressionPolicy(codec=Codec.LZMA),
+    )
+    values = {f"key{i}": b"value%d" % i * 30 for i in range(10)}
+    for key, value in values.items():
+        database.append(key=key, value=value)
+    uncompressed_value_size = database.key_dir.get("key0").value_size
+
+    # WHEN
+    database.close()
+    database = Storage(
+        directory=TEST_DIRECTORY,
+        max_file_size=500,
+        merge_compression_policy=CompressionPolicy(codec=Codec.LZMA),
+    )
+    MergeWorker(storage=database, file_size_threshold=500).do_merge()
+
+    # THEN
+    assert database.key_dir.get("key0").value_size < uncompressed_value_size
+    assert database.multi_get(keys=list(values)) == values
+    database.rebuild_index()
+    assert database.get(key="key9") == values["key9"]
+
+    database.clear()
+
+
+@pytest.mark.parametrize(
+    "db_with_multiple_immutable_files", [TEST_DIRECTORY], indirect=True
+)
+def test_multi_get_returns_values_from_all_files(db_with_multiple_immutable_files):
+    # GIVEN
+    database, _ = db_with_multiple_immutable_files
+    expected_pairs = {
+        key: value for key, value in db_with_multiple_immutable_files_key_value_pairs
+    }
+    keys = list(expected_pairs.keys()) + ["missing_key"]
+
+    # WHEN
+    values = database.multi_get(keys=keys)
+
+    # THEN
+    assert values == {**expected_pairs, "missing_key": None}
+
+    database.clear()
+
+
+@pytest.mark.parametrize("db_with_only_active_file", [TEST_DIRECTORY], indirect=True)
+def test_multi_get_coalesces_reads_of_close_values(db_with_only_active_file):
+    # GIVEN
+    database = db_with_only_active_file
+    read_calls = []
+    read = database.file_handle_pool.read
+
+    def recording_read(path, start, size):
+        read_calls.append((path, start, size))
+        return read(path=path, start=start, size=size)
+
+    database.file_handle_pool.read = recording_read
+
+    # WHEN
+    values = database.multi_get(keys=["key1", "key2", "key3"])
+
+    # THEN
+    assert values == {
+        "key1": b"yet_another_value1",
+        "key2": b"value2",
+        "key3": b"my_value3",
+    }
+    assert len(read_calls) == 1
+
+    # WHEN/THEN — values further apart than the allowed gap are read separately (key2 and key3 are contiguous)
+    database.max_read_gap = 0
+    database.multi_get(keys=["key1", "key2", "key3"])
+    assert len(read_calls) == 1 + 2
+
+    database.clear()
+
+
+def test_storage_with_compact_key_dir():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=70, compact_key_dir=True)
+    for key, value in db_with_multiple_immutable_files_key_value_pairs:
+        database.append(key=key, value=value)
+
+    # WHEN
+    MergeWorker(storage=database, file_size_threshold=100).do_merge()
+    database.rebuild_index()
+
+    # THEN
+    expected_pairs = {
+        key: value for key, value in db_with_multiple_immutable_files_key_value_pairs
+    }
+    for key, expected_value in expected_pairs.items():
+        assert database.get(key=key) == expected_value
+
+    database.clear()
+
+
+def test_build_index_handles_tombstones():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=70)
+    for key, value in db_with_multiple_immutable_files_key_value_pairs:
+        database.append(key=key, value=value)
+    database.delete(key="key1")
+    database.delete(key="k3")
+    database.append(key="k3", value=b"new_val3")
+    database._generate_new_active_file()
+
+    # WHEN
+    database.rebuild_index()
+
+    # THEN
+    assert database.key_dir.get("key1") is None
+    assert database.get(key="key1") is None
+    assert database.get(key="k3") == b"new_val3"
+    assert database.get(key="key2") == b"another_value2"
+
+    database.clear()
+
+
+def test_empty_values_are_not_tombstones():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=1000)
+    database.append(key="key1", value=b"")
+    database.write_batch(items=[("key2", b""), ("key3", b"value3")])
+    database.delete(key="key3")
+    database._generate_new_active_file()
+    database.append(key="key4", value=b"")
+    database._wait_for_hint_files()
+
+    # WHEN/THEN — from the hint files of rotated files, then from the data files only
+    for remove_hint_files in [False, True]:
+        if remove_hint_files:
+            for path in database.get_immutable_file_paths():
+                if os.path.exists(HintFile.get_path(path)):
+                    os.remove(HintFile.get_path(path))
+        database.close()
+        database = Storage(directory=TEST_DIRECTORY, max_file_size=1000)
+        assert database.get(key="key1") == b""
+        assert database.get(key="key2") == b""
+        assert database.get(key="key3") is None
+        assert database.get(key="key4") == b""
+
+    database.clear()
+
+
+def test_build_index_reads_hint_files_of_rotated_files(monkeypatch):
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=70)
+    for key, value in db_with_multiple_immutable_files_key_value_pairs:
+        database.append(key=key, value=value)
+    database.write_batch(items=[("key1", None), ("k3", b"new_val3")])
+    database._generate_new_active_file()
+    database.append(key="key2", value=b"yet_another_value2")
+    database._wait_for_hint_files()
+    data_file_paths = database.get_immutable_file_paths()
+    parsed_data_file_paths = []
+    build_partial_index = DataFile.build_partial_index
+
+    def recording_build_partial_index(data_file, start=0):
+        parsed_data_file_paths.append(data_file.path)
+        return build_partial_index(data_file, start=start)
+
+    monkeypatch.setattr(DataFile, "build_partial_index", recording_build_partial_index)
+
+    # WHEN
+    database.rebuild_index()
+
+    # THEN — only the active file is parsed
+    assert all(os.path.exists(HintFile.get_path(path)) for path in data_file_paths)
+    assert parsed_data_file_paths == [database.active_data_file.path]
+    assert database.get(key="key1") is None
+    assert database.get(key="k3") == b"new_val3"
+    assert database.get(key="key2") == b"yet_another_value2"
+
+    # WHEN — a hint file is incomplete (e.g. crash while writing it), its data file is parsed instead
+    incomplete_hint_file_path = HintFile.get_path(data_file_paths[0])
+    os.truncate(
+        incomplete_hint_file_path, os.path.getsize(incomplete_hint_file_path) - 1
+    )
+    parsed_data_file_paths.clear()
+    database.rebuild_index()
+
+    # THEN
+    assert sorted(parsed_data_file_paths) == sorted(
+        [data_file_paths[0], database.active_data_file.path]
+    )
+    assert database.get(key="k3") == b"new_val3"
+    assert database.get(key="key2") == b"yet_another_value2"
+
+    database.clear()
+
+
+@pytest.mark.parametrize(
+    "db_with_multiple_immutable_files", [TEST_DIRECTORY], indirect=True
+)
+def test_parallel_build_index_matches_serial_build_index(
+    db_with_multiple_immutable_files,
+):
+    # GIVEN
+    database, _ = db_with_multiple_immutable_files
+    MergeWorker(storage=database, file_size_threshold=100).do_merge()
+    database.append(key="key2", value=b"yet_another_value2")
+    database.delete(key="key3")
+    database.rebuild_index()
+    serially_built_entries = dict(database.key_dir)
+
+    # WHEN
+    database.rebuild_workers = 2
+    database.rebuild_index()
+
+    # THEN
+    assert dict(database.key_dir) == serially_built_entries
+    assert database.get(key="key2") == b"yet_another_value2"
+    assert database.get(key="key3") is None
+
+    database.clear()
+
+
+@pytest.mark.parametrize("compact_key_dir", [False, True])
+def test_build_index_from_snapshot_replays_records_written_after_checkpoint(
+    compact_key_dir,
+):
+    # GIVEN
+    database = Storage(
+        directory=TEST_DIRECTORY, max_file_size=70, compact_key_dir=compact_key_dir
+    )
+    for key, value in db_with_multiple_immutable_files_key_value_pairs:
+        database.append(key=key, value=value)
+    database.checkpoint()
+    database.append(key="key1", value=b"after_checkpoint1")
+    database.delete(key="key2")
+    database.append(key="new_key", value=b"new_value_that_does_not_fit_in_the_file")
+    database.close()
+
+    # WHEN
+    restarted_database = Storage(
+        directory=TEST_DIRECTORY, max_file_size=70, compact_key_dir=compact_key_dir
+    )
+
+    # THEN
+    assert restarted_database._rebuild_index_from_snapshot() is True
+    expected_pairs = {
+        key: value for key, value in db_with_multiple_immutable_files_key_value_pairs
+    }
+    expected_pairs["key1"] = b"after_checkpoint1"
+    expected_pairs["new_key"] = b"new_value_that_does_not_fit_in_the_file"
+    del expected_pairs["key2"]
+    assert len(restarted_database.key_dir) == len(expected_pairs)
+    for key, expected_value in expected_pairs.items():
+        assert restarted_database.get(key=key) == expected_value
+    assert restarted_database.get(key="key2") is None
+
+    restarted_database.close()
+    restarted_database.clear()
+
+
+@pytest.mark.parametrize(
+    "db_with_multiple_immutable_files", [TEST_DIRECTORY], indirect=True
+)
+def test_snapshot_is_not_used_once_covered_files_have_been_merged(
+    db_with_multiple_immutable_files,
+):
+    # GIVEN
+    database, _ = db_with_multiple_immutable_files
+    database.checkpoint()
+    MergeWorker(storage=database).do_merge()
+
+    # WHEN/THEN
+    assert database._rebuild_index_from_snapshot() is False
+    database.rebuild_index()
+    assert database.get(key="key1") == b"yet_another_value1"
+
+    database.clear()
+
+
+def test_snapshot_is_not_used_once_the_file_active_at_checkpoint_has_been_merged():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=1000)
+    database.append(key="key1", value=b"value1")
+    database._generate_new_active_file()
+    database.append(key="key2", value=b"value2")
+    database.checkpoint()
+    database._generate_new_active_file()
+    rotated_file = ImmutableDataFile(path=database.key_dir.get("key2").file_path)
+    database.append(key="key2", value=b"another_value2")
+    # All the records of the file are dead: it is removed without creating any merged file
+    MergeWorker(storage=database).do_merge(data_files=[rotated_file])
+    database.close()
+
+    # WHEN — the file active at restart takes its place (and is rotated with the next sequence number)
+    restarted_database = Storage(directory=TEST_DIRECTORY, max_file_size=1000)
+
+    # THEN
+    assert restarted_database._rebuild_index_from_snapshot() is False
+    assert restarted_database.get(key="key1") == b"value1"
+    assert restarted_database.get(key="key2") == b"another_value2"
+
+    restarted_database.clear()
+
+
+def test_corrupted_snapshot_is_ignored():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=70)
+    database.append(key="key1", value=b"value1")
+    database.checkpoint()
+    snapshot_path = f"{TEST_DIRECTORY}/{KeyDirSnapshot.FILENAME}"
+    with open(snapshot_path, "r+b") as snapshot_file:
+        snapshot_file.seek(20)
+        snapshot_file.write(b"\xff")
+
+    # WHEN/THEN
+    assert database._rebuild_index_from_snapshot() is False
+    database.rebuild_index()
+    assert database.get(key="key1") == b"value1"
+
+    database.clear()
+
+
+def test_data_files_are_found_through_the_manifest_at_restart(monkeypatch):
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=70)
+    for version in range(5):
+        database.append(key="key1", value=b"value1_%d" % version)
+        database.append(key="key2", value=b"value2_%d" % version)
+    database.append(key="key3", value=b"value3" * 5)
+    MergeWorker(storage=database).do_merge()
+    database.append(key="key1", value=b"new_value1" * 5)
+    database.append(key="key3", value=b"new_value3" * 5)
+    database.close()
+    # A torn last line (crash while recording a change) is ignored
+    with open(f"{TEST_DIRECTORY}/{Manifest.FILENAME}", "ab") as manifest_file:
+        manifest_file.write(b"add 99 99")
+
+    # WHEN
+    monkeypatch.setattr(os, "listdir", lambda path: pytest.fail("listdir called"))
+    restarted_database = Storage(directory=TEST_DIRECTORY, max_file_size=70)
+    monkeypatch.undo()
+
+    # THEN
+    assert restarted_database.get(key="key1") == b"new_value1" * 5
+    assert restarted_database.get(key="key2") == b"value2_4"
+    assert restarted_database.get(key="key3") == b"new_value3" * 5
+    # The merged file keeps the place of the files it was merged from
+    file_paths = restarted_database.get_immutable_file_paths()
+    assert os.path.basename(file_paths[0]).startswith("merged-")
+    assert set(restarted_database.manifest.entries) == set(file_paths)
+
+    restarted_database.clear()
+
+
+def test_manifest_is_rebuilt_from_the_data_files_if_missing():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=70)
+    for version in range(5):
+        database.append(key="key1", value=b"value1_%d" % version)
+    database.close()
+    immutable_file_paths = database.get_immutable_file_paths()
+    os.remove(f"{TEST_DIRECTORY}/{Manifest.FILENAME}")
+
+    # WHEN
+    restarted_database = Storage(directory=TEST_DIRECTORY, max_file_size=70)
+
+    # THEN
+    assert restarted_database.get(key="key1") == b"value1_4"
+    # The previous active file was rotated at restart
+    assert restarted_database.get_immutable_file_paths()[:-1] == immutable_file_paths
+    assert os.path.exists(f"{TEST_DIRECTORY}/{Manifest.FILENAME}")
+
+    restarted_database.clear()
+
+
+def test_manifest_never_gives_the_sequence_number_of_a_removed_file_again():
+    # GIVEN
+    os.makedirs(TEST_DIRECTORY, exist_ok=True)
+    manifest = Manifest.load(directory=TEST_DIRECTORY)
+    manifest.add(path=f"{TEST_DIRECTORY}/1.data", size=10)
+    manifest.add(path=f"{TEST_DIRECTORY}/2.data", size=10)
+    manifest.remove(paths=[f"{TEST_DIRECTORY}/2.data"])
+
+    # WHEN — the log is rewritten with the current files only at each load
+    for _ in range(2):
+        manifest = Manifest.load(directory=TEST_DIRECTORY)
+    manifest.add(path=f"{TEST_DIRECTORY}/3.data", size=10)
+
+    # THEN
+    assert manifest.entries[f"{TEST_DIRECTORY}/3.data"].sequence == 3
+    assert manifest.get_paths() == [
+        f"{TEST_DIRECTORY}/1.data",
+        f"{TEST_DIRECTORY}/3.data",
+    ]
+
+    manifest.clear()
+    os.remove(manifest.path)
+
+
+def test_closing_the_storage_stops_the_hint_file_writer():
+    # GIVEN
+    threads_before = set(threading.enumerate())
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=70)
+    for version in range(5):
+        database.append(key="key1", value=b"value1_%d" % version)
+
+    # WHEN
+    database.close()
+
+    # THEN
+    assert not [
+        thread
+        for thread in set(threading.enumerate()) - threads_before
+        if thread.name.startswith("pytcask-hint-writer")
+    ]
+    assert all(
+        os.path.exists(HintFile.get_path(data_file_path=file_path))
+        for file_path in database.get_immutable_file_paths()
+    )
+
+    database.clear()
+
+
+def test_reading_a_record_of_a_truncated_file_raises():
+    # GIVEN
+    database = Storage(directory=TEST_DIRECTORY, max_file_size=70)
+    database.append(key="key1", value=b"value1")
+    database.append(key="key2", value=b"value2")
+    database.append(key="key3", value=b"value3")
+    immutable_file_path = database.key_dir.get("key2").file_path
+    assert immutable_file_path != database.active_data_file.path
+    os.truncate(immutable_file_path, os.path.getsize(immutable_file_path) - 1)
+
+    # WHEN/THEN
+    with pytest.raises(CorruptedRecordError):
+        database.get(key="key2")
+    with pytest.raises(CorruptedRecordError):
+        database.multi_get(keys=["key1", "key2"])
+
+    database.clear()
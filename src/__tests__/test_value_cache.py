@@ -0,0 +1,89 @@
+from src.merge_worker import MergeWorker
+from src.metrics import Metrics
+from src.storage import Storage
+from src.value_cache import ValueCache
+
+TEST_DIRECTORY = "./datafiles/test_value_cache"
+
+
+def test_least_recently_used_values_are_evicted_to_fit_the_byte_budget():
+    # GIVEN
+    metrics = Metrics()
+    value_cache = ValueCache(max_size=10, metrics=metrics)
+    value_cache.put_if(key="key1", value=b"1234")
+    value_cache.put_if(key="key2", value=b"1234")
+    value_cache.get("key1")
+
+    # WHEN
+    value_cache.put_if(key="key3", value=b"1234")
+    value_cache.put_if(key="too_big", value=b"12345678901")
+
+    # THEN
+    assert value_cache.size == 8
+    assert value_cache.get("key1") == b"1234"
+    assert value_cache.get("key2") is None
+    assert value_cache.get("key3") == b"1234"
+    assert value_cache.get("too_big") is None
+    assert metrics.counters["cache_hits"].value == 3
+    assert metrics.counters["cache_misses"].value == 2
+    assert metrics.counters["cache_evictions"].value == 1
+
+
+def test_writes_update_cached_values_and_values_are_only_cached_if_still_current():
+    # GIVEN
+    value_cache = ValueCache(max_size=100)
+    value_cache.put_if(key="key1", value=b"old")
+    value_cache.put_if(key="key2", value=b"old")
+
+    # WHEN
+    value_cache.update(key="key1", value=b"new")
+    value_cache.update(key="key2", value=None)
+    value_cache.update(key="uncached_key", value=b"new")
+    value_cache.put_if(key="stale_key", value=b"old", condition=lambda: False)
+
+    # THEN
+    assert value_cache.get("key1") == b"new"
+    assert value_cache.get("key2") is None
+    assert value_cache.get("uncached_key") is None
+    assert value_cache.get("stale_key") is None
+    assert value_cache.size == len(b"new")
+
+
+def test_storage_serves_cached_values_and_keeps_them_up_to_date():
+    # GIVEN
+    database = Storage(
+        directory=TEST_DIRECTORY, max_file_size=100, value_cache_size=1000
+    )
+    for index in range(10):
+        database.append(key=f"key{index}", value=bytes(f"value{index}", "utf-8"))
+    database.multi_get(keys=["key0", "key1"])
+    database.get(key="key2")
+    bytes_read = database.metrics.counters["bytes_read"].value
+
+    # WHEN
+    cached_values = database.multi_get(keys=["key0", "key1"])
+    cached_value = database.get(key="key2")
+    database.append(key="key0", value=b"new_value0")
+    database.write_batch(items=[("key1", b"new_value1"), ("key3", b"new_value3")])
+    database.delete(key="key2")
+    MergeWorker(storage=database, file_size_threshold=100).do_merge()
+
+    # THEN
+    assert cached_values == {"key0": b"value0", "key1": b"value1"}
+    assert cached_value == b"value2"
+    assert database.metrics.counters["bytes_read"].value == bytes_read
+    assert database.metrics.counters["cache_hits"].value == 3
+    assert database.multi_get(keys=["key0", "key1", "key2", "key3"]) == {
+        "key0": b"new_value0",
+        "key1": b"new_value1",
+        "key2": None,
+        "key3": b"new_value3",
+    }
+    # Only values that were read are cached: neither merges nor writes of uncached keys add any
+    assert database.value_cache.size == len(b"new_value0new_value1new_value3")
+    assert [database.get(key=f"key{index}") for index in range(4, 10)] == [
+        bytes(f"value{index}", "utf-8") for index in range(4, 10)
+    ]
+
+    database.close()
+    database.clear()
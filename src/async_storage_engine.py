@@ -0,0 +1,161 @@
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from src.item import Item
+from src.storage_engine import StorageEngine
+
+
+class AsyncStorageEngine:
+    """asyncio front end of a `StorageEngine`: none of its coroutines blocks the event loop on disk I/O.
+
+    - Reads run in a dedicated pool of `nb_readers` threads (the storage supports concurrent readers).
+    - Writes are queued and applied by a single writer task: all the writes waiting in the queue (at most
+    `max_batch_size`) are applied with one `Storage.write_batch`, i.e. one write and one commit (fsync) for the whole
+    batch. A write only returns once its batch has been written.
+    - Backpressure: at most `max_pending_writes` writes can wait in the queue, further writers wait for some room.
+    - Cancellation: a write cancelled before the writer task picks it up is dropped. Once picked up, it is applied.
+
+    Usage:
+        async with AsyncStorageEngine(storage_engine=StorageEngine()) as database:
+            await database.put(key="key", value=b"value")
+    """
+
+    PendingWrite = namedtuple("PendingWrite", ["key", "value", "future"])
+
+    DEFAULT_NB_READERS = 4
+    DEFAULT_MAX_PENDING_WRITES = 1024
+    DEFAULT_MAX_BATCH_SIZE = 256
+
+    def __init__(
+        self,
+        storage_engine: StorageEngine,
+        nb_readers: int = DEFAULT_NB_READERS,
+        max_pending_writes: int = DEFAULT_MAX_PENDING_WRITES,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    ):
+        self.storage_engine = storage_engine
+        self.max_pending_writes = max_pending_writes
+        self.max_batch_size = max_batch_size
+        self._read_executor = ThreadPoolExecutor(
+            max_workers=nb_readers, thread_name_prefix="pytcask-reader"
+        )
+        self._write_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="pytcask-writer"
+        )
+        # Created when started, so that they belong to the running event loop
+        self._write_queue: asyncio.Queue or None = None
+        self._writer_task: asyncio.Task or None = None
+        self._is_closing = False
+
+    async def __aenter__(self) -> "AsyncStorageEngine":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    @property
+    def storage(self):
+        return self.storage_engine.storage
+
+    async def start(self) -> None:
+        self._write_queue = asyncio.Queue(maxsize=self.max_pending_writes)
+        self._writer_task = asyncio.create_task(self._run_writer())
+
+    def _get_next_batch(self, first_write: PendingWrite) -> list[PendingWrite]:
+        """Returns the first write along with all the writes already waiting in the queue (up to the batch size)."""
+        batch = [first_write]
+        while len(batch) < self.max_batch_size and not self._write_queue.empty():
+            batch.append(self._write_queue.get_nowait())
+        return batch
+
+    async def _run_writer(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = self._get_next_batch(first_write=await self._write_queue.get())
+            # None marks the end of the writes (see `close`)
+            is_closing = None in batch
+            # Writes cancelled while waiting in the queue are dropped
+            writes = [
+                write
+                for write in batch
+                if write is not None and not write.future.cancelled()
+            ]
+            if writes:
+                try:
+                    await loop.run_in_executor(
+                        self._write_executor,
+                        self.storage.write_batch,
+                        [(write.key, write.value) for write in writes],
+                    )
+                except Exception as error:
+                    for write in writes:
+                        if not write.future.done():
+                            write.future.set_exception(error)
+                else:
+                    for write in writes:
+                        if not write.future.done():
+                            write.future.set_result(None)
+            if is_closing:
+                return
+
+    async def _write(self, key: Item.Key, value: Item.Value or None) -> None:
+        if self._writer_task is None or self._is_closing:
+            raise RuntimeError("The engine is not started (or has been closed)")
+        future = asyncio.get_running_loop().create_future()
+        # Waits while the queue is full (backpressure)
+        await self._write_queue.put(
+            self.PendingWrite(key=key, value=value, future=future)
+        )
+        await future
+
+    # ~~~~~~~~~~~~~~~~~~~
+    # ~~~ API
+    # ~~~~~~~~~~~~~~~~~~~
+
+    async def get(self, key: Item.Key) -> Item.Value or None:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._read_executor, self.storage.get, key
+        )
+
+    async def multi_get(
+        self, keys: list[Item.Key]
+    ) -> dict[Item.Key, Item.Value or None]:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._read_executor, self.storage.multi_get, keys
+        )
+
+    async def keys(self) -> list[Item.Key]:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._read_executor, self.storage.keys
+        )
+
+    async def sorted_keys(self) -> list[Item.Key]:
+        """Same as `keys`, sorted: sorting the whole keyspace takes a while, so it runs in the executor as well."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._read_executor, lambda: sorted(self.storage.keys())
+        )
+
+    async def put(self, key: Item.Key, value: Item.Value) -> None:
+        await self._write(key=key, value=value)
+
+    async def delete(self, key: Item.Key) -> None:
+        await self._write(key=key, value=None)
+
+    async def close(self) -> None:
+        """Applies the writes already queued, then closes the storage engine."""
+        self._is_closing = True
+        if self._writer_task is not None and not self._writer_task.done():
+            await self._write_queue.put(None)
+            await self._writer_task
+            # Writes that were waiting for some room in the queue when closing are not applied
+            while not self._write_queue.empty():
+                write = self._write_queue.get_nowait()
+                if write is not None and not write.future.done():
+                    write.future.set_exception(RuntimeError("The engine is closed"))
+        self._read_executor.shutdown(wait=True)
+        self._write_executor.shutdown(wait=True)
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.storage_engine.close
+        )
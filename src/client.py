@@ -0,0 +1,96 @@
+import asyncio
+
+from src.io_handling.generic_file import ENCODING
+from src.resp import RespError, RespParser, encode_command
+from src.server import StorageServer
+
+
+class StorageClient:
+    """asyncio client of a `StorageServer` (or of any server speaking RESP).
+
+    Error replies are raised as `RespError`. Several commands can be sent at once with `execute_pipeline`: they are
+    written with a single write, and their replies (errors included) are returned in order.
+
+    Usage:
+        client = await StorageClient.connect()
+        await client.set(key="key", value=b"value")
+        await client.close()
+    """
+
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        # Replies come from the server: their sizes are not bounded
+        self.parser = RespParser(
+            max_bulk_size=None, max_array_size=None, max_buffer_size=None
+        )
+        self._replies = []
+
+    @classmethod
+    async def connect(
+        cls,
+        host: str = StorageServer.DEFAULT_HOST,
+        port: int = StorageServer.DEFAULT_PORT,
+    ) -> "StorageClient":
+        reader, writer = await asyncio.open_connection(host=host, port=port)
+        return cls(reader=reader, writer=writer)
+
+    async def _read_replies(self, nb_replies: int) -> list:
+        while len(self._replies) < nb_replies:
+            data = await self.reader.read(self.READ_SIZE)
+            if not data:
+                raise ConnectionError("The connection was closed by the server")
+            self.parser.feed(data)
+            self._replies.extend(self.parser.get_values())
+        replies = self._replies[:nb_replies]
+        del self._replies[:nb_replies]
+        return replies
+
+    async def execute_pipeline(self, commands: list[tuple]) -> list:
+        """Sends all the commands at once, and returns their replies (errors are returned, not raised)."""
+        self.writer.write(b"".join(encode_command(*command) for command in commands))
+        await self.writer.drain()
+        return await self._read_replies(nb_replies=len(commands))
+
+    async def execute(self, *arguments: str or bytes or int):
+        (reply,) = await self.execute_pipeline(commands=[arguments])
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+
+    # ~~~~~~~~~~~~~~~~~~~
+    # ~~~ API
+    # ~~~~~~~~~~~~~~~~~~~
+
+    async def ping(self) -> str:
+        return await self.execute("PING")
+
+    async def get(self, key: str) -> bytes or None:
+        return await self.execute("GET", key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self.execute("SET", key, value)
+
+    async def delete(self, *keys: str) -> int:
+        return await self.execute("DEL", *keys)
+
+    async def multi_get(self, keys: list[str]) -> list[bytes or None]:
+        return await self.execute("MGET", *keys)
+
+    async def scan(
+        self, cursor: int = 0, match: str or None = None, count: int or None = None
+    ) -> tuple[int, list[str]]:
+        """Returns the next cursor (0 once the iteration is over) and a page of keys."""
+        options = []
+        if match is not None:
+            options += ["MATCH", match]
+        if count is not None:
+            options += ["COUNT", count]
+        next_cursor, keys = await self.execute("SCAN", cursor, *options)
+        return int(next_cursor), [str(key, encoding=ENCODING) for key in keys]
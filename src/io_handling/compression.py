@@ -0,0 +1,55 @@
+import lzma
+import zlib
+from enum import Enum
+
+
+class Codec(int, Enum):
+    """Compression codec of a value, stored in the header of its record (hence the integer values)."""
+
+    NONE = 0
+    ZLIB = 1
+    LZMA = 2
+
+    def compress(self, data: bytes, level: int or None = None) -> bytes:
+        if self == Codec.ZLIB:
+            return zlib.compress(data, level if level is not None else -1)
+        if self == Codec.LZMA:
+            return lzma.compress(data, preset=level)
+        return data
+
+    def decompress(self, data: bytes) -> bytes:
+        if self == Codec.ZLIB:
+            return zlib.decompress(data)
+        if self == Codec.LZMA:
+            return lzma.decompress(data)
+        return data
+
+
+class CompressionPolicy:
+    """Defines how values are compressed when written.
+
+    Values smaller than `min_value_size` are stored as is: compressing them saves few (if any) bytes, and costs CPU on
+    every read. Values that the codec does not make smaller (e.g. already compressed data) are stored as is as well.
+    `level` is the compression level of the codec (its default level if None).
+    """
+
+    DEFAULT_MIN_VALUE_SIZE = 128
+
+    def __init__(
+        self,
+        codec: Codec,
+        min_value_size: int = DEFAULT_MIN_VALUE_SIZE,
+        level: int or None = None,
+    ):
+        self.codec = codec
+        self.min_value_size = min_value_size
+        self.level = level
+
+    def compress(self, value: bytes) -> tuple[Codec, bytes]:
+        """Returns the codec actually used for the value, and the value encoded with it."""
+        if self.codec == Codec.NONE or len(value) < self.min_value_size:
+            return Codec.NONE, value
+        compressed_value = self.codec.compress(value, level=self.level)
+        if len(compressed_value) >= len(value):
+            return Codec.NONE, value
+        return self.codec, compressed_value
@@ -1,24 +1,147 @@
 import os
 import struct
+import zlib
 from datetime import datetime
-from typing import Iterator
+from time import time
+from typing import Iterator, Callable
 
-from src.io_handling.generic_file import ENCODING, NB_BYTES_INTEGER, File
+from src.io_handling.compression import Codec, CompressionPolicy
+from src.io_handling.durability import DurabilityPolicy, GroupCommitter
+from src.io_handling.generic_file import ENCODING, File
 from src.item import Item, Tombstone
 from src.key_dir import KeyDir
 
 
+class CorruptedRecordError(ValueError):
+    """Raised when decoding a record that was not fully written (e.g. torn write during a crash) or that is damaged."""
+
+
+class UnsupportedFormatError(CorruptedRecordError):
+    """Raised when decoding a record whose format version is unknown (e.g. a file written by a previous version of the
+    store): unlike a torn write, it must never be truncated away.
+    """
+
+
+class BatchMarker:
+    """Record delimiting a batch of items written atomically (see `Storage.write_batch`).
+
+    A batch is written as: a BEGIN marker, the items of the batch, a COMMIT marker. Markers share the metadata layout
+    of `DataFileItem` (checksum, version, codec, flags, timestamp, key size, value size) but have no key nor value: they
+    are identified by a negative key size, and their value size field holds the number of items in the batch.
+    """
+
+    BEGIN_KEY_SIZE = -1
+    COMMIT_KEY_SIZE = -2
+
+    __slots__ = ("key_size", "nb_items", "timestamp")
+
+    def __init__(self, key_size: int, nb_items: int, timestamp: int or None = None):
+        self.key_size = key_size
+        self.nb_items = nb_items
+        self.timestamp = timestamp if timestamp is not None else int(time())
+
+    @property
+    def is_begin(self) -> bool:
+        return self.key_size == self.BEGIN_KEY_SIZE
+
+    @property
+    def size(self) -> int:
+        return DataFileItem.METADATA_SIZE
+
+    def pack_into(self, buffer: bytearray, offset: int = 0) -> int:
+        """Copies the encoded marker into `buffer` at `offset`, and returns the offset of its end."""
+        end = offset + DataFileItem.METADATA_SIZE
+        buffer[offset:end] = self.to_bytes()
+        return end
+
+    def to_bytes(self) -> bytes:
+        return DataFileItem.add_checksum(
+            DataFileItem.METADATA_FORMAT.pack(
+                DataFileItem.VERSION,
+                Codec.NONE,
+                0,  # No flags
+                self.timestamp,
+                self.key_size,
+                self.nb_items,
+            )
+        )
+
+    @classmethod
+    def begin(cls, nb_items: int) -> "BatchMarker":
+        return cls(key_size=cls.BEGIN_KEY_SIZE, nb_items=nb_items)
+
+    @classmethod
+    def commit(cls, nb_items: int) -> "BatchMarker":
+        return cls(key_size=cls.COMMIT_KEY_SIZE, nb_items=nb_items)
+
+
 class DataFileItem:
+    """Record of a data file.
+
+    Layout (little-endian): CRC32, format version, codec, flags, timestamp, key size, value size, key, value.
+    The CRC32 covers everything that follows it in the record, so that a record that was not fully written or that got
+    damaged is detected when decoded. Tombstones are flagged (`FLAG_TOMBSTONE`) and have no value: an empty value is a
+    value like any other.
+
+    The value is stored encoded with the codec (see `CompressionPolicy`): the value size (as well as the value position
+    and size of the key_dir entries) refers to the encoded value. Encoded values are only decoded when `value` is
+    accessed, so that parsing files (e.g. to rebuild the index) does not decompress anything.
+
+    Records can be packed into caller-provided buffers (`pack_into`, e.g. all the records of a batch into one buffer)
+    and are decoded in place from them (`unpack_from`). The key is encoded once (when the record is created, or kept
+    from the bytes it was decoded from), and sizes are computed once: sizing records or copying them (merges) does not
+    re-encode anything.
+    """
+
+    VERSION = 2
+    CHECKSUM_FORMAT = struct.Struct("<I")
+    METADATA_FORMAT = struct.Struct("<BBBiii")
+    METADATA_SIZE = CHECKSUM_FORMAT.size + METADATA_FORMAT.size
+    # Checksum and metadata, unpacked at once when decoding
+    HEADER_FORMAT = struct.Struct("<IBBBiii")
+    FLAG_TOMBSTONE = 0x01
+    # Batch markers have a negative key size
+    MIN_KEY_SIZE = BatchMarker.COMMIT_KEY_SIZE
+    CODECS = {codec.value: codec for codec in Codec}
+
+    __slots__ = (
+        "key",
+        "encoded_key",
+        "key_size",
+        "codec",
+        "encoded_value",
+        "value_size",
+        "_value",
+        "timestamp",
+        "is_tombstone",
+    )
+
     def __init__(
         self,
         key: str,
         value: bytes or None,  # `None` is only in the case where `is_tombstone` is True
-        timestamp: int = int(datetime.timestamp(datetime.now())),
+        timestamp: int or None = None,
         is_tombstone: bool = False,
+        codec: Codec = Codec.NONE,
+        encoded_value: bytes
+        or None = None,  # Defaults to the value itself (i.e. not compressed)
+        encoded_key: bytes
+        or None = None,  # Defaults to the key encoded (given when decoding a record)
     ):
         self.key = key
-        self.value = value
-        self.timestamp = timestamp
+        self.encoded_key = (
+            encoded_key if encoded_key is not None else key.encode(ENCODING)
+        )
+        # Size of the encoded key (in bytes, not in characters)
+        self.key_size = len(self.encoded_key)
+        self.codec = codec
+        self.encoded_value = encoded_value if encoded_value is not None else value
+        # Size of the value as stored in the file (i.e. encoded)
+        self.value_size = 0 if is_tombstone else len(self.encoded_value)
+        # Decoded lazily (see `value`) when only the encoded value is given
+        self._value = value
+        # The default value is computed here: a default argument would be evaluated only once, at import time
+        self.timestamp = timestamp if timestamp is not None else int(time())
         self.is_tombstone = is_tombstone
 
     def __eq__(self, other) -> bool:
@@ -32,19 +155,14 @@ class DataFileItem:
         return f"{self.key}:{self.value.decode(ENCODING)} ({self.timestamp})"
 
     @property
-    def value_size(self) -> int:
-        if self.is_tombstone:
-            return 0
-        # Offset in bytes = number of bytes (because self.value is in bytes)
-        return len(self.value)
+    def value(self) -> bytes or None:
+        if self._value is None and self.encoded_value is not None:
+            self._value = self.codec.decompress(self.encoded_value)
+        return self._value
 
     @property
     def value_position(self) -> int:
-        return len(self.encoded_metadata) + len(self.encoded_key)
-
-    @property
-    def key_size(self) -> int:
-        return len(self.key)
+        return self.METADATA_SIZE + self.key_size
 
     @property
     def timestamp_size(self) -> int:
@@ -56,46 +174,183 @@ class DataFileItem:
 
     @property
     def encoded_metadata(self) -> bytes:
-        return struct.pack("iii", self.timestamp, self.key_size, self.value_size)
-
-    @property
-    def encoded_key(self) -> bytes:
-        return bytes(self.key, encoding=ENCODING)
+        """Metadata covered by the checksum (i.e. without the checksum)."""
+        return self.METADATA_FORMAT.pack(
+            self.VERSION,
+            self.codec,
+            self.FLAG_TOMBSTONE if self.is_tombstone else 0,
+            self.timestamp,
+            self.key_size,
+            self.value_size,
+        )
 
     @property
     def size(self) -> int:
-        return len(self.encoded_metadata) + len(self.encoded_key) + self.value_size
-
-    @property
-    def encoded_item(self) -> bytes:
-        return self.to_bytes()
+        return self.METADATA_SIZE + self.key_size + self.value_size
+
+    def pack_into(self, buffer: bytearray, offset: int = 0) -> int:
+        """Copies the encoded record into `buffer` (which must hold at least `size` bytes after `offset`), and returns
+        the offset of its end. Records following each other can thus be packed into a single buffer.
+        The record is encoded with a few concatenations, then copied at once: in CPython, this is faster than filling
+        the buffer field by field (one slice assignment per field, and a checksum over a view of the buffer).
+        """
+        end = offset + self.size
+        buffer[offset:end] = self.to_bytes()
+        return end
 
     def to_bytes(self) -> bytes:
-        encoded_metadata = self.encoded_metadata
-        encoded_key = self.encoded_key
-        encoded_value = self.value
+        encoded_record = self.encoded_metadata + self.encoded_key
+        if not self.is_tombstone:
+            encoded_record += self.encoded_value
+        return self.add_checksum(encoded_record)
+
+    def compressed_with(
+        self, compression_policy: CompressionPolicy or None
+    ) -> "DataFileItem":
+        """Returns the same record with its value encoded following `compression_policy` (the record itself if the
+        encoding does not change). Used to re-encode the records copied by merges.
+        """
+        if compression_policy is None or self.is_tombstone:
+            return self
+        # The value is not decoded (nor re-encoded) if the encoding could not change: already encoded with the codec of
+        # the policy, or stored as is and too small to be compressed
+        if self.codec == compression_policy.codec or (
+            self.codec == Codec.NONE
+            and self.value_size < compression_policy.min_value_size
+        ):
+            return self
+        codec, encoded_value = compression_policy.compress(value=self.value)
+        if codec == self.codec:
+            return self
+        return DataFileItem(
+            key=self.key,
+            value=self.value,
+            timestamp=self.timestamp,
+            codec=codec,
+            encoded_value=encoded_value,
+            encoded_key=self.encoded_key,
+        )
+
+    @classmethod
+    def add_checksum(cls, encoded_record: bytes) -> bytes:
+        """Prepends the checksum to a record encoded without it."""
+        return cls.CHECKSUM_FORMAT.pack(zlib.crc32(encoded_record)) + encoded_record
 
-        if self.is_tombstone:
-            return encoded_metadata + encoded_key
+    @classmethod
+    def _unpack_header(cls, data: bytes or bytearray, offset: int) -> tuple:
+        """Returns the checksum, codec, flags, timestamp, key size, value size and size of the record starting at
+        `offset` in `data`, with a single unpacking. Raises a `CorruptedRecordError` if the metadata cannot be valid, an
+        `UnsupportedFormatError` if the format version is unknown.
+        """
+        checksum, version, codec, flags, timestamp, key_size, value_size = (
+            cls.HEADER_FORMAT.unpack_from(data, offset)
+        )
+        if version != cls.VERSION:
+            raise UnsupportedFormatError(
+                f"Unknown record format version {version} at offset {offset}"
+            )
+        if (
+            codec not in cls.CODECS
+            or flags & ~cls.FLAG_TOMBSTONE
+            or key_size < cls.MIN_KEY_SIZE
+            or value_size < 0
+            or (flags & cls.FLAG_TOMBSTONE and value_size != 0)
+        ):
+            raise CorruptedRecordError(f"Invalid record metadata at offset {offset}")
+        record_size = (
+            cls.METADATA_SIZE + key_size + value_size
+            if key_size >= 0
+            else cls.METADATA_SIZE  # Batch marker
+        )
+        return checksum, codec, flags, timestamp, key_size, value_size, record_size
+
+    @classmethod
+    def record_size(cls, data: bytes or bytearray, offset: int = 0) -> int:
+        """Returns the size of the record starting at `offset` in `data` (only its metadata needs to be in `data`).
+        Raises a `CorruptedRecordError` if the metadata cannot be valid (the checksum itself is not verified here).
+        """
+        return cls._unpack_header(data, offset)[-1]
+
+    @classmethod
+    def unpack_from(
+        cls, buffer: bytes or bytearray, offset: int = 0, verify_checksum: bool = True
+    ) -> "DataFileItem" or BatchMarker:
+        """Decodes the record starting at `offset` in `buffer` (only the key and the value are copied out of it).
+        Raises a `CorruptedRecordError` if its checksum does not match its content.
+        """
+        checksum, codec, flags, timestamp, key_size, value_size, record_size = (
+            cls._unpack_header(buffer, offset)
+        )
+        record_end = offset + record_size
+        with memoryview(buffer) as view:
+            if verify_checksum and (
+                len(view) < record_end
+                or zlib.crc32(view[offset + cls.CHECKSUM_FORMAT.size : record_end])
+                != checksum
+            ):
+                raise CorruptedRecordError(
+                    f"Record checksum does not match at offset {offset}"
+                )
+            if key_size < 0:
+                return BatchMarker(
+                    key_size=key_size, nb_items=value_size, timestamp=timestamp
+                )
+            value_start = offset + cls.METADATA_SIZE + key_size
+            encoded_key = bytes(view[offset + cls.METADATA_SIZE : value_start])
+            encoded_value = bytes(view[value_start:record_end])
+        try:
+            key = str(encoded_key, encoding=ENCODING)
+        except UnicodeDecodeError:
+            raise CorruptedRecordError(f"Invalid record key at offset {offset}")
+
+        return cls(
+            key=key,
+            value=encoded_value if codec == Codec.NONE else None,
+            timestamp=timestamp,
+            is_tombstone=bool(flags & cls.FLAG_TOMBSTONE),
+            codec=cls.CODECS[codec],
+            encoded_value=encoded_value,
+            encoded_key=encoded_key,
+        )
 
-        return encoded_metadata + encoded_key + encoded_value
+    @classmethod
+    def from_bytes(
+        cls, data: bytes or bytearray, verify_checksum: bool = True
+    ) -> "DataFileItem" or BatchMarker:
+        """Decodes the record starting at the beginning of `data` (see `unpack_from`)."""
+        return cls.unpack_from(data, verify_checksum=verify_checksum)
 
     @classmethod
-    def from_bytes(cls, data: bytes) -> "DataFileItem":
-        # metadata_offset is the number of bytes expected in the metadata
-        metadata_offset = 3 * NB_BYTES_INTEGER
-        timestamp, key_size, value_size = struct.unpack("iii", data[:metadata_offset])
-        key = str(data[metadata_offset : metadata_offset + key_size], encoding=ENCODING)
-        value = data[
-            metadata_offset + key_size : metadata_offset + key_size + value_size
-        ]
-        is_tombstone = value_size == 0
-
-        return cls(key=key, value=value, timestamp=timestamp, is_tombstone=is_tombstone)
+    def decode_value(
+        cls, data: bytes or bytearray, offset: int = 0, verify_checksum: bool = False
+    ) -> bytes:
+        """Returns the (decoded) value of the record starting at `offset` in `data`.
+        Faster than `unpack_from(...).value` when the checksum is not verified: the key is not decoded.
+        Raises a `CorruptedRecordError` if the codec of the record is unknown.
+        """
+        if verify_checksum:
+            return cls.unpack_from(data, offset=offset).value
+        _, codec, _, _, key_size, value_size = cls.METADATA_FORMAT.unpack_from(
+            data, offset + cls.CHECKSUM_FORMAT.size
+        )
+        value_start = offset + cls.METADATA_SIZE + key_size
+        encoded_value = bytes(data[value_start : value_start + value_size])
+        if codec == Codec.NONE:
+            return encoded_value
+        if codec not in cls.CODECS:
+            raise CorruptedRecordError(f"Invalid record codec at offset {offset}")
+        return cls.CODECS[codec].decompress(encoded_value)
 
     @classmethod
-    def from_item(cls, item: Item) -> "DataFileItem":
-        return cls(key=item.key, value=item.value)
+    def from_item(
+        cls, item: Item, compression_policy: CompressionPolicy or None = None
+    ) -> "DataFileItem":
+        if compression_policy is None:
+            return cls(key=item.key, value=item.value)
+        codec, encoded_value = compression_policy.compress(value=item.value)
+        return cls(
+            key=item.key, value=item.value, codec=codec, encoded_value=encoded_value
+        )
 
     @classmethod
     def from_tombstone(cls, tombstone: Tombstone) -> "DataFileItem":
@@ -103,12 +358,92 @@ class DataFileItem:
 
 
 class DataFile(File):
-    def __init__(self, path: str, read_only: bool = True):
-        super().__init__(path=path, mode="r" if read_only else "w")
+    def __init__(self, path: str, read_only: bool = True, write_mode: str = "w"):
+        super().__init__(path=path, mode="r" if read_only else write_mode)
 
     def __iter__(self, item_class=DataFileItem) -> Iterator[DataFileItem]:
         return super().__iter__(item_class=item_class)
 
+    def iter_with_offsets(
+        self, item_class=DataFileItem, start: File.Offset = 0
+    ) -> Iterator[tuple[File.Offset, DataFileItem]]:
+        """Items written in a batch are only returned once the COMMIT marker of their batch has been read: the items
+        of a batch that was not fully written (e.g. because of a crash) are never returned.
+        A corrupted or incomplete record raises `CorruptedRecordError`: the records following it cannot be located
+        reliably, and a file that is not read to its end must not be considered as fully read (e.g. by merges). Only the
+        recovery of the active file stops at it (see `get_valid_size`).
+        """
+        batch = None
+        for offset, item in self._iter_records(item_class=item_class, start=start):
+            if isinstance(item, BatchMarker):
+                if item.is_begin:
+                    batch = []
+                    continue
+                if batch is not None and len(batch) == item.nb_items:
+                    yield from batch
+                batch = None
+                continue
+            if batch is not None:
+                batch.append((offset, item))
+            else:
+                yield offset, item
+
+    def _iter_records(
+        self,
+        item_class=DataFileItem,
+        start: File.Offset = 0,
+        stop_at_corruption: bool = False,
+    ) -> Iterator[tuple[File.Offset, DataFileItem or BatchMarker]]:
+        """Same as `File.iter_with_offsets` (records and batch markers), but an incomplete record at the end of the file
+        is considered corrupted as well. With `stop_at_corruption`, the iteration stops at the first corrupted record
+        instead of raising, unless its format version is unknown: such a record is not a torn write, it is raised
+        (`UnsupportedFormatError`).
+        """
+        end_offset = start
+        try:
+            for offset, item in super().iter_with_offsets(
+                item_class=item_class, start=start
+            ):
+                end_offset = offset + item.size
+                yield offset, item
+        except UnsupportedFormatError:
+            raise
+        except CorruptedRecordError:
+            if stop_at_corruption:
+                return
+            raise
+        if not stop_at_corruption and end_offset < os.path.getsize(self.path):
+            raise CorruptedRecordError(
+                f"Incomplete record at offset {end_offset} of {self.path}"
+            )
+
+    def get_valid_size(self) -> File.Offset:
+        """Returns the size of the valid part of the file, i.e. up to the first corrupted or incomplete record.
+        A batch that is not followed by its COMMIT marker is not part of it either.
+        Raises an `UnsupportedFormatError` if a record has an unknown format version (e.g. the file was written by a
+        previous version of the store).
+        """
+        valid_size = 0
+        batch_start = None
+        for offset, item in self._iter_records(stop_at_corruption=True):
+            if isinstance(item, BatchMarker) and item.is_begin:
+                batch_start = offset
+            elif isinstance(item, BatchMarker) or batch_start is None:
+                batch_start = None
+                valid_size = offset + item.size
+        return valid_size if batch_start is None else batch_start
+
+    def build_partial_index(self, start: File.Offset = 0) -> KeyDir.PartialIndex:
+        """Builds the partial index of the records located after `start`."""
+        partial_index = {}
+        for offset, item in self.iter_with_offsets(start=start):
+            partial_index[item.key] = (
+                None
+                if item.is_tombstone
+                else (offset + item.value_position, item.value_size, item.timestamp)
+            )
+        return partial_index
+
 
 class ImmutableDataFile(DataFile):
     def __init__(self, path: str):
@@ -116,43 +451,86 @@ class ImmutableDataFile(DataFile):
 
 
 class WritableDataFile(DataFile):
-    def __init__(self, path: str):
-        super().__init__(path=path, read_only=False)
+    def __init__(self, path: str, write_mode: str = "w"):
+        super().__init__(path=path, read_only=False, write_mode=write_mode)
 
 
 class MergedDataFile(WritableDataFile):
-    def __init__(self, store_path: str):
+    def __init__(self, store_path: str, order_timestamp: int or None = None):
         # Using timestamp in nanoseconds to avoid name collisions
         timestamp_in_ns = int(datetime.timestamp(datetime.now()) * 1_000_000)
-        file_path = f"{store_path}/merged-{timestamp_in_ns}.data"
+        # The position of the file in the store (see `File.get_order`): defaults to its creation time
+        order_timestamp = (
+            order_timestamp if order_timestamp is not None else timestamp_in_ns
+        )
+        file_path = f"{store_path}/merged-{order_timestamp}-{timestamp_in_ns}.data"
         super().__init__(path=file_path)
+        self.size = 0
+        # Entries of all items written in the file (used to write its hint file)
+        self.key_dir = KeyDir()
+        # Keys of the tombstones written in the file: their entries look like those of empty values
+        self.tombstone_keys = set()
 
-    def write(self, data_file_items: list[DataFileItem]) -> KeyDir:
-        file_key_dir = KeyDir()
-        offset = 0
-        for data_file_item in data_file_items:
-            nb_bytes_written = self.file.write(data_file_item.encoded_item)
-            file_key_dir.update(
-                file_path=self.path,
-                value_size=data_file_item.value_size,
-                value_position=offset + data_file_item.value_position,
-                key=data_file_item.key,
-                timestamp=data_file_item.timestamp,
-            )
-            offset += nb_bytes_written
-
-        return file_key_dir
+    def append(self, data_file_item: DataFileItem) -> File.Offset:
+        """Appends an item to the (buffered) file, and returns the position of its value."""
+        value_position = self.size + data_file_item.value_position
+        self.size += self.file.write(data_file_item.to_bytes())
+        self.key_dir.update(
+            file_path=self.path,
+            value_size=data_file_item.value_size,
+            value_position=value_position,
+            key=data_file_item.key,
+            timestamp=data_file_item.timestamp,
+        )
+        if data_file_item.is_tombstone:
+            self.tombstone_keys.add(data_file_item.key)
+        return value_position
 
 
 class ActiveDataFile(WritableDataFile):
+    def __init__(
+        self,
+        path: str,
+        durability_policy: DurabilityPolicy = DurabilityPolicy.FLUSH_PER_WRITE,
+        group_commit_interval_ms: float = GroupCommitter.DEFAULT_INTERVAL_MS,
+    ):
+        # Opened in append mode: an existing file must never be truncated
+        super().__init__(path=path, write_mode="a")
+        self.durability_policy = durability_policy
+        self.has_unflushed_writes = False
+        self.group_committer = (
+            GroupCommitter(file=self.file, interval_ms=group_commit_interval_ms)
+            if durability_policy == DurabilityPolicy.GROUP_COMMIT
+            else None
+        )
+        self._last_commit_ticket = 0
+
     def _append(self, data_file_item: DataFileItem) -> File.Offset:
         self.file.write(data_file_item.to_bytes())
         offset = self.file.tell()
         # WARNING: The following leaks info from storable to file which is not great
         value_position_offset = offset - data_file_item.value_size
-        self.file.flush()
+        self._apply_durability_policy()
         return value_position_offset
 
+    def append_bytes(self, data: bytes or bytearray) -> File.Offset:
+        """Appends already encoded records with a single write, and returns the offset at which they start."""
+        start = self.file.tell()
+        self.file.write(data)
+        self._apply_durability_policy()
+        return start
+
+    def _apply_durability_policy(self) -> None:
+        if self.durability_policy == DurabilityPolicy.NONE:
+            self.has_unflushed_writes = True
+            return
+
+        self.file.flush()
+        if self.durability_policy == DurabilityPolicy.FSYNC_PER_WRITE:
+            os.fsync(self.file.fileno())
+        if self.durability_policy == DurabilityPolicy.GROUP_COMMIT:
+            self._last_commit_ticket = self.group_committer.register_write()
+
     @property
     def _current_offset(self) -> File.Offset:
         return self.file.tell()
@@ -164,9 +542,31 @@ class ActiveDataFile(WritableDataFile):
     def append(self, data_file_item: DataFileItem) -> File.Offset:
         return self._append(data_file_item=data_file_item)
 
+    def flush_pending_writes(self) -> None:
+        """Makes buffered writes visible to readers (only needed when no flush is made after each write)."""
+        if self.has_unflushed_writes:
+            try:
+                self.file.flush()
+            except ValueError:
+                # The file has been closed (and thus flushed) by a rotation in the meantime
+                pass
+            self.has_unflushed_writes = False
+
+    def get_commit_waiter(self) -> Callable[[], None]:
+        """Returns a function blocking until the last write appended is durable, as defined by the durability policy.
+        With group commits, this function is meant to be called once the writer has released its locks, so that
+        other writers can join the same commit.
+        """
+        if self.group_committer is None:
+            return lambda: None
+        group_committer, ticket = self.group_committer, self._last_commit_ticket
+        return lambda: group_committer.wait_for_sync(ticket=ticket)
+
     def close(self) -> None:
+        if self.group_committer is not None:
+            self.group_committer.close()
         self.file.close()
 
     def convert_to_immutable(self, new_path: str) -> None:
-        self.file.close()
+        self.close()
         os.rename(src=self.path, dst=new_path)
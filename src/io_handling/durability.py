@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+from enum import Enum
+from typing import BinaryIO
+
+
+class DurabilityPolicy(str, Enum):
+    """Defines when the records appended to the active file are handed over to the OS (flush) and to the disk (fsync).
+
+    - NONE: records stay in the file buffer until it is full (they are flushed before being read back)
+    - FLUSH_PER_WRITE: records are flushed to the OS after each write (lost on power failure, not on process crash)
+    - GROUP_COMMIT: records are flushed after each write, and a background thread fsyncs the file every N ms. A write
+    only returns once an fsync covering it has completed, so that concurrent writers share one fsync.
+    - FSYNC_PER_WRITE: records are flushed and fsynced after each write
+    """
+
+    NONE = "none"
+    FLUSH_PER_WRITE = "flush-per-write"
+    GROUP_COMMIT = "fsync-every-n-ms"
+    FSYNC_PER_WRITE = "fsync-per-write"
+
+
+class GroupCommitter:
+    """Background thread fsyncing a file every `interval_ms` milliseconds, as long as there are writes to sync.
+
+    Writers register each (already flushed) write to get a ticket, and then wait for that ticket to be synced. All
+    writes registered before an fsync starts are covered by it.
+    """
+
+    DEFAULT_INTERVAL_MS = 2
+
+    def __init__(self, file: BinaryIO, interval_ms: float = DEFAULT_INTERVAL_MS):
+        self.file = file
+        self.interval_in_seconds = interval_ms / 1000
+        self._condition = threading.Condition()
+        self._last_registered_ticket = 0
+        self._last_synced_ticket = 0
+        self._is_closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _sync(self) -> None:
+        with self._condition:
+            ticket_to_sync = self._last_registered_ticket
+        os.fsync(self.file.fileno())
+        with self._condition:
+            self._last_synced_ticket = ticket_to_sync
+            self._condition.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._is_closed
+                    or self._last_registered_ticket > self._last_synced_ticket
+                )
+                if self._is_closed:
+                    return
+            # Leave some time for other writers to join this commit
+            time.sleep(self.interval_in_seconds)
+            self._sync()
+
+    def register_write(self) -> int:
+        with self._condition:
+            self._last_registered_ticket += 1
+            self._condition.notify_all()
+            return self._last_registered_ticket
+
+    def wait_for_sync(self, ticket: int) -> None:
+        with self._condition:
+            self._condition.wait_for(lambda: self._last_synced_ticket >= ticket)
+
+    def close(self) -> None:
+        """Stops the background thread after syncing all registered writes (the file itself is left open)."""
+        with self._condition:
+            self._is_closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._sync()
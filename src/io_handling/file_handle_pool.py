@@ -0,0 +1,133 @@
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+
+class FileHandle:
+    """Read-only descriptor of a file (and its memory mapping, if any), shared by all the readers of that file.
+
+    The handle counts the readers currently using it: once it has been removed from the pool (evicted or invalidated),
+    it is only closed when its last reader releases it. A reader can thus finish reading a file that has been renamed
+    or deleted in the meantime (the descriptor still points to the original file).
+    """
+
+    def __init__(self, file_descriptor: int):
+        self.file_descriptor = file_descriptor
+        self.memory_map: mmap.mmap or None = None
+        self.nb_readers = 0
+        self.is_retired = False
+
+    def close(self) -> None:
+        if self.memory_map is not None:
+            self.memory_map.close()
+        os.close(self.file_descriptor)
+
+
+class FileHandlePool:
+    """Bounded pool of read-only file descriptors, keyed by file path.
+
+    Reads go through `os.pread` so that a single descriptor can be shared by every lookup targeting the same file
+    (no seek, no open/close pair per read). When more than `max_open_files` descriptors are open, the least recently
+    used one is closed.
+
+    Immutable files can also be memory-mapped (see `read_mapped`): mappings are created lazily on first access and are
+    closed along with their descriptor.
+
+    Paths are only stable for immutable files: when a file is renamed (active file rotation) or deleted (merge), its
+    entry must be invalidated, otherwise the pool would keep serving the previous file behind that path.
+
+    The pool is thread-safe: handles are looked up and pinned under a lock, but reads happen outside of it. A handle
+    that is evicted or invalidated while being read is closed by its last reader (see `FileHandle`).
+    """
+
+    DEFAULT_MAX_OPEN_FILES = 64
+
+    def __init__(self, max_open_files: int = DEFAULT_MAX_OPEN_FILES):
+        if max_open_files < 1:
+            raise ValueError("The pool should allow at least one open file")
+        self.max_open_files = max_open_files
+        self.file_handles: OrderedDict[str, FileHandle] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.file_handles)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.file_handles
+
+    @property
+    def memory_maps(self) -> dict[str, mmap.mmap]:
+        return {
+            path: file_handle.memory_map
+            for path, file_handle in self.file_handles.items()
+            if file_handle.memory_map is not None
+        }
+
+    @staticmethod
+    def _retire(file_handle: FileHandle) -> None:
+        """Closes the handle, or lets its last reader close it (must be called with the lock held)."""
+        file_handle.is_retired = True
+        if file_handle.nb_readers == 0:
+            file_handle.close()
+
+    def _acquire(self, path: str, with_memory_map: bool = False) -> FileHandle:
+        """Returns the handle of the file located at `path` (opening it if needed), pinned until it is released."""
+        with self._lock:
+            file_handle = self.file_handles.get(path)
+            if file_handle is not None:
+                self.file_handles.move_to_end(path)
+            else:
+                file_handle = FileHandle(file_descriptor=os.open(path, os.O_RDONLY))
+                self.file_handles[path] = file_handle
+                if len(self.file_handles) > self.max_open_files:
+                    _, evicted_file_handle = self.file_handles.popitem(last=False)
+                    self._retire(file_handle=evicted_file_handle)
+            if with_memory_map and file_handle.memory_map is None:
+                file_handle.memory_map = mmap.mmap(
+                    file_handle.file_descriptor, length=0, access=mmap.ACCESS_READ
+                )
+            file_handle.nb_readers += 1
+            return file_handle
+
+    def _release(self, file_handle: FileHandle) -> None:
+        with self._lock:
+            file_handle.nb_readers -= 1
+            if file_handle.is_retired and file_handle.nb_readers == 0:
+                file_handle.close()
+
+    def read(self, path: str, start: int, size: int) -> bytes:
+        """Reads `size` bytes from the file located at `path`, starting at offset `start`."""
+        file_handle = self._acquire(path=path)
+        try:
+            return os.pread(file_handle.file_descriptor, size, start)
+        finally:
+            self._release(file_handle=file_handle)
+
+    def read_mapped(self, path: str, start: int, size: int) -> bytes:
+        """Same as `read`, but served from a memory mapping of the file (no system call once the file is mapped).
+        Only valid for immutable files: the mapping does not grow with the file.
+        """
+        if size == 0:
+            return b""
+        file_handle = self._acquire(path=path, with_memory_map=True)
+        try:
+            return file_handle.memory_map[start : start + size]
+        finally:
+            self._release(file_handle=file_handle)
+
+    def invalidate(self, path: str) -> None:
+        """Removes the handle opened for `path` (if any) from the pool.
+        Must be called whenever the file behind `path` is renamed or deleted.
+        """
+        with self._lock:
+            file_handle = self.file_handles.pop(path, None)
+            if file_handle is not None:
+                self._retire(file_handle=file_handle)
+
+    def close(self) -> None:
+        """Closes all descriptors and mappings of the pool."""
+        with self._lock:
+            while self.file_handles:
+                _, file_handle = self.file_handles.popitem()
+                self._retire(file_handle=file_handle)
@@ -11,34 +11,68 @@ class FileType(str, Enum):
     MERGED_DATA = "merged_data"
     UNMERGED_DATA = "unmerged_data"
 
+    @classmethod
+    def data_types(cls) -> tuple["FileType", "FileType"]:
+        return cls.MERGED_DATA, cls.UNMERGED_DATA
+
 
 class File:
     Offset = int
     KEY_VALUE_PAIR_SEPARATOR = "\n"
+    READ_BUFFER_SIZE = 64 * 1024
 
     def __init__(self, path: str, mode: str):
         self.path = path
-        self.file: BinaryIO = self._get_file(mode=mode)
+        # Read-only files are not opened here: they are read through their own handles (see `iter_with_offsets`), so
+        # that listing files costs no file descriptor
+        self.file: BinaryIO or None = self._get_file(mode=mode) if mode != "r" else None
 
     def __lt__(self, other: "File"):
-        """Files are sorted based on their creation date"""
-        return os.path.getctime(self.path) < os.path.getctime(other.path)
+        """Files are sorted from the oldest to the most recent records they hold (see `get_order`)"""
+        return self.get_order(path=self.path) < self.get_order(path=other.path)
 
     def __iter__(self, item_class) -> Iterator:
-        file_size = os.path.getsize(self.path)
+        for _, item in self.iter_with_offsets(item_class=item_class):
+            yield item
+
+    def iter_with_offsets(
+        self, item_class, start: Offset = 0, end: Offset or None = None
+    ) -> Iterator[tuple]:
+        """Streams the items stored in the file, along with the offset at which each of them starts.
+
+        The file is consumed in chunks of `READ_BUFFER_SIZE` bytes: only the bytes that have not been decoded yet are
+        kept in the buffer, so memory usage does not depend on the size of the file (a record larger than the buffer
+        simply makes the buffer grow to that record size).
+        Items are decoded in place from the buffer (`item_class.unpack_from` receives the buffer and the position of the
+        record in it), so that no copy of the rest of the buffer is made for each record.
+        An incomplete record at the end of the file is not returned. Records located after `end` (if given) are not
+        read.
+        """
+        buffer = bytearray()
+        position = 0  # Position of the next record in the buffer
+        offset = start  # Position of the next record in the file
         with open(self.path, "rb") as file:
-            # This means that the whole file is stored in memory at once. This is required because the size of the next
-            # chunk depends on the size of the key and value (which we can't know before consuming the next bytes).
-            # Another approach would have been to read a given chunk size that is larger than necessary (but smaller
-            # than the whole file). But that would make the code much more complex, and it is not necessary here.
-            # So I opted for simplicity.
-            data = file.read()
-            offset = 0
-            while offset < file_size:
-                data_file_item = item_class.from_bytes(data[offset:])
-                chunk_size = data_file_item.size
-                offset += chunk_size
-                yield data_file_item
+            file.seek(start)
+            while end is None or offset < end:
+                # The size of a record is only known once its metadata has been read
+                nb_bytes_required = item_class.METADATA_SIZE
+                if len(buffer) - position >= nb_bytes_required:
+                    nb_bytes_required = item_class.record_size(buffer, position)
+
+                if len(buffer) - position < nb_bytes_required:
+                    del buffer[:position]
+                    position = 0
+                    chunk = file.read(
+                        max(self.READ_BUFFER_SIZE, nb_bytes_required - len(buffer))
+                    )
+                    if not chunk:
+                        return
+                    buffer += chunk
+                    continue
+
+                yield offset, item_class.unpack_from(buffer, position)
+                position += nb_bytes_required
+                offset += nb_bytes_required
 
     @staticmethod
     def _ensure_directory_exists(file_path) -> None:
@@ -53,7 +87,12 @@ class File:
 
     @property
     def type(self) -> str:
-        filename = os.path.basename(self.path)
+        return self.get_type(path=self.path)
+
+    @staticmethod
+    def get_type(path: str) -> str or None:
+        """Returns the type of the file located at `path` (None for files that are not data or hint files)."""
+        filename = os.path.basename(path)
         if filename.endswith(".hint"):
             return FileType.HINT
         if filename.endswith(".data") and filename.startswith("merged-"):
@@ -62,15 +101,26 @@ class File:
             return FileType.UNMERGED_DATA
 
     @staticmethod
-    def read(path: str, start: int, end: int) -> bytes:
-        with open(path, "rb") as file:
-            file.seek(start)
-            value = file.read(end - start)
-            return value
+    def get_order(path: str) -> tuple[float, int]:
+        """Returns the position of the file located at `path` in the history of the store, read from its name:
+        - an immutable file (`{timestamp}.data`) is named after the time it stopped being active, i.e. after the time of
+        all its records
+        - a merged file (`merged-{timestamp}-{creation timestamp}.data`) takes the place of the most recent file it was
+        merged from: records written while the merge was running (in more recent files) are thus still read after it
+        - the active file is the most recent one
+        A hint file has the same position as the merged file it describes.
+        """
+        name = os.path.splitext(os.path.basename(path))[0].removeprefix("merged-")
+        try:
+            timestamps = [int(timestamp) for timestamp in name.split("-")]
+        except ValueError:
+            return float("inf"), 0
+        return timestamps[0], timestamps[1] if len(timestamps) > 1 else 0
 
     def discard(self):
         """Discards the file"""
         os.remove(self.path)
 
     def close(self):
-        self.file.close()
+        if self.file is not None:
+            self.file.close()
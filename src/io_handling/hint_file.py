@@ -1,85 +1,245 @@
 import os
 import struct
-from typing import Iterator
+import zlib
+from typing import Iterable, Iterator
 
 from src.io_handling.data_file import MergedDataFile
-from src.io_handling.generic_file import File, ENCODING, NB_BYTES_INTEGER
+from src.io_handling.generic_file import File, ENCODING
 from src.key_dir import KeyDir
 
 
 class HintFileItem:
+    """Entry of a hint file.
+
+    Layout (native byte order): timestamp, key size, value size, value position, flags, key.
+    As in data files, tombstones are flagged (`FLAG_TOMBSTONE`): an empty value is a value like any other.
+    As for `DataFileItem`, the key is encoded once and items are encoded into (`pack_into`) or decoded from
+    (`unpack_from`) caller-provided buffers.
+    """
+
+    METADATA_FORMAT = struct.Struct("iiiiB")
+    METADATA_SIZE = METADATA_FORMAT.size
+    FLAG_TOMBSTONE = 0x01
+
+    __slots__ = (
+        "timestamp",
+        "key",
+        "encoded_key",
+        "key_size",
+        "value_size",
+        "value_position",
+        "is_tombstone",
+    )
+
     def __init__(
         self,
         timestamp: int,
         value_size: int,
         key: str,
         value_position: int,
+        is_tombstone: bool = False,
+        encoded_key: bytes
+        or None = None,  # Defaults to the key encoded (given when decoding an item)
     ):
         self.timestamp = timestamp
         self.key = key
+        self.encoded_key = (
+            encoded_key if encoded_key is not None else key.encode(ENCODING)
+        )
         self.value_size = value_size
         self.value_position = value_position
-        self.key_size = len(self.key)
+        self.is_tombstone = is_tombstone
+        self.key_size = len(self.encoded_key)
 
     def __repr__(self):
         return f"{self.key}: {self.timestamp}-{self.key_size}-{self.value_size}-{self.value_position}"
 
     @property
     def encoded_metadata(self) -> bytes:
-        return struct.pack(
-            "iiii", self.timestamp, self.key_size, self.value_size, self.value_position
+        return self.METADATA_FORMAT.pack(
+            self.timestamp,
+            self.key_size,
+            self.value_size,
+            self.value_position,
+            self.FLAG_TOMBSTONE if self.is_tombstone else 0,
         )
 
-    @property
-    def encoded_key(self) -> bytes:
-        return bytes(self.key, encoding=ENCODING)
-
     @property
     def size(self):
-        return len(self.encoded_metadata) + len(self.encoded_key)
+        return self.METADATA_SIZE + self.key_size
+
+    def pack_into(self, buffer: bytearray, offset: int = 0) -> int:
+        """Copies the encoded item into `buffer` (which must hold at least `size` bytes after `offset`), and returns
+        the offset of its end (see `DataFileItem.pack_into`).
+        """
+        end = offset + self.size
+        buffer[offset:end] = self.to_bytes()
+        return end
+
+    def to_bytes(self) -> bytes:
+        return self.encoded_metadata + self.encoded_key
 
-    def to_bytes(self):
-        metadata = self.encoded_metadata
-        return metadata + bytes(self.key, encoding=ENCODING)
+    @classmethod
+    def record_size(cls, data: bytes or bytearray, offset: int = 0) -> int:
+        """Returns the size of the record starting at `offset` in `data` (only its metadata needs to be in `data`)."""
+        _, key_size, _, _, _ = cls.METADATA_FORMAT.unpack_from(data, offset)
+        return cls.METADATA_SIZE + key_size
 
     @classmethod
-    def from_bytes(cls, data: bytes) -> "HintFileItem":
-        metadata_offset = 4 * NB_BYTES_INTEGER
-        timestamp, key_size, value_size, value_position = struct.unpack(
-            "iiii", data[:metadata_offset]
+    def unpack_from(cls, buffer: bytes or bytearray, offset: int = 0) -> "HintFileItem":
+        """Decodes the record starting at `offset` in `buffer`."""
+        timestamp, key_size, value_size, value_position, flags = (
+            cls.METADATA_FORMAT.unpack_from(buffer, offset)
         )
-        key = str(data[metadata_offset : metadata_offset + key_size], encoding=ENCODING)
+        key_start = offset + cls.METADATA_SIZE
+        with memoryview(buffer) as view:
+            encoded_key = bytes(view[key_start : key_start + key_size])
 
         return cls(
-            key=key,
+            key=str(encoded_key, encoding=ENCODING),
             value_size=value_size,
             value_position=value_position,
             timestamp=timestamp,
+            is_tombstone=bool(flags & cls.FLAG_TOMBSTONE),
+            encoded_key=encoded_key,
         )
 
 
+class HintFileFooter:
+    """Last record of a hint file, written once all its items have been: it marks the file as complete, and holds the
+    number of items and the CRC32 of all the bytes preceding it. A hint file without a valid footer (e.g. because of a
+    crash while it was written) is ignored, and its data file is parsed instead.
+
+    Layout (little-endian): magic, number of items, CRC32.
+    """
+
+    # Changed along with the layout of the items, so that hint files of a previous layout are ignored
+    MAGIC = b"HND2"
+    FORMAT = struct.Struct("<4sII")
+    SIZE = FORMAT.size
+
+    def __init__(self, nb_items: int, checksum: int):
+        self.nb_items = nb_items
+        self.checksum = checksum
+
+    def to_bytes(self) -> bytes:
+        return self.FORMAT.pack(self.MAGIC, self.nb_items, self.checksum)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HintFileFooter" or None:
+        """Returns None if `data` is not a footer."""
+        if len(data) != cls.SIZE:
+            return None
+        magic, nb_items, checksum = cls.FORMAT.unpack(data)
+        if magic != cls.MAGIC:
+            return None
+        return cls(nb_items=nb_items, checksum=checksum)
+
+
 class HintFile(File):
+    """Keys and key_dir entries of all the records of a data file (tombstones are flagged, see `HintFileItem`), written
+    next to it with the same name and the `.hint` extension, followed by a `HintFileFooter`.
+    """
+
     def __init__(self, path: str, read_only: bool = False):
         self.path = path
         super().__init__(path=self.path, mode="r" if read_only else "w")
 
-    @property
-    def merged_file_path(self):
-        return os.path.splitext(self.path)[0] + ".data"
+    @staticmethod
+    def get_path(data_file_path: str) -> str:
+        """Returns the path of the hint file of the data file located at `data_file_path`."""
+        return os.path.splitext(data_file_path)[0] + ".hint"
 
     @classmethod
     def from_merge_file(cls, merged_file: MergedDataFile):
-        return cls(path=os.path.splitext(merged_file.path)[0] + ".hint")
-
-    def write(self, merged_file_key_dir: KeyDir) -> None:
-        for key, entry in merged_file_key_dir:
-            item = HintFileItem(
+        return cls(path=cls.get_path(data_file_path=merged_file.path))
+
+    def _write_items(self, items: Iterable[HintFileItem]) -> None:
+        nb_items = 0
+        checksum = 0
+        for item in items:
+            encoded_item = item.to_bytes()
+            self.file.write(encoded_item)
+            checksum = zlib.crc32(encoded_item, checksum)
+            nb_items += 1
+        self.file.write(HintFileFooter(nb_items=nb_items, checksum=checksum).to_bytes())
+
+    def write(
+        self, merged_file_key_dir: KeyDir, tombstone_keys: set[str] = frozenset()
+    ) -> None:
+        self._write_items(
+            HintFileItem(
                 timestamp=entry.timestamp,
                 value_size=entry.value_size,
                 value_position=entry.value_position,
                 key=key,
+                is_tombstone=key in tombstone_keys,
             )
-            self.file.write(item.to_bytes())
+            for key, entry in merged_file_key_dir
+        )
+
+    def write_partial_index(self, partial_index: KeyDir.PartialIndex) -> None:
+        """Writes the entries of a partial index (see `KeyDir.PartialIndex`), e.g. those of a rotated active file."""
+        self._write_items(
+            (
+                HintFileItem(
+                    timestamp=0,
+                    value_size=0,
+                    value_position=0,
+                    key=key,
+                    is_tombstone=True,
+                )
+                if entry is None
+                else HintFileItem(
+                    timestamp=entry[2],
+                    value_size=entry[1],
+                    value_position=entry[0],
+                    key=key,
+                )
+            )
+            for key, entry in partial_index.items()
+        )
+
+    def read_footer(self) -> HintFileFooter or None:
+        """Returns the footer of the file if the file is complete and its checksum matches its content (None
+        otherwise).
+        """
+        size = os.path.getsize(self.path)
+        if size < HintFileFooter.SIZE:
+            return None
+        checksum = 0
+        with open(self.path, "rb") as file:
+            nb_bytes_left = size - HintFileFooter.SIZE
+            while nb_bytes_left > 0:
+                chunk = file.read(min(self.READ_BUFFER_SIZE, nb_bytes_left))
+                checksum = zlib.crc32(chunk, checksum)
+                nb_bytes_left -= len(chunk)
+            footer = HintFileFooter.from_bytes(file.read(HintFileFooter.SIZE))
+        if footer is None or footer.checksum != checksum:
+            return None
+        return footer
 
     def __iter__(self, item_class=HintFileItem) -> Iterator[HintFileItem]:
-        return super().__iter__(item_class=item_class)
+        for _, item in self.iter_with_offsets(
+            item_class=item_class,
+            end=os.path.getsize(self.path) - HintFileFooter.SIZE,
+        ):
+            yield item
+
+    def build_partial_index(self) -> KeyDir.PartialIndex or None:
+        """Returns None if the file is not complete or is corrupted (see `HintFileFooter`)."""
+        footer = self.read_footer()
+        if footer is None:
+            return None
+        partial_index = {}
+        nb_items = 0
+        for item in self:
+            partial_index[item.key] = (
+                None
+                if item.is_tombstone
+                else (item.value_position, item.value_size, item.timestamp)
+            )
+            nb_items += 1
+        if nb_items != footer.nb_items:
+            return None
+        return partial_index
@@ -0,0 +1,135 @@
+import os
+import struct
+import zlib
+from collections import namedtuple
+
+from src.io_handling.generic_file import ENCODING, File
+from src.item import Item
+
+
+class KeyDirSnapshot:
+    """Binary snapshot (checkpoint) of the KeyDir, along with the data files it covers.
+
+    Each covered file is recorded with its sequence number in the manifest (see `Manifest`) and the number of bytes of
+    it that the snapshot covers: on boot, the snapshot is loaded and only the records written after those offsets (or
+    in files created afterwards) are replayed. The file that was active at checkpoint time is not listed in the manifest
+    yet: it is recorded with the sequence number it gets when it is rotated (the next one at checkpoint time), which is
+    what allows finding it back once it has been renamed.
+
+    Layout (little-endian):
+    - header: magic, version, number of covered files
+    - for each covered file: path size, sequence number, covered size, was active (bool), number of entries, path
+      - followed by its entries: key size, value position, value size, timestamp, key
+    - trailer: CRC32 of everything above
+    """
+
+    FILENAME = "key_dir.snapshot"
+    MAGIC = b"PYTCASK-SNAPSHOT"
+    VERSION = 2
+    HEADER_FORMAT = struct.Struct("<16sII")
+    FILE_HEADER_FORMAT = struct.Struct("<IQQ?Q")
+    ENTRY_FORMAT = struct.Struct("<IQIq")
+    TRAILER_FORMAT = struct.Struct("<I")
+
+    CoveredFile = namedtuple(
+        "CoveredFile", ["path", "sequence", "covered_size", "was_active"]
+    )
+    # Same as the entries given to `KeyDir.update_many`
+    Entry = tuple[Item.Key, File.Offset, int, int]
+
+    def __init__(
+        self,
+        covered_files: list[CoveredFile],
+        entries_per_file: dict[str, list[Entry]],
+    ):
+        self.covered_files = covered_files
+        self.entries_per_file = entries_per_file
+
+    def to_bytes(self) -> bytes:
+        data = bytearray(
+            self.HEADER_FORMAT.pack(self.MAGIC, self.VERSION, len(self.covered_files))
+        )
+        for covered_file in self.covered_files:
+            encoded_path = bytes(covered_file.path, encoding=ENCODING)
+            entries = self.entries_per_file.get(covered_file.path, [])
+            data += self.FILE_HEADER_FORMAT.pack(
+                len(encoded_path),
+                covered_file.sequence,
+                covered_file.covered_size,
+                covered_file.was_active,
+                len(entries),
+            )
+            data += encoded_path
+            for key, value_position, value_size, timestamp in entries:
+                encoded_key = bytes(key, encoding=ENCODING)
+                data += self.ENTRY_FORMAT.pack(
+                    len(encoded_key), value_position, value_size, timestamp
+                )
+                data += encoded_key
+        data += self.TRAILER_FORMAT.pack(zlib.crc32(data))
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "KeyDirSnapshot":
+        """Decodes a snapshot. Raises a ValueError if the snapshot is corrupted or has an unknown version."""
+        trailer_position = len(data) - cls.TRAILER_FORMAT.size
+        if trailer_position < cls.HEADER_FORMAT.size:
+            raise ValueError("Snapshot is truncated")
+        (crc,) = cls.TRAILER_FORMAT.unpack_from(data, trailer_position)
+        if zlib.crc32(memoryview(data)[:trailer_position]) != crc:
+            raise ValueError("Snapshot checksum does not match")
+        magic, version, nb_files = cls.HEADER_FORMAT.unpack_from(data, 0)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError(f"Unknown snapshot format (version {version})")
+
+        covered_files = []
+        entries_per_file = {}
+        offset = cls.HEADER_FORMAT.size
+        for _ in range(nb_files):
+            path_size, sequence, covered_size, was_active, nb_entries = (
+                cls.FILE_HEADER_FORMAT.unpack_from(data, offset)
+            )
+            offset += cls.FILE_HEADER_FORMAT.size
+            path = str(data[offset : offset + path_size], encoding=ENCODING)
+            offset += path_size
+            entries = []
+            for _ in range(nb_entries):
+                key_size, value_position, value_size, timestamp = (
+                    cls.ENTRY_FORMAT.unpack_from(data, offset)
+                )
+                offset += cls.ENTRY_FORMAT.size
+                key = str(data[offset : offset + key_size], encoding=ENCODING)
+                offset += key_size
+                entries.append((key, value_position, value_size, timestamp))
+            covered_files.append(
+                cls.CoveredFile(
+                    path=path,
+                    sequence=sequence,
+                    covered_size=covered_size,
+                    was_active=was_active,
+                )
+            )
+            entries_per_file[path] = entries
+
+        return cls(covered_files=covered_files, entries_per_file=entries_per_file)
+
+    def write(self, path: str) -> None:
+        """Atomically replaces the snapshot located at `path` (a crash never leaves a partially written snapshot)."""
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(self.to_bytes())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(src=temporary_path, dst=path)
+
+    @classmethod
+    def read(cls, path: str) -> "KeyDirSnapshot" or None:
+        """Returns the snapshot located at `path`, or None if there is none or if it is unreadable."""
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as file:
+            data = file.read()
+        try:
+            return cls.from_bytes(data)
+        except (ValueError, struct.error, UnicodeDecodeError):
+            return None
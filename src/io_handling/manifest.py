@@ -0,0 +1,234 @@
+import os
+import threading
+from collections import namedtuple
+
+from src.io_handling.generic_file import ENCODING, File, FileType
+
+
+class Manifest:
+    """Append-only log of the immutable data files of the store (the active file is never listed), so that the store
+    knows its files, their order and their sizes without listing the directory nor opening or stat-ing any file.
+
+    Each data file gets a sequence number when it is added, from a counter that only increases. Its position in the
+    history of the store is its sequence number, except for merged files that take the position of the most recent file
+    they were merged from (see `File.get_order` for the same rule encoded in file names): files are ordered by
+    (position, sequence).
+
+    Layout: one line per change, `add {sequence} {position} {size} {filename}`, `hint {filename}` (the hint file of the
+    data file is complete) or `remove {filename}`. A last line that is not terminated (torn write) is ignored. The log
+    is rewritten with only the current files when loaded, so that it does not grow forever, preceded by a
+    `sequence {sequence}` line holding the last sequence number given: the sequence numbers of removed files are never
+    given again (see `Storage._locate_snapshot_files`).
+
+    Changes are recorded before the files are renamed into the store, and removals before the files are deleted: a
+    crash in between leaves at most an entry whose file does not exist (see `Storage._build_partial_index`), never a
+    file of the store that is not listed.
+    """
+
+    FILENAME = "MANIFEST"
+
+    Entry = namedtuple("Entry", ["sequence", "position", "size", "has_hint"])
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = f"{directory}/{self.FILENAME}"
+        # Current files, by path
+        self.entries: dict[str, Manifest.Entry] = {}
+        self._last_sequence = 0
+        # Serializes changes (rotations, merges and hint writers run in different threads)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, directory: str) -> "Manifest":
+        """Reads the manifest of the store located in `directory`. If there is none (e.g. the store was created before
+        manifests existed) or if it cannot be parsed, it is rebuilt from the files found in the directory.
+        """
+        manifest = cls(directory=directory)
+        if not os.path.isdir(directory):
+            return manifest
+        if not manifest._read():
+            manifest._discover_files()
+        manifest._rewrite()
+        return manifest
+
+    def _read(self) -> bool:
+        """Returns False if the manifest does not exist or is invalid."""
+        try:
+            with open(self.path, "rb") as file:
+                content = file.read().decode(ENCODING)
+        except (FileNotFoundError, UnicodeDecodeError):
+            return False
+        # The last element is either empty or a torn line
+        for line in content.split("\n")[:-1]:
+            operation, *arguments = line.split(" ")
+            try:
+                if operation == "add":
+                    sequence, position, size, filename = arguments
+                    self._add(
+                        path=f"{self.directory}/{filename}",
+                        entry=self.Entry(
+                            sequence=int(sequence),
+                            position=int(position),
+                            size=int(size),
+                            has_hint=False,
+                        ),
+                    )
+                elif operation == "hint":
+                    (filename,) = arguments
+                    self._set_hint(path=f"{self.directory}/{filename}")
+                elif operation == "remove":
+                    (filename,) = arguments
+                    self.entries.pop(f"{self.directory}/{filename}", None)
+                elif operation == "sequence":
+                    (sequence,) = arguments
+                    self._last_sequence = max(self._last_sequence, int(sequence))
+                else:
+                    return False
+            except ValueError:
+                return False
+        return True
+
+    def _discover_files(self) -> None:
+        """Lists the data files of the directory, ordered by their names (see `File.get_order`)."""
+        self.entries = {}
+        self._last_sequence = 0
+        filenames = os.listdir(self.directory)
+        data_file_paths = sorted(
+            (
+                f"{self.directory}/{filename}"
+                for filename in filenames
+                if File.get_type(path=filename) in FileType.data_types()
+            ),
+            key=File.get_order,
+        )
+        for path in data_file_paths:
+            if File.get_order(path=path)[0] == float("inf"):
+                continue  # Active file
+            sequence = self._last_sequence + 1
+            self._add(
+                path=path,
+                entry=self.Entry(
+                    sequence=sequence,
+                    position=sequence,
+                    size=os.path.getsize(path),
+                    has_hint=(
+                        f"{os.path.splitext(os.path.basename(path))[0]}.hint"
+                        in filenames
+                    ),
+                ),
+            )
+
+    def _rewrite(self) -> None:
+        """Replaces the log by the additions of the current files only (atomically)."""
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(
+                "".join(
+                    [
+                        f"sequence {self._last_sequence}\n",
+                        *(
+                            self._format_addition(path=path, entry=entry)
+                            for path, entry in self.entries.items()
+                        ),
+                    ]
+                ).encode(ENCODING)
+            )
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self.path)
+
+    @staticmethod
+    def _format_addition(path: str, entry: Entry) -> str:
+        filename = os.path.basename(path)
+        line = f"add {entry.sequence} {entry.position} {entry.size} {filename}\n"
+        if entry.has_hint:
+            line += f"hint {filename}\n"
+        return line
+
+    def _append(self, lines: str) -> None:
+        with open(self.path, "ab") as file:
+            file.write(lines.encode(ENCODING))
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _add(self, path: str, entry: Entry) -> None:
+        self.entries[path] = entry
+        self._last_sequence = max(self._last_sequence, entry.sequence)
+
+    def _set_hint(self, path: str) -> None:
+        entry = self.entries.get(path)
+        if entry is not None:
+            self.entries[path] = entry._replace(has_hint=True)
+
+    # ~~~~~~~~~~~~~~~~~~~
+    # ~~~ API
+    # ~~~~~~~~~~~~~~~~~~~
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.entries
+
+    def get_last_sequence(self) -> int:
+        """Returns the sequence number of the last file added (0 if none): the next file added gets the next one."""
+        return self._last_sequence
+
+    def get_next_position(self) -> int:
+        """Returns a position more recent than the position of all the files of the store."""
+        return self._last_sequence + 1
+
+    def add(
+        self,
+        path: str,
+        size: int,
+        position: int or None = None,
+        has_hint: bool = False,
+    ) -> None:
+        """Records a new data file, at `position` in the history of the store (defaults to the most recent one)."""
+        with self._lock:
+            sequence = self._last_sequence + 1
+            entry = self.Entry(
+                sequence=sequence,
+                position=position if position is not None else sequence,
+                size=size,
+                has_hint=has_hint,
+            )
+            self._append(lines=self._format_addition(path=path, entry=entry))
+            self._add(path=path, entry=entry)
+
+    def add_hint(self, path: str) -> None:
+        """Records that the hint file of a data file is complete (ignored if the data file has been removed)."""
+        with self._lock:
+            if path not in self.entries:
+                return
+            self._append(lines=f"hint {os.path.basename(path)}\n")
+            self._set_hint(path=path)
+
+    def remove(self, paths: list[str]) -> None:
+        with self._lock:
+            paths = [path for path in paths if path in self.entries]
+            if not paths:
+                return
+            self._append(
+                lines="".join(f"remove {os.path.basename(path)}\n" for path in paths)
+            )
+            for path in paths:
+                del self.entries[path]
+
+    def get_order(self, path: str) -> tuple[float, int]:
+        """Returns the order of a data file in the history of the store: files not listed (i.e. the active file) are the
+        most recent ones.
+        """
+        entry = self.entries.get(path)
+        if entry is None:
+            return float("inf"), 0
+        return entry.position, entry.sequence
+
+    def get_paths(self) -> list[str]:
+        """Returns the paths of all the data files, from the oldest to the most recent."""
+        with self._lock:
+            paths = list(self.entries)
+        return sorted(paths, key=self.get_order)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries = {}
+            self._last_sequence = 0
@@ -1,27 +1,94 @@
+from array import array
 from collections import namedtuple
-from typing import Iterator, TYPE_CHECKING
+from typing import Iterator, Iterable
 
 from src.io_handling.generic_file import File
 from src.item import Item
 
-if TYPE_CHECKING:
-    from src.io_handling.data_file import DataFile
-    from src.io_handling.hint_file import HintFile
+
+class FileTable:
+    """Interns file paths into small integer file ids, so that entries only need to store an id instead of a path."""
+
+    def __init__(self):
+        self.paths: list[str] = []
+        self.file_ids: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.file_ids)
+
+    def get_file_id(self, path: str) -> int:
+        """Returns the id of the file located at `path` (a new id is assigned to paths seen for the first time)."""
+        file_id = self.file_ids.get(path)
+        if file_id is None:
+            file_id = len(self.paths)
+            self.paths.append(path)
+            self.file_ids[path] = file_id
+        return file_id
+
+    def get_path(self, file_id: int) -> str:
+        return self.paths[file_id]
+
+    def copy(self) -> "FileTable":
+        file_table = FileTable()
+        file_table.paths = self.paths.copy()
+        file_table.file_ids = self.file_ids.copy()
+        return file_table
+
+    def rename(self, previous_path: str, new_path: str) -> None:
+        """Assigns the id of `previous_path` to `new_path` (e.g. when a file is renamed)."""
+        file_id = self.file_ids.pop(previous_path, None)
+        if file_id is None:
+            return
+        self.paths[file_id] = new_path
+        self.file_ids[new_path] = file_id
 
 
 class KeyDir:
     KeyDirEntry = namedtuple(
         "KeyDirEntry", ["file_path", "value_position", "value_size", "timestamp"]
     )
+    # Entries are stored with the id of their file (see `FileTable`) instead of its path
+    StoredEntry = namedtuple(
+        "StoredEntry", ["file_id", "value_position", "value_size", "timestamp"]
+    )
+    # Index built from one single file: maps each key to a tuple (value_position, value_size, timestamp) locating its
+    # most recent record in the file, or to None if that record is a tombstone
+    PartialIndex = dict[Item.Key, tuple[File.Offset, int, int] or None]
 
     def __init__(self):
-        self.entries = {}
+        self._clear()
+
+    def __iter__(self) -> Iterator[tuple[Item.Key, KeyDirEntry]]:
+        for key, stored_entry in self.entries.items():
+            yield key, self._to_key_dir_entry(stored_entry=stored_entry)
+
+    def __len__(self) -> int:
+        return len(self.entries)
 
-    def __iter__(self) -> Iterator[KeyDirEntry]:
-        return iter(zip(self.entries.keys(), self.entries.values()))
+    def get_keys(self) -> list[Item.Key]:
+        """Returns a snapshot of all the keys (the list is built atomically, even if writers update the key_dir).
+        Not named `keys`, otherwise `dict(key_dir)` would treat the key_dir as a mapping instead of iterating over it.
+        """
+        return list(self.entries)
 
     def _clear(self):
         self.entries = {}
+        self.file_table = FileTable()
+
+    def copy(self) -> "KeyDir":
+        """Returns a shallow copy of the key_dir, which is much faster than iterating over its entries."""
+        key_dir = type(self)()
+        key_dir.entries = self.entries.copy()
+        key_dir.file_table = self.file_table.copy()
+        return key_dir
+
+    def _to_key_dir_entry(self, stored_entry: StoredEntry) -> KeyDirEntry:
+        return self.KeyDirEntry(
+            file_path=self.file_table.get_path(stored_entry.file_id),
+            value_position=stored_entry.value_position,
+            value_size=stored_entry.value_size,
+            timestamp=stored_entry.timestamp,
+        )
 
     def update(
         self,
@@ -31,47 +98,214 @@ class KeyDir:
         value_size: int,
         timestamp: int,
     ) -> None:
-        self.entries[key] = self.KeyDirEntry(
-            file_path=file_path,
+        self.entries[key] = self.StoredEntry(
+            file_id=self.file_table.get_file_id(file_path),
             value_position=value_position,
             value_size=value_size,
             timestamp=timestamp,
         )
 
+    def update_many(
+        self,
+        file_path: str,
+        entries: list[tuple[Item.Key, File.Offset, int, int]],
+    ) -> None:
+        """Bulk version of `update` for entries located in the same file.
+        Each entry is a tuple (key, value_position, value_size, timestamp).
+        """
+        file_id = self.file_table.get_file_id(file_path)
+        self.entries.update(
+            (
+                key,
+                self.StoredEntry(
+                    file_id=file_id,
+                    value_position=value_position,
+                    value_size=value_size,
+                    timestamp=timestamp,
+                ),
+            )
+            for key, value_position, value_size, timestamp in entries
+        )
+
     def delete(self, key: Item.Key) -> None:
         del self.entries[key]
 
+    def delete_many(self, keys: list[Item.Key]) -> None:
+        """Bulk version of `delete`. Keys that are not in the key_dir are ignored."""
+        for key in keys:
+            self.entries.pop(key, None)
+
     def update_file_path(self, previous_path: str, new_path: str) -> None:
-        for key, key_dir_entry in self:
-            if key_dir_entry.file_path == previous_path:
-                self.update(
-                    key=key,
-                    file_path=new_path,
-                    value_position=key_dir_entry.value_position,
-                    value_size=key_dir_entry.value_size,
-                    timestamp=key_dir_entry.timestamp,
-                )
+        """Makes all entries located in the file `previous_path` point to `new_path` instead.
+        Since entries only store the id of their file, this is done in constant time (the id is re-assigned to the new
+        path, whatever the number of keys), and a new id will be assigned to `previous_path` if it gets used again.
+        """
+        self.file_table.rename(previous_path=previous_path, new_path=new_path)
 
     def get(self, key: Item.Key) -> KeyDirEntry or None:
-        return self.entries[key] if key in self.entries else None
+        stored_entry = self.entries.get(key)
+        if stored_entry is None:
+            return None
+        return self._to_key_dir_entry(stored_entry=stored_entry)
 
-    def rebuild(self, hint_files: list["HintFile"], data_files: list["DataFile"]):
+    def merge_partial_index(self, file_path: str, partial_index: PartialIndex) -> None:
+        """Applies the partial index of the file `file_path` on top of the current entries (i.e. the file is more
+        recent than all the files already indexed): its entries override existing ones, and its tombstones delete them.
+        """
+        self.update_many(
+            file_path=file_path,
+            entries=[
+                (key, *entry)
+                for key, entry in partial_index.items()
+                if entry is not None
+            ],
+        )
+        self.delete_many(
+            keys=[key for key, entry in partial_index.items() if entry is None]
+        )
+
+    def rebuild(self, partial_indexes: Iterable[tuple[str, PartialIndex]]) -> None:
+        """Rebuilds the key_dir from the partial indexes (see `PartialIndex`) of all files of the store.
+        Partial indexes are tuples (path of the indexed data file, partial index), and must be given from the oldest to
+        the most recent file, so that the most recent entry of each key wins.
+        """
         self._clear()
-        for hint_file in hint_files:
-            for item in hint_file:  # This is a HintFileItem
-                self.update(
-                    key=item.key,
-                    file_path=hint_file.merged_file_path,
-                    value_position=item.value_position,
-                    value_size=item.value_size,
-                    timestamp=item.timestamp,
-                )
-        for data_file in data_files:
-            for item in data_file:  # This is a DataFileItem
-                self.update(
-                    key=item.key,
-                    file_path=data_file.path,
-                    value_position=item.value_position,
-                    value_size=item.value_size,
-                    timestamp=item.timestamp,
-                )
+        for file_path, partial_index in partial_indexes:
+            self.merge_partial_index(file_path=file_path, partial_index=partial_index)
+
+
+class CompactKeyDir(KeyDir):
+    """Memory-efficient version of the KeyDir.
+
+    Instead of one namedtuple (and one int object per field) per key, the fields of all entries (including the id of
+    their file) are packed into typed arrays (one per field). The hash table only maps each key to the index of its
+    entry in the arrays. Indexes of deleted entries are recycled by subsequent updates.
+    Entries are materialized as `KeyDirEntry` namedtuples when read, so that both KeyDirs can be used interchangeably.
+
+    Since an entry is spread over several arrays, updating it is not atomic: a version number, odd while an update is in
+    progress, lets readers detect (and retry) reads that overlap an update (seqlock). Writers must be serialized.
+    """
+
+    def __iter__(self) -> Iterator[tuple[Item.Key, KeyDir.KeyDirEntry]]:
+        for key, index in self.entries.items():
+            yield key, self._get_entry(index=index)
+
+    def _clear(self):
+        super()._clear()
+        self.entries: dict[Item.Key, int] = {}
+        self.file_ids = array("I")
+        self.value_positions = array("Q")
+        self.value_sizes = array("I")
+        self.timestamps = array("q")
+        self.free_indexes: list[int] = []
+        self.version = 0
+
+    def copy(self) -> "CompactKeyDir":
+        key_dir = super().copy()
+        key_dir.file_ids = self.file_ids[:]
+        key_dir.value_positions = self.value_positions[:]
+        key_dir.value_sizes = self.value_sizes[:]
+        key_dir.timestamps = self.timestamps[:]
+        key_dir.free_indexes = self.free_indexes.copy()
+        return key_dir
+
+    def _get_entry(self, index: int) -> KeyDir.KeyDirEntry:
+        return self.KeyDirEntry(
+            file_path=self.file_table.get_path(self.file_ids[index]),
+            value_position=self.value_positions[index],
+            value_size=self.value_sizes[index],
+            timestamp=self.timestamps[index],
+        )
+
+    def _set_entry(
+        self,
+        key: Item.Key,
+        file_id: int,
+        value_position: File.Offset,
+        value_size: int,
+        timestamp: int,
+    ) -> None:
+        self.version += 1
+        try:
+            self._write_entry(
+                key=key,
+                file_id=file_id,
+                value_position=value_position,
+                value_size=value_size,
+                timestamp=timestamp,
+            )
+        finally:
+            self.version += 1
+
+    def _write_entry(
+        self,
+        key: Item.Key,
+        file_id: int,
+        value_position: File.Offset,
+        value_size: int,
+        timestamp: int,
+    ) -> None:
+        index = self.entries.get(key)
+        if index is None and self.free_indexes:
+            index = self.free_indexes.pop()
+        if index is None:
+            self.entries[key] = len(self.file_ids)
+            self.file_ids.append(file_id)
+            self.value_positions.append(value_position)
+            self.value_sizes.append(value_size)
+            self.timestamps.append(timestamp)
+            return
+
+        self.entries[key] = index
+        self.file_ids[index] = file_id
+        self.value_positions[index] = value_position
+        self.value_sizes[index] = value_size
+        self.timestamps[index] = timestamp
+
+    def update(
+        self,
+        key: Item.Key,
+        file_path: str,
+        value_position: File.Offset,
+        value_size: int,
+        timestamp: int,
+    ) -> None:
+        self._set_entry(
+            key=key,
+            file_id=self.file_table.get_file_id(file_path),
+            value_position=value_position,
+            value_size=value_size,
+            timestamp=timestamp,
+        )
+
+    def update_many(
+        self,
+        file_path: str,
+        entries: list[tuple[Item.Key, File.Offset, int, int]],
+    ) -> None:
+        file_id = self.file_table.get_file_id(file_path)
+        for key, value_position, value_size, timestamp in entries:
+            self._set_entry(
+                key=key,
+                file_id=file_id,
+                value_position=value_position,
+                value_size=value_size,
+                timestamp=timestamp,
+            )
+
+    def delete(self, key: Item.Key) -> None:
+        self.free_indexes.append(self.entries.pop(key))
+
+    def delete_many(self, keys: list[Item.Key]) -> None:
+        for key in keys:
+            index = self.entries.pop(key, None)
+            if index is not None:
+                self.free_indexes.append(index)
+
+    def get(self, key: Item.Key) -> KeyDir.KeyDirEntry or None:
+        while True:
+            version = self.version
+            index = self.entries.get(key)
+            entry = self._get_entry(index=index) if index is not None else None
+            if version % 2 == 0 and version == self.version:
+                return entry
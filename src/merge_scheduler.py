@@ -0,0 +1,147 @@
+import logging
+import threading
+from datetime import datetime
+
+from src.io_handling.data_file import ImmutableDataFile
+from src.merge_worker import MergeWorker, MergeReport
+from src.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+class MergePolicy:
+    """Defines when a merge is triggered and which files it merges (similar to Bitcask's merge settings).
+
+    A merge is triggered when at least one immutable file has a fragmentation (ratio of dead bytes) of at least
+    `fragmentation_trigger`, or at least `dead_bytes_trigger` dead bytes. Once triggered, the merge includes all the
+    immutable files having a fragmentation of at least `fragmentation_threshold`, or at least `dead_bytes_threshold`
+    dead bytes.
+
+    Merges are only started within `merge_window` (a pair (start hour, end hour), both included, that may wrap around
+    midnight), or at any time if it is None. A merge that has started is not interrupted at the end of the window.
+    They read at most `max_bytes_per_second` bytes per second (no limit if None), so as not to hurt the latency of
+    foreground operations.
+    """
+
+    DEFAULT_FRAGMENTATION_TRIGGER = 0.6
+    DEFAULT_DEAD_BYTES_TRIGGER = 512 * 1024 * 1024
+    DEFAULT_FRAGMENTATION_THRESHOLD = 0.4
+    DEFAULT_DEAD_BYTES_THRESHOLD = 128 * 1024 * 1024
+    DEFAULT_CHECK_INTERVAL = 60
+
+    def __init__(
+        self,
+        fragmentation_trigger: float = DEFAULT_FRAGMENTATION_TRIGGER,
+        dead_bytes_trigger: int = DEFAULT_DEAD_BYTES_TRIGGER,
+        fragmentation_threshold: float = DEFAULT_FRAGMENTATION_THRESHOLD,
+        dead_bytes_threshold: int = DEFAULT_DEAD_BYTES_THRESHOLD,
+        merge_window: tuple[int, int] or None = None,
+        max_bytes_per_second: float or None = None,
+        check_interval: float = DEFAULT_CHECK_INTERVAL,
+    ):
+        if fragmentation_threshold > fragmentation_trigger:
+            raise ValueError(
+                "The fragmentation threshold should not exceed the trigger"
+            )
+        if dead_bytes_threshold > dead_bytes_trigger:
+            raise ValueError("The dead bytes threshold should not exceed the trigger")
+        self.fragmentation_trigger = fragmentation_trigger
+        self.dead_bytes_trigger = dead_bytes_trigger
+        self.fragmentation_threshold = fragmentation_threshold
+        self.dead_bytes_threshold = dead_bytes_threshold
+        self.merge_window = merge_window
+        self.max_bytes_per_second = max_bytes_per_second
+        # Number of seconds between two checks of the triggers
+        self.check_interval = check_interval
+
+    def is_in_merge_window(self, now: datetime) -> bool:
+        if self.merge_window is None:
+            return True
+        start_hour, end_hour = self.merge_window
+        if start_hour <= end_hour:
+            return start_hour <= now.hour <= end_hour
+        return now.hour >= start_hour or now.hour <= end_hour
+
+
+class MergeScheduler:
+    """Background thread merging the most fragmented immutable files of a store, following a `MergePolicy`.
+
+    Every `check_interval` seconds, the dead bytes tracked by the storage are compared to the triggers of the policy:
+    if a merge is needed (and allowed at that time), only the files above the thresholds are merged. A merge that fails
+    (e.g. on a corrupted record) is logged and counted in the `failed_merges` metric, and the checks go on.
+    """
+
+    def __init__(
+        self,
+        storage: Storage,
+        merge_policy: MergePolicy,
+        file_size_threshold: int = MergeWorker.DEFAULT_FILE_SIZE_THRESHOLD,
+    ):
+        self.storage = storage
+        self.merge_policy = merge_policy
+        self.merge_worker = MergeWorker(
+            storage=storage,
+            file_size_threshold=file_size_threshold,
+            max_bytes_per_second=merge_policy.max_bytes_per_second,
+        )
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _get_fragmentation_per_file(self) -> dict[str, tuple[float, int]]:
+        """Returns the fragmentation (ratio of dead bytes) and the number of dead bytes of each immutable file."""
+        fragmentation_per_file = {}
+        for file_path in self.storage.get_immutable_file_paths():
+            file_size = self.storage.get_file_size(path=file_path)
+            dead_bytes = self.storage.dead_bytes.get(file_path, 0)
+            fragmentation = dead_bytes / file_size if file_size else 0.0
+            fragmentation_per_file[file_path] = (fragmentation, dead_bytes)
+        return fragmentation_per_file
+
+    def select_files_to_merge(self) -> list[str]:
+        """Returns the paths of the files to merge (empty if no file reaches the triggers of the policy)."""
+        fragmentation_per_file = self._get_fragmentation_per_file()
+        is_merge_triggered = any(
+            fragmentation >= self.merge_policy.fragmentation_trigger
+            or dead_bytes >= self.merge_policy.dead_bytes_trigger
+            for fragmentation, dead_bytes in fragmentation_per_file.values()
+        )
+        if not is_merge_triggered:
+            return []
+        return [
+            file_path
+            for file_path, (fragmentation, dead_bytes) in fragmentation_per_file.items()
+            if fragmentation >= self.merge_policy.fragmentation_threshold
+            or dead_bytes >= self.merge_policy.dead_bytes_threshold
+        ]
+
+    def run_once(self, now: datetime or None = None) -> MergeReport or None:
+        """Merges the files selected by the policy, if any. Returns the report of the merge (None if none was run)."""
+        now = now or datetime.now()
+        if not self.merge_policy.is_in_merge_window(now=now):
+            return None
+        file_paths = self.select_files_to_merge()
+        if not file_paths:
+            return None
+        return self.merge_worker.do_merge(
+            data_files=[ImmutableDataFile(path=file_path) for file_path in file_paths]
+        )
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(timeout=self.merge_policy.check_interval):
+            try:
+                self.run_once()
+            except Exception:
+                self.storage.metrics.increment("failed_merges")
+                logger.exception("Merge of %s failed", self.storage.directory)
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the background thread, after the end of the running merge (if any)."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -2,21 +2,23 @@
 - do_merge method => merge files until max file size + creates a hint file
 
 do_merge method:
+- streams the records of the files to merge and only copies the live ones (those the key_dir points at)
 - merge files until max size, then creates new files
 - adds a hint file
 - MERGING: file should not be read while it's being processed, then should add it and then delete others (OK because never re-read)
 - Timestamp should be equal to that of the most recent key merged
 
-For now: merge all files of the store
-TODO later: add options to merge only partly (between timestamps for example)
+By default: merge all files of the store. The MergeScheduler only merges the most fragmented ones.
 
 Unclear thoughts:
 - should merge file size be the same as storage_engine max file size ?
 """
 
 import os
+from time import monotonic, perf_counter, sleep, time
 
 from src.io_handling.data_file import (
+    CorruptedRecordError,
     MergedDataFile,
     DataFile,
     ImmutableDataFile,
@@ -24,9 +26,66 @@ from src.io_handling.data_file import (
 )
 from src.io_handling.generic_file import File
 from src.io_handling.hint_file import HintFile
+from src.item import Item
 from src.storage import Storage
 
 
+class MergeReport:
+    """Statistics about one merge run."""
+
+    def __init__(self):
+        self.nb_merged_files = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.nb_live_records = 0
+        self.nb_dead_records = 0
+        self.nb_dropped_tombstones = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"MergeReport(files={self.nb_merged_files}, "
+            f"reclaimed_bytes={self.reclaimed_bytes}, "
+            f"live_records={self.nb_live_records}, "
+            f"dead_records={self.nb_dead_records}, "
+            f"live_ratio={self.live_ratio:.2f})"
+        )
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        return self.input_bytes - self.output_bytes
+
+    @property
+    def live_ratio(self) -> float:
+        """Fraction of the input bytes that were still live (and thus copied to merged files)."""
+        if self.input_bytes == 0:
+            return 1.0
+        return self.output_bytes / self.input_bytes
+
+    @property
+    def dead_ratio(self) -> float:
+        return 1.0 - self.live_ratio
+
+
+class RateLimiter:
+    """Limits the throughput of an operation to `max_bytes_per_second` (no limit if None), by sleeping whenever more
+    bytes have been processed than allowed for the elapsed time."""
+
+    def __init__(self, max_bytes_per_second: float or None = None):
+        self.max_bytes_per_second = max_bytes_per_second
+        self._start_time = monotonic()
+        self._nb_bytes = 0
+
+    def consume(self, nb_bytes: int) -> None:
+        if self.max_bytes_per_second is None:
+            return
+        self._nb_bytes += nb_bytes
+        delay = self._nb_bytes / self.max_bytes_per_second - (
+            monotonic() - self._start_time
+        )
+        if delay > 0:
+            sleep(delay)
+
+
 class MergeWorker:
     DEFAULT_FILE_SIZE_THRESHOLD = 1000
 
@@ -34,100 +93,258 @@ class MergeWorker:
         self,
         storage: Storage,
         file_size_threshold: int = DEFAULT_FILE_SIZE_THRESHOLD,
+        max_bytes_per_second: float or None = None,
     ):
         # 'file_size_threshold' is an indicative threshold defining when a new merged file should be created (every time
         # a merged file gets bigger than that threshold, we create a new one).
         # This is not really a max size for the file because most merged files should be slightly bigger than this
-        # threshold (the actual max file size will be the sum of this threshold and of the max size for active files).
+        # threshold (the actual max file size will be the sum of this threshold and of the size of one record).
         self.file_size_threshold = file_size_threshold
         self.storage = storage
+        # Limits the number of bytes read per second by a merge, so that it does not starve foreground operations
+        self.max_bytes_per_second = max_bytes_per_second
 
     def _get_mergeable_files(self) -> list[DataFile]:
-        all_filenames = os.listdir(self.storage.directory)
         return [
-            ImmutableDataFile(path=f"{self.storage.directory}/{filename}")
-            for filename in all_filenames
-            if self.storage.active_data_file.path
-            != f"{self.storage.directory}/{filename}"
-            and not filename.endswith(".hint")
+            ImmutableDataFile(path=file_path)
+            for file_path in self.storage.get_immutable_file_paths()
+        ]
+
+    def _get_oldest_unmerged_file_order(
+        self, data_files: list[DataFile]
+    ) -> tuple[float, int]:
+        """Returns the order (see `Manifest.get_order`) of the oldest data file of the store that is not part of the
+        merge (the active file is the most recent one).
+        """
+        merged_file_paths = {data_file.path for data_file in data_files}
+        unmerged_file_orders = [
+            self.storage.get_file_order(path=file_path)
+            for file_path in self.storage.get_immutable_file_paths()
+            if file_path not in merged_file_paths
         ]
+        return min(unmerged_file_orders, default=(float("inf"), 0))
+
+    def _get_merged_files_position(self, data_files: list[DataFile]) -> int:
+        """Merged files take the place of the most recent file they are merged from (see `Manifest.get_order`)."""
+        position, _ = max(
+            (self.storage.get_file_order(path=file.path) for file in data_files),
+            default=(float("inf"), 0),
+        )
+        if position == float("inf"):
+            # The active file is being merged: only records written from now on are more recent
+            return self.storage.manifest.get_next_position()
+        return position
+
+    @staticmethod
+    def _get_merged_files_order_timestamp(data_files: list[DataFile]) -> int:
+        """Merged files are named after the most recent file they are merged from (see `File.get_order`), so that the
+        order of the files can still be recovered from their names if the manifest is lost.
+        """
+        order_timestamp, _ = max(
+            (File.get_order(path=file.path) for file in data_files),
+            default=(float("inf"), 0),
+        )
+        if order_timestamp == float("inf"):
+            # The active file is being merged: only records written from now on are more recent
+            return int(time() * 1_000_000)
+        return order_timestamp
+
+    def _is_live(
+        self,
+        data_file: DataFile,
+        offset: File.Offset,
+        item: DataFileItem,
+        keep_tombstones: bool,
+    ) -> bool:
+        """A record is live if the key_dir points at exactly that record.
+        A tombstone is only needed as long as its key is deleted and older records of that key may still exist in files
+        that are not part of the merge (`keep_tombstones`): otherwise, all the records it deletes are dropped as well.
+        """
+        key_dir_entry = self.storage.key_dir.get(item.key)
+        if item.is_tombstone:
+            return keep_tombstones and key_dir_entry is None
+        return (
+            key_dir_entry is not None
+            and key_dir_entry.file_path == data_file.path
+            and key_dir_entry.value_position == offset + item.value_position
+        )
 
-    def _create_merge_file(
-        self, data_file_items: list[DataFileItem], files: list[File]
-    ) -> MergedDataFile:
-        """The creation of a new merged file involves the following steps:
-        1. Flush rows to disk (i.e. write data_file_items to new merged file)
-        2. Add the hint file next to it
+    def _complete_merged_file(
+        self,
+        merged_file: MergedDataFile,
+        source_positions: dict[Item.Key, tuple[str, File.Offset]],
+        files: list[File],
+        position: int,
+    ) -> None:
+        """The completion of a merged file involves the following steps:
+        1. Flush rows to disk (i.e. close the merged file)
+        2. Add the hint file next to it, and record both in the manifest (at `position` in the history of the store)
         3. Now that the merged file is created, we can read from it => update KEY_DIR to reflect the new positions
-        4. Delete all files that were used in the merging process
+        4. Delete all files whose live records have all been written to completed merged files
         """
         # Step 1: Flush to disk
-        merged_file = MergedDataFile(store_path=self.storage.directory)
-        merged_file_key_dir = merged_file.write(data_file_items=data_file_items)
         merged_file.close()
 
         # Step 2: Create hint file
         hint_file = HintFile.from_merge_file(merged_file=merged_file)
-        hint_file.write(merged_file_key_dir=merged_file_key_dir)
-
-        # Step 3: Update KEY_DIR
-        for key, entry in merged_file_key_dir:
-            # Update in key_dir only those that were searched for in one of the merged files
-            # NB: An alternative way to do this would be to compare the timestamps and update the entries that have not
-            # been updated more recently. However, timestamps in seconds does not give enough granularity here.
-            if self.storage.key_dir.get(key).file_path not in [
-                file.path for file in files
-            ]:
-                continue
-
-            self.storage.key_dir.update(
-                key=key,
-                file_path=entry.file_path,
-                value_position=entry.value_position,
-                value_size=entry.value_size,
-                timestamp=entry.timestamp,
-            )
+        hint_file.write(
+            merged_file_key_dir=merged_file.key_dir,
+            tombstone_keys=merged_file.tombstone_keys,
+        )
+        hint_file.close()
+        self.storage.manifest.add(
+            path=merged_file.path,
+            size=merged_file.size,
+            position=position,
+            has_hint=True,
+        )
+
+        # Step 3: Update KEY_DIR (with the write lock held, so that no write happens between the check and the update)
+        with self.storage.lock_writes():
+            self.storage.dead_bytes[merged_file.path] = 0
+            for key, entry in merged_file.key_dir:
+                # Only entries that still point at the record that was copied are updated: the key may have been
+                # updated (or deleted) since the record was read, in which case the copy is dead (as are tombstones).
+                key_dir_entry = self.storage.key_dir.get(key)
+                if key_dir_entry is None or (
+                    key_dir_entry.file_path,
+                    key_dir_entry.value_position,
+                ) != source_positions.get(key):
+                    self.storage.dead_bytes[
+                        merged_file.path
+                    ] += self.storage.get_record_size(
+                        key=key, value_size=entry.value_size
+                    )
+                    continue
+
+                self.storage.key_dir.update(
+                    key=key,
+                    file_path=entry.file_path,
+                    value_position=entry.value_position,
+                    value_size=entry.value_size,
+                    timestamp=entry.timestamp,
+                )
 
-        # Step 4: Delete all files that have been merged together
-        for file in files:
-            file.discard()
+        # Step 4: Delete all files that have been merged
+        self._discard_files(files=files)
 
-        return merged_file
+    def _discard_files(self, files: list[File]) -> None:
+        # Readers still reading these files keep their (pinned) descriptors until they are done. The write lock prevents
+        # checkpoints from listing files that are being deleted.
+        with self.storage.lock_writes():
+            self.storage.manifest.remove(paths=[file.path for file in files])
+            for file in files:
+                self.storage.dead_bytes.pop(file.path, None)
+                self.storage.file_handle_pool.invalidate(path=file.path)
+                file.discard()
+                # The hint file (if any) goes with its data file. A hint file still being written is deleted by its
+                # writer once it notices that the data file is gone.
+                try:
+                    os.remove(HintFile.get_path(data_file_path=file.path))
+                except FileNotFoundError:
+                    pass
 
-    def _merge_files(self, data_files: list[DataFile]) -> list[MergedDataFile]:
+    def _merge_files(
+        self, data_files: list[DataFile], report: MergeReport or None = None
+    ) -> list[MergedDataFile]:
         """The merging process is as follows:
-        1. Read input files and record only the most recent value for each key (by storing it in an in-memory hashmap)
-        2. Whenever the merge file gets bigger than the max file size OR when we are done parsing all files, we flush
-        the hashmap containing all file rows to a new merged file.
+        1. Stream the records of the input files, and copy to the merged file only the live ones (i.e. the records the
+        key_dir points at). Only one record per key is live, so no record needs to be kept in memory. Tombstones are
+        dropped unless some files older than theirs are not part of the merge.
+        2. Whenever the merged file gets bigger than the size threshold, it is completed (hint file, key_dir update) and
+        the input files that have been fully read are deleted. A new merged file is then started.
+        Memory usage is thus bounded by the size of a merged file, whatever the size of the input files.
+        A corrupted record raises `CorruptedRecordError`: the files that have not been copied to a completed merged file
+        yet (including the one holding that record) are kept as they are.
         """
-        file_rows = {}
-        files_being_merged = []
+        report = report if report is not None else MergeReport()
+        rate_limiter = RateLimiter(max_bytes_per_second=self.max_bytes_per_second)
         merged_files = []
+        merged_file = None
+        # Position (file path, value position) of the record each item of the merged file was copied from
+        source_positions = {}
+        # Files whose live records have all been copied, but not yet to a completed merged file
+        fully_read_files = []
 
-        # Parsing files from oldest to most recent so that we always have the most up-to-date value in the hashmap
-        data_files.sort()
-        while data_files:
-            data_file = data_files.pop(0)
-            files_being_merged.append(data_file)
-            for data_file_item in data_file:
-                file_rows[data_file_item.key] = data_file_item
-            # Warning: The order of data file items differs from the original one.
-            # Not a problem because only one value per key in merged files.
-            # An alternative would be to record the rows in a list and the keys and index in a hashmap. Everytime
-            # we replace a key, we pop it out of the list and append the new one to the list. This would keep the order.
-            data_file_items = list(file_rows.values())
-            merged_file_size = sum(
-                len(data_file_item.encoded_item) for data_file_item in data_file_items
-            )
-
-            # Once the threshold is crossed OR we have processed all files, we flush the rows to the merged file
-            if merged_file_size >= self.file_size_threshold or len(data_files) == 0:
-                merged_file = self._create_merge_file(
-                    data_file_items=data_file_items, files=files_being_merged
+        # Parsing files from oldest to most recent so that tombstones are kept after the records they delete
+        data_files.sort(
+            key=lambda data_file: self.storage.get_file_order(path=data_file.path)
+        )
+        oldest_unmerged_file_order = self._get_oldest_unmerged_file_order(
+            data_files=data_files
+        )
+        order_timestamp = self._get_merged_files_order_timestamp(data_files=data_files)
+        position = self._get_merged_files_position(data_files=data_files)
+        try:
+            for data_file in data_files:
+                report.nb_merged_files += 1
+                report.input_bytes += self.storage.get_file_size(path=data_file.path)
+                keep_tombstones = (
+                    self.storage.get_file_order(path=data_file.path)
+                    > oldest_unmerged_file_order
                 )
-                merged_files.append(merged_file)
-                files_being_merged = []
-                file_rows = {}
+                for offset, data_file_item in data_file.iter_with_offsets():
+                    rate_limiter.consume(nb_bytes=data_file_item.size)
+                    if not self._is_live(
+                        data_file=data_file,
+                        offset=offset,
+                        item=data_file_item,
+                        keep_tombstones=keep_tombstones,
+                    ):
+                        report.nb_dead_records += 1
+                        report.nb_dropped_tombstones += data_file_item.is_tombstone
+                        continue
+                    report.nb_live_records += 1
+
+                    if merged_file is None:
+                        merged_file = MergedDataFile(
+                            store_path=self.storage.directory,
+                            order_timestamp=order_timestamp,
+                        )
+                        source_positions = {}
+                    merged_file.append(
+                        data_file_item=data_file_item.compressed_with(
+                            self.storage.merge_compression_policy
+                        )
+                    )
+                    if not data_file_item.is_tombstone:
+                        source_positions[data_file_item.key] = (
+                            data_file.path,
+                            offset + data_file_item.value_position,
+                        )
+
+                    if merged_file.size >= self.file_size_threshold:
+                        report.output_bytes += merged_file.size
+                        self._complete_merged_file(
+                            merged_file=merged_file,
+                            source_positions=source_positions,
+                            files=fully_read_files,
+                            position=position,
+                        )
+                        merged_files.append(merged_file)
+                        merged_file = None
+                        fully_read_files = []
+                fully_read_files.append(data_file)
+        except CorruptedRecordError:
+            # Files that were not read to their end are neither discarded nor merged: the merged file being written
+            # (not recorded in the manifest yet) is dropped
+            if merged_file is not None:
+                merged_file.close()
+                merged_file.discard()
+            raise
+
+        if merged_file is not None:
+            report.output_bytes += merged_file.size
+            self._complete_merged_file(
+                merged_file=merged_file,
+                source_positions=source_positions,
+                files=fully_read_files,
+                position=position,
+            )
+            merged_files.append(merged_file)
+        else:
+            # The remaining files only contained records that are not live anymore
+            self._discard_files(files=fully_read_files)
 
         return merged_files
 
@@ -135,7 +352,17 @@ class MergeWorker:
     # ~~~ API
     # ~~~~~~~~~~~~~~~~~~~
 
-    def do_merge(self):
-        """Merges all files from a given store"""
-        mergeable_files = self._get_mergeable_files()
-        self._merge_files(data_files=mergeable_files)
+    def do_merge(self, data_files: list[DataFile] or None = None) -> MergeReport:
+        """Merges the given files (all immutable files of the store by default), and returns statistics about the merge
+        (e.g. reclaimed bytes)"""
+        start = perf_counter()
+        report = MergeReport()
+        if data_files is None:
+            data_files = self._get_mergeable_files()
+        self._merge_files(data_files=data_files, report=report)
+
+        metrics = self.storage.metrics
+        metrics.observe(operation="merge", duration=perf_counter() - start)
+        metrics.increment("merged_files", report.nb_merged_files)
+        metrics.increment("reclaimed_bytes", report.reclaimed_bytes)
+        return report
@@ -0,0 +1,196 @@
+import functools
+import random
+from contextlib import AbstractContextManager
+from time import perf_counter
+from typing import Callable
+
+
+class Counter:
+    """Monotonic counter (e.g. number of bytes written)."""
+
+    def __init__(self):
+        self.value = 0
+
+    def increment(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Histogram:
+    """Distribution of durations (in seconds), counted in fixed buckets.
+
+    Buckets are powers of 2 from 1µs to ~17s, so that the bucket of a value is given by the bit length of its number of
+    microseconds (no search). Quantiles are estimated with the upper bound of the bucket they fall in (i.e. within a
+    factor 2).
+    """
+
+    BUCKETS = tuple(2**i / 1_000_000 for i in range(25))
+
+    def __init__(self):
+        # One more bucket for values above the last bound
+        self.bucket_counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        bucket = min(int(value * 1_000_000).bit_length(), len(self.BUCKETS))
+        self.bucket_counts[bucket] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_quantile(self, fraction: float) -> float:
+        """Returns the upper bound of the bucket holding the `fraction` quantile (0 if nothing was recorded)."""
+        rank = fraction * self.count
+        cumulative_count = 0
+        for bound, bucket_count in zip(self.BUCKETS, self.bucket_counts):
+            cumulative_count += bucket_count
+            if bucket_count and cumulative_count >= rank:
+                return bound
+        return float("inf") if self.bucket_counts[-1] else 0.0
+
+    def to_dict(self) -> dict:
+        bucket_counts, count, total = list(self.bucket_counts), self.count, self.sum
+        return {
+            "count": count,
+            "sum_s": total,
+            "p50_us": self.get_quantile(0.5) * 1_000_000,
+            "p99_us": self.get_quantile(0.99) * 1_000_000,
+            # Number of values lower than each bound (values above the last bound are only in `count`)
+            "buckets": {
+                f"{bound:g}": sum(bucket_counts[: index + 1])
+                for index, bound in enumerate(self.BUCKETS)
+            },
+        }
+
+
+class Metrics:
+    """Counters and latency histograms of a `Storage` and of its merges.
+
+    Recording is cheap enough to be always on: it takes no lock (a lock would cost more than the recording itself).
+    Metrics are thus approximate when updated by several threads at once: in the rare case a thread is preempted in the
+    middle of an update, a concurrent update of the same metric may be lost.
+
+    In addition, a sampling hook can be set to run a fraction of the instrumented operations under a context manager
+    (e.g. a profiler or a tracing span), see `set_sampling_hook`.
+    """
+
+    OPERATIONS = ("append", "write_batch", "get", "multi_get", "delete", "merge")
+    COUNTERS = (
+        "bytes_written",
+        "bytes_read",
+        "file_rotations",
+        "merged_files",
+        "reclaimed_bytes",
+        "failed_merges",
+        "cache_hits",
+        "cache_misses",
+        "cache_evictions",
+    )
+
+    def __init__(self):
+        self.latencies = {operation: Histogram() for operation in self.OPERATIONS}
+        self.counters = {name: Counter() for name in self.COUNTERS}
+        self.sampling_hook: Callable[[str], AbstractContextManager] or None = None
+        self.sampling_rate = 0.0
+        self._randomizer = random.Random()
+
+    def set_sampling_hook(
+        self,
+        hook: Callable[[str], AbstractContextManager] or None,
+        sampling_rate: float = 0.01,
+    ) -> None:
+        """Runs a fraction `sampling_rate` of the instrumented operations within `hook(operation_name)`.
+        Setting the hook to None disables sampling.
+        """
+        if not 0 <= sampling_rate <= 1:
+            raise ValueError("The sampling rate should be between 0 and 1")
+        self.sampling_hook = hook
+        self.sampling_rate = sampling_rate
+
+    def is_sampled(self) -> bool:
+        return self._randomizer.random() < self.sampling_rate
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        self.counters[name].increment(amount=amount)
+
+    def observe(self, operation: str, duration: float) -> None:
+        self.latencies[operation].observe(value=duration)
+
+    def to_dict(self) -> dict:
+        return {
+            "operations": {
+                operation: histogram.to_dict()
+                for operation, histogram in self.latencies.items()
+            },
+            "counters": {
+                name: counter.value for name, counter in self.counters.items()
+            },
+        }
+
+
+def instrumented(operation: str) -> Callable:
+    """Decorates a method of an object holding `Metrics` (in its `metrics` attribute): records the duration of each
+    call in the histogram of `operation`, and runs sampled calls within the sampling hook.
+    """
+
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def instrumented_method(self, *args, **kwargs):
+            metrics = self.metrics
+            sampling_hook = metrics.sampling_hook
+            start = perf_counter()
+            try:
+                if sampling_hook is not None and metrics.is_sampled():
+                    with sampling_hook(operation):
+                        return method(self, *args, **kwargs)
+                return method(self, *args, **kwargs)
+            finally:
+                metrics.latencies[operation].observe(perf_counter() - start)
+
+        return instrumented_method
+
+    return decorator
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    formatted_labels = []
+    for name, value in labels.items():
+        escaped_value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        formatted_labels.append(f'{name}="{escaped_value}"')
+    return "{" + ",".join(formatted_labels) + "}"
+
+
+def render_prometheus(stats: dict, prefix: str = "pytcask") -> str:
+    """Renders the stats returned by `StorageEngine.stats` in the Prometheus text exposition format."""
+    lines = []
+
+    def add_metric(
+        name: str, metric_type: str, samples: list[tuple[str, dict, float]]
+    ) -> None:
+        lines.append(f"# TYPE {prefix}_{name} {metric_type}")
+        for suffix, labels, value in samples:
+            lines.append(f"{prefix}_{name}{suffix}{_format_labels(labels)} {value}")
+
+    histogram_samples = []
+    for operation, histogram in stats["operations"].items():
+        for bound, count in histogram["buckets"].items():
+            histogram_samples.append(
+                ("_bucket", {"operation": operation, "le": bound}, count)
+            )
+        histogram_samples += [
+            ("_bucket", {"operation": operation, "le": "+Inf"}, histogram["count"]),
+            ("_sum", {"operation": operation}, histogram["sum_s"]),
+            ("_count", {"operation": operation}, histogram["count"]),
+        ]
+    add_metric("operation_duration_seconds", "histogram", histogram_samples)
+    for name, value in stats["counters"].items():
+        add_metric(f"{name}_total", "counter", [("", {}, value)])
+    add_metric("key_dir_size", "gauge", [("", {}, stats["key_dir_size"])])
+    add_metric("value_cache_size_bytes", "gauge", [("", {}, stats["value_cache_size"])])
+    add_metric(
+        "dead_bytes",
+        "gauge",
+        [("", {"file": path}, value) for path, value in stats["dead_bytes"].items()],
+    )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,179 @@
+"""Minimal implementation of RESP (REdis Serialization Protocol, version 2), used by the server and its client.
+
+Values are mapped as follows:
+- simple strings <-> str
+- errors <-> RespError
+- integers <-> int
+- bulk strings <-> bytes (null bulk string <-> None)
+- arrays <-> list
+Commands are sent as arrays of bulk strings. Inline commands (space-separated words on one line, as typed in a telnet
+session) are also accepted.
+"""
+
+from src.io_handling.generic_file import ENCODING
+
+LINE_SEPARATOR = b"\r\n"
+
+
+class RespError(Exception):
+    """Error reply (also raised by the parser when the received data does not follow the protocol)."""
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, RespError) and self.args == other.args
+
+
+class _IncompleteValue(Exception):
+    """Raised internally when the buffer does not hold a full value yet."""
+
+
+class RespParser:
+    """Incremental parser: data is fed as it is received, and complete values are returned as soon as available.
+    Several values received at once (pipelining) are all returned by the same call to `get_values`.
+
+    Parsing resumes where it stopped: the elements of an array that is not complete yet are kept aside (and removed
+    from the buffer), so that they are not parsed again when more data is fed. Sizes are bounded (None for no bound):
+    a bulk string longer than `max_bulk_size`, an array of more than `max_array_size` items, or more than
+    `max_buffer_size` bytes waiting for a value to complete (the buffer and the elements kept aside) raise a protocol
+    error, so that a client cannot make the server buffer without limit.
+    """
+
+    DEFAULT_MAX_BULK_SIZE = 512 * 1024 * 1024
+    DEFAULT_MAX_ARRAY_SIZE = 1024 * 1024
+    DEFAULT_MAX_BUFFER_SIZE = 1024 * 1024 * 1024
+    # Header and inline command lines are short: a longer line without separator is not worth waiting for
+    MAX_LINE_SIZE = 64 * 1024
+
+    def __init__(
+        self,
+        max_bulk_size: int or None = DEFAULT_MAX_BULK_SIZE,
+        max_array_size: int or None = DEFAULT_MAX_ARRAY_SIZE,
+        max_buffer_size: int or None = DEFAULT_MAX_BUFFER_SIZE,
+    ):
+        self.max_bulk_size = max_bulk_size
+        self.max_array_size = max_array_size
+        self.max_buffer_size = max_buffer_size
+        self.buffer = bytearray()
+        # Arrays being parsed, outermost first: [number of items left, items parsed so far]
+        self._arrays = []
+        # Number of bytes of the bulk strings held by the arrays being parsed
+        self._arrays_size = 0
+
+    def feed(self, data: bytes) -> None:
+        """Raises a `RespError` if the data waiting for a value to complete exceeds `max_buffer_size`."""
+        self.buffer += data
+        if (
+            self.max_buffer_size is not None
+            and len(self.buffer) + self._arrays_size > self.max_buffer_size
+        ):
+            raise RespError("Protocol error: too big request")
+
+    def get_values(self) -> list:
+        """Returns all the complete values of the buffer (and removes them from it)."""
+        values = []
+        position = 0
+        while position < len(self.buffer):
+            try:
+                value, position = self._parse(position=position)
+            except _IncompleteValue:
+                break
+            if value is _IncompleteValue:
+                continue  # An array has started: its items follow
+            value = self._add_to_arrays(value=value)
+            if value is not _IncompleteValue:
+                values.append(value)
+        del self.buffer[:position]
+        return values
+
+    def _add_to_arrays(self, value):
+        """Adds a parsed value to the innermost array being parsed, and returns the outermost value completed by it
+        (`_IncompleteValue` if the innermost array is not complete yet).
+        """
+        while self._arrays:
+            array = self._arrays[-1]
+            array[1].append(value)
+            if isinstance(value, bytes):
+                self._arrays_size += len(value)
+            array[0] -= 1
+            if array[0] > 0:
+                return _IncompleteValue
+            self._arrays.pop()
+            value = array[1]
+        self._arrays_size = 0
+        return value
+
+    def _read_line(self, position: int) -> tuple[bytes, int]:
+        end = self.buffer.find(LINE_SEPARATOR, position)
+        if end == -1:
+            if len(self.buffer) - position > self.MAX_LINE_SIZE:
+                raise RespError("Protocol error: too big inline request")
+            raise _IncompleteValue()
+        return bytes(self.buffer[position:end]), end + len(LINE_SEPARATOR)
+
+    def _parse(self, position: int) -> tuple[object, int]:
+        """Parses the value starting at `position`, and returns it along with the position of the next value.
+        The start of an array is returned as `_IncompleteValue`: its items are the next values parsed.
+        """
+        line, position = self._read_line(position=position)
+        prefix, payload = line[:1], line[1:]
+        try:
+            if prefix == b"+":
+                return str(payload, encoding=ENCODING), position
+            if prefix == b"-":
+                return RespError(str(payload, encoding=ENCODING)), position
+            if prefix == b":":
+                return int(payload), position
+            if prefix == b"$":
+                size = int(payload)
+                if size < 0:
+                    return None, position
+                if self.max_bulk_size is not None and size > self.max_bulk_size:
+                    raise RespError("Protocol error: invalid bulk length")
+                end = position + size
+                if len(self.buffer) < end + len(LINE_SEPARATOR):
+                    raise _IncompleteValue()
+                return bytes(self.buffer[position:end]), end + len(LINE_SEPARATOR)
+            if prefix == b"*":
+                nb_items = int(payload)
+                if nb_items < 0:
+                    return None, position
+                if self.max_array_size is not None and nb_items > self.max_array_size:
+                    raise RespError("Protocol error: invalid multibulk length")
+                if nb_items == 0:
+                    return [], position
+                self._arrays.append([nb_items, []])
+                return _IncompleteValue, position
+        except ValueError:
+            raise RespError(f"Protocol error: invalid line {line!r}")
+        # Inline command
+        return line.split(), position
+
+
+def encode(value) -> bytes:
+    """Encodes a value (see the mapping of types above)."""
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RespError):
+        return b"-" + bytes(str(value.args[0]), encoding=ENCODING) + LINE_SEPARATOR
+    if isinstance(value, str):
+        return b"+" + bytes(value, encoding=ENCODING) + LINE_SEPARATOR
+    if isinstance(value, bool) or not isinstance(value, (int, bytes, list)):
+        raise TypeError(f"Cannot encode {type(value).__name__} values")
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n" % len(value) + value + LINE_SEPARATOR
+    return b"*%d\r\n" % len(value) + b"".join(encode(item) for item in value)
+
+
+def encode_command(*arguments: str or bytes or int) -> bytes:
+    """Encodes a command as an array of bulk strings."""
+    return encode(
+        [
+            (
+                argument
+                if isinstance(argument, bytes)
+                else bytes(str(argument), encoding=ENCODING)
+            )
+            for argument in arguments
+        ]
+    )
@@ -0,0 +1,299 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+
+from src.async_storage_engine import AsyncStorageEngine
+from src.io_handling.generic_file import ENCODING
+from src.metrics import render_prometheus
+from src.resp import RespError, RespParser, encode
+from src.storage_engine import StorageEngine
+
+
+class _TcpServer(ABC):
+    """asyncio TCP server, handling each connection with `_handle_connection` (implemented by subclasses)."""
+
+    DEFAULT_HOST = "127.0.0.1"
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._server: asyncio.Server or None = None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        """Address the server listens on (useful when started on port 0, i.e. on a random port)."""
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle_connection, host=self.host, port=self.port
+        )
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    @abstractmethod
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        pass
+
+
+class StorageServer(_TcpServer):
+    """asyncio TCP server exposing a storage engine over RESP (the Redis protocol), so that Redis clients (e.g.
+    `redis-cli`) can be used.
+
+    Supported commands: PING, GET, SET (alias PUT), DEL (alias DELETE), MGET, SCAN, QUIT.
+
+    Pipelining: all the commands received at once on a connection are executed before their replies are sent back
+    with a single write. Consecutive SETs of a pipeline are queued together, so that they are committed in one batch.
+    Commands of a connection are always applied in order.
+    """
+
+    DEFAULT_PORT = 6380
+    READ_SIZE = 64 * 1024
+    DEFAULT_SCAN_COUNT = 10
+    # Number of SCAN iterations whose sorted keys are kept at the same time (the least recently used ones are dropped)
+    MAX_SCAN_SNAPSHOTS = 16
+    # Cursors hold the id of the snapshot of their iteration in their high bits, and the position in it in the low bits
+    SCAN_POSITION_BITS = 32
+    # Writes whose reply does not depend on the state of the database (unlike DEL, which replies the number of keys
+    # that existed): they can be queued without waiting for the previous ones to be applied
+    BATCHED_COMMANDS = {b"SET", b"PUT"}
+
+    def __init__(
+        self,
+        database: AsyncStorageEngine,
+        host: str = _TcpServer.DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+    ):
+        super().__init__(host=host, port=port)
+        self.database = database
+        # Name -> (handler, minimum number of arguments, maximum number of arguments or None if unbounded)
+        self.commands = {
+            b"PING": (self._ping, 0, 1),
+            b"GET": (self._get, 1, 1),
+            b"SET": (self._set, 2, 2),
+            b"PUT": (self._set, 2, 2),
+            b"DEL": (self._delete, 1, None),
+            b"DELETE": (self._delete, 1, None),
+            b"MGET": (self._multi_get, 1, None),
+            b"SCAN": (self._scan, 1, 5),
+        }
+        # Sorted keys of the ongoing SCAN iterations, by snapshot id
+        self._scan_snapshots: OrderedDict[int, list[str]] = OrderedDict()
+        self._last_scan_snapshot_id = 0
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        parser = RespParser()
+        try:
+            while True:
+                data = await reader.read(self.READ_SIZE)
+                if not data:
+                    return
+                try:
+                    parser.feed(data)
+                    commands = parser.get_values()
+                except RespError as error:
+                    writer.write(encode(error))
+                    return
+
+                replies, is_quitting = await self._execute_pipeline(commands=commands)
+                writer.write(replies)
+                if is_quitting:
+                    await writer.drain()
+                    return
+                # Waits until the replies are sent if the client does not read them fast enough
+                await writer.drain()
+        except ConnectionError:
+            return
+        finally:
+            writer.close()
+
+    async def _execute_pipeline(self, commands: list) -> tuple[bytes, bool]:
+        """Executes the commands in order, and returns all their encoded replies.
+        Also returns whether the client asked to close the connection (QUIT), in which case the following commands are
+        ignored.
+        """
+        replies = []
+        pending_writes = []
+        is_quitting = False
+        for command in commands:
+            if command == []:
+                continue
+            if not isinstance(command, list) or not all(
+                isinstance(argument, bytes) for argument in command
+            ):
+                replies.append(RespError("ERR commands should be arrays of strings"))
+                continue
+            if command[0].upper() == b"QUIT":
+                replies.append("OK")
+                is_quitting = True
+                break
+            if command[0].upper() in self.BATCHED_COMMANDS:
+                # Started right away: the writes are queued in order, and committed together
+                pending_writes.append(
+                    asyncio.ensure_future(self._execute(command=command))
+                )
+                replies.append(pending_writes[-1])
+                continue
+            # Other commands must see all the writes sent before them
+            await asyncio.gather(*pending_writes)
+            pending_writes = []
+            replies.append(await self._execute(command=command))
+        await asyncio.gather(*pending_writes)
+        encoded_replies = b"".join(
+            encode(reply.result() if isinstance(reply, asyncio.Future) else reply)
+            for reply in replies
+        )
+        return encoded_replies, is_quitting
+
+    async def _execute(self, command: list[bytes]):
+        """Executes one command, and returns its reply (errors are replied to the client, not raised)."""
+        name, arguments = str(command[0], ENCODING, errors="replace"), command[1:]
+        if command[0].upper() not in self.commands:
+            return RespError(f"ERR unknown command '{name}'")
+        handler, min_nb_arguments, max_nb_arguments = self.commands[command[0].upper()]
+        if len(arguments) < min_nb_arguments or (
+            max_nb_arguments is not None and len(arguments) > max_nb_arguments
+        ):
+            return RespError(f"ERR wrong number of arguments for '{name}' command")
+        try:
+            return await handler(*arguments)
+        except RespError as error:
+            return error
+        except Exception as error:
+            return RespError(f"ERR {error}")
+
+    # ~~~~~~~~~~~~~~~~~~~
+    # ~~~ Commands
+    # ~~~~~~~~~~~~~~~~~~~
+
+    @staticmethod
+    def _decode_key(key: bytes) -> str:
+        return str(key, encoding=ENCODING)
+
+    async def _ping(self, message: bytes or None = None) -> str or bytes:
+        return message if message is not None else "PONG"
+
+    async def _get(self, key: bytes) -> bytes or None:
+        return await self.database.get(key=self._decode_key(key))
+
+    async def _set(self, key: bytes, value: bytes) -> str:
+        await self.database.put(key=self._decode_key(key), value=value)
+        return "OK"
+
+    async def _delete(self, *keys: bytes) -> int:
+        """Returns the number of keys that existed (and are now deleted): a key given several times is counted once."""
+        decoded_keys = list(dict.fromkeys(self._decode_key(key) for key in keys))
+        nb_deleted_keys = sum(key in self.database.storage for key in decoded_keys)
+        await asyncio.gather(*(self.database.delete(key=key) for key in decoded_keys))
+        return nb_deleted_keys
+
+    async def _multi_get(self, *keys: bytes) -> list[bytes or None]:
+        decoded_keys = [self._decode_key(key) for key in keys]
+        values = await self.database.multi_get(keys=decoded_keys)
+        return [values[key] for key in decoded_keys]
+
+    async def _scan(self, cursor: bytes, *options: bytes) -> list:
+        """SCAN cursor [MATCH pattern] [COUNT count]: iterates over the keys, in lexicographic order.
+
+        The keys are sorted once per iteration (when it starts with cursor 0): the cursor holds the id of that snapshot
+        of the keys and the position of the next key in it, so that each page only costs `count` keys. As with Redis,
+        keys added or deleted during the iteration may or may not be returned. If the snapshot has been dropped (see
+        `MAX_SCAN_SNAPSHOTS`), the iteration continues from the same position in a new one.
+        """
+        if len(options) % 2:
+            raise RespError("ERR syntax error")
+        options = {name.upper(): value for name, value in zip(*[iter(options)] * 2)}
+        pattern = options.pop(b"MATCH", None)
+        try:
+            cursor = int(cursor)
+            count = int(options.pop(b"COUNT", self.DEFAULT_SCAN_COUNT))
+        except ValueError:
+            raise RespError("ERR value is not an integer or out of range")
+        if options or count < 1 or cursor < 0:
+            raise RespError("ERR syntax error")
+
+        snapshot_id = cursor >> self.SCAN_POSITION_BITS
+        position = cursor & ((1 << self.SCAN_POSITION_BITS) - 1)
+        keys = self._scan_snapshots.get(snapshot_id)
+        if keys is None:
+            snapshot_id, keys = await self._take_scan_snapshot()
+        else:
+            self._scan_snapshots.move_to_end(snapshot_id)
+        next_position = position + count
+        scanned_keys = keys[position:next_position]
+        if pattern is not None:
+            pattern = self._decode_key(pattern)
+            scanned_keys = [key for key in scanned_keys if fnmatchcase(key, pattern)]
+        if next_position < len(keys):
+            next_cursor = (snapshot_id << self.SCAN_POSITION_BITS) | next_position
+        else:
+            next_cursor = 0
+            self._scan_snapshots.pop(snapshot_id, None)
+        return [
+            bytes(str(next_cursor), encoding=ENCODING),
+            [bytes(key, encoding=ENCODING) for key in scanned_keys],
+        ]
+
+    async def _take_scan_snapshot(self) -> tuple[int, list[str]]:
+        """Sorts the current keys for a new SCAN iteration, and returns the id of that snapshot along with the keys."""
+        keys = await self.database.sorted_keys()
+        self._last_scan_snapshot_id += 1
+        self._scan_snapshots[self._last_scan_snapshot_id] = keys
+        if len(self._scan_snapshots) > self.MAX_SCAN_SNAPSHOTS:
+            self._scan_snapshots.popitem(last=False)
+        return self._last_scan_snapshot_id, keys
+
+
+class MetricsServer(_TcpServer):
+    """Minimal HTTP server exposing the stats of a storage engine to Prometheus (`GET /metrics`)."""
+
+    DEFAULT_PORT = 9180
+
+    def __init__(
+        self,
+        storage_engine: StorageEngine,
+        host: str = _TcpServer.DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+    ):
+        super().__init__(host=host, port=port)
+        self.storage_engine = storage_engine
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request_line = await reader.readline()
+            # The headers of the request are not used
+            while (await reader.readline()).strip():
+                pass
+            method, target, *_ = request_line.split() + [b"", b""]
+            if method == b"GET" and target.split(b"?")[0] == b"/metrics":
+                status = "200 OK"
+                body = bytes(
+                    render_prometheus(stats=self.storage_engine.stats()),
+                    encoding=ENCODING,
+                )
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+            headers = (
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n"
+            )
+            writer.write(bytes(headers, encoding=ENCODING) + body)
+            await writer.drain()
+        except ConnectionError:
+            return
+        finally:
+            writer.close()
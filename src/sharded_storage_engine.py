@@ -0,0 +1,260 @@
+import multiprocessing
+import os
+import shutil
+import threading
+import zlib
+from collections import defaultdict
+from typing import Callable
+
+from src.io_handling.generic_file import ENCODING
+from src.item import Item
+from src.storage_engine import StorageEngine
+
+
+def _run_shard_process(connection, storage_engine_kwargs: dict) -> None:
+    """Serves the calls sent through the connection to a `StorageEngine`, until it is closed."""
+    storage_engine = StorageEngine(**storage_engine_kwargs)
+    connection.send((True, None))
+    while True:
+        method, args = connection.recv()
+        try:
+            result = _call_storage_engine(storage_engine, method, *args)
+        except Exception as error:
+            connection.send((False, error))
+        else:
+            connection.send((True, result))
+        if method == "close":
+            connection.close()
+            return
+
+
+def _call_storage_engine(storage_engine: StorageEngine, method: str, *args):
+    """Calls `close` and `stats` on the engine itself, and the other methods (get, append, ...) on its storage."""
+    if method in ("close", "stats"):
+        return getattr(storage_engine, method)(*args)
+    return getattr(storage_engine.storage, method)(*args)
+
+
+class _LocalShard:
+    """A shard whose `StorageEngine` runs in the current process."""
+
+    def __init__(self, storage_engine_kwargs: dict):
+        self.storage_engine = StorageEngine(**storage_engine_kwargs)
+
+    def wait_for_boot(self) -> None:
+        pass
+
+    def submit(self, method: str, *args) -> Callable[[], object]:
+        result = _call_storage_engine(self.storage_engine, method, *args)
+        return lambda: result
+
+
+class _ProcessShard:
+    """A shard whose `StorageEngine` runs in a dedicated worker process, and is called through a pipe.
+
+    Worker processes are spawned rather than forked, so that they do not inherit the threads (and locks) of the
+    current process.
+    """
+
+    def __init__(self, storage_engine_kwargs: dict):
+        context = multiprocessing.get_context("spawn")
+        self._connection, child_connection = context.Pipe()
+        self._process = context.Process(
+            target=_run_shard_process,
+            args=(child_connection, storage_engine_kwargs),
+            daemon=True,
+        )
+        self._process.start()
+        child_connection.close()
+        # Only one call at a time goes through the pipe (the boot counts as the first one)
+        self._lock = threading.Lock()
+        self._lock.acquire()
+
+    def wait_for_boot(self) -> None:
+        self._wait_for_result()
+
+    def _wait_for_result(self):
+        try:
+            is_success, result = self._connection.recv()
+        finally:
+            self._lock.release()
+        if not is_success:
+            raise result
+        return result
+
+    def submit(self, method: str, *args) -> Callable[[], object]:
+        """Sends the call to the worker process, and returns a function waiting for its result.
+        No other call can be submitted to the shard until that result is received.
+        """
+        self._lock.acquire()
+        try:
+            self._connection.send((method, args))
+        except BaseException:
+            self._lock.release()
+            raise
+        return self._wait_for_result
+
+    def join(self) -> None:
+        self._process.join()
+        self._connection.close()
+
+
+class ShardedStorageEngine:
+    """Spreads the keys over `nb_shards` independent `StorageEngine`s (shards), each in its own sub-directory with its
+    own active file, key_dir, merges and boot. Keys are routed to their shard by a stable hash (the CRC32 of the key),
+    so the number of shards of a directory cannot change once created.
+
+    With `use_processes`, each shard runs in a dedicated worker process: writes to different shards are applied in
+    parallel (instead of being serialized by the GIL), and calls touching several shards (`multi_get`, `write_batch`,
+    ...) are sent to all of them before waiting for their results. The other arguments are passed to each
+    `StorageEngine`.
+
+    Usage:
+        database = ShardedStorageEngine(directory="./datafiles/sharded", nb_shards=4, use_processes=True)
+        database.append(key="key", value=b"value")
+    """
+
+    DEFAULT_DIRECTORY = "./datafiles/sharded"
+    DEFAULT_NB_SHARDS = 4
+    SHARD_DIRECTORY_PREFIX = "shard-"
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_DIRECTORY,
+        nb_shards: int = DEFAULT_NB_SHARDS,
+        use_processes: bool = False,
+        **storage_engine_kwargs,
+    ):
+        self.directory = directory
+        self.nb_shards = nb_shards
+        self._check_nb_shards()
+        shard_class = _ProcessShard if use_processes else _LocalShard
+        self.shards = [
+            shard_class(
+                storage_engine_kwargs={
+                    **storage_engine_kwargs,
+                    "directory": self._get_shard_directory(shard_index),
+                }
+            )
+            for shard_index in range(nb_shards)
+        ]
+        # Worker processes boot in parallel
+        for shard in self.shards:
+            shard.wait_for_boot()
+
+    def _get_shard_directory(self, shard_index: int) -> str:
+        return f"{self.directory}/{self.SHARD_DIRECTORY_PREFIX}{shard_index}"
+
+    def _check_nb_shards(self) -> None:
+        if not os.path.isdir(self.directory):
+            return
+        nb_existing_shards = len(
+            [
+                name
+                for name in os.listdir(self.directory)
+                if name.startswith(self.SHARD_DIRECTORY_PREFIX)
+            ]
+        )
+        if nb_existing_shards and nb_existing_shards != self.nb_shards:
+            raise ValueError(
+                f"{self.directory} holds {nb_existing_shards} shards, cannot open it with {self.nb_shards} shards"
+            )
+
+    def get_shard_index(self, key: Item.Key) -> int:
+        return zlib.crc32(key.encode(ENCODING)) % self.nb_shards
+
+    def _call(self, key: Item.Key, method: str, *args):
+        return self.shards[self.get_shard_index(key)].submit(method, *args)()
+
+    def _call_all(self, args_per_shard: dict[int, tuple], method: str) -> dict:
+        """Submits the call to all the shards first (in the order of the shards), then waits for their results.
+        If some shards fail, the first error is raised once all the results have been received.
+        """
+        waiters = {
+            shard_index: self.shards[shard_index].submit(method, *args)
+            for shard_index, args in sorted(args_per_shard.items())
+        }
+        results = {}
+        first_error = None
+        for shard_index, wait in waiters.items():
+            try:
+                results[shard_index] = wait()
+            except Exception as error:
+                first_error = first_error or error
+        if first_error is not None:
+            raise first_error
+        return results
+
+    # ~~~~~~~~~~~~~~~~~~~
+    # ~~~ API
+    # ~~~~~~~~~~~~~~~~~~~
+
+    def get(self, key: Item.Key) -> Item.Value or None:
+        return self._call(key, "get", key)
+
+    def append(self, key: Item.Key, value: Item.Value) -> None:
+        self._call(key, "append", key, value)
+
+    def delete(self, key: Item.Key) -> None:
+        self._call(key, "delete", key)
+
+    def multi_get(self, keys: list[Item.Key]) -> dict[Item.Key, Item.Value or None]:
+        keys_per_shard = defaultdict(list)
+        for key in keys:
+            keys_per_shard[self.get_shard_index(key)].append(key)
+        values_per_shard = self._call_all(
+            args_per_shard={
+                shard_index: (shard_keys,)
+                for shard_index, shard_keys in keys_per_shard.items()
+            },
+            method="multi_get",
+        )
+        values = {}
+        for shard_values in values_per_shard.values():
+            values.update(shard_values)
+        return {key: values[key] for key in keys}
+
+    def write_batch(self, items: list[tuple[Item.Key, Item.Value or None]]) -> None:
+        """Writes the batch with one `Storage.write_batch` per shard: the batch is atomic within each shard, but not
+        across shards.
+        """
+        items_per_shard = defaultdict(list)
+        for key, value in items:
+            items_per_shard[self.get_shard_index(key)].append((key, value))
+        self._call_all(
+            args_per_shard={
+                shard_index: (shard_items,)
+                for shard_index, shard_items in items_per_shard.items()
+            },
+            method="write_batch",
+        )
+
+    def keys(self) -> list[Item.Key]:
+        keys_per_shard = self._call_all(
+            args_per_shard={shard_index: () for shard_index in range(self.nb_shards)},
+            method="keys",
+        )
+        return [key for shard_keys in keys_per_shard.values() for key in shard_keys]
+
+    def stats(self) -> list[dict]:
+        """Returns the stats of each shard (see `StorageEngine.stats`), in the order of the shards."""
+        stats_per_shard = self._call_all(
+            args_per_shard={shard_index: () for shard_index in range(self.nb_shards)},
+            method="stats",
+        )
+        return [stats_per_shard[shard_index] for shard_index in range(self.nb_shards)]
+
+    def close(self) -> None:
+        self._call_all(
+            args_per_shard={shard_index: () for shard_index in range(self.nb_shards)},
+            method="close",
+        )
+        for shard in self.shards:
+            if isinstance(shard, _ProcessShard):
+                shard.join()
+
+    def clear(self) -> None:
+        """Deletes the directories of all the shards (once closed).
+        The main purpose of this method is to be used to clean up after running tests.
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -1,64 +1,531 @@
 import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from time import time
+from typing import Iterator
 
+from src.io_handling.compression import CompressionPolicy
 from src.io_handling.data_file import (
     ActiveDataFile,
+    BatchMarker,
+    CorruptedRecordError,
     DataFileItem,
     DataFile,
 )
-from src.io_handling.generic_file import FileType, File
+from src.io_handling.durability import DurabilityPolicy, GroupCommitter
+from src.io_handling.file_handle_pool import FileHandlePool
+from src.io_handling.generic_file import ENCODING, FileType, File
 from src.io_handling.hint_file import HintFile
+from src.io_handling.key_dir_snapshot import KeyDirSnapshot
+from src.io_handling.manifest import Manifest
 from src.item import Item, Tombstone
-from src.key_dir import KeyDir
+from src.key_dir import KeyDir, CompactKeyDir
+from src.metrics import Metrics, instrumented
+from src.value_cache import ValueCache
+
+
+def _build_partial_index(
+    file_path: str, has_hint: bool
+) -> tuple[str, KeyDir.PartialIndex or None]:
+    """Builds the partial index of a data file: from its hint file if it has a complete one, otherwise by parsing the
+    data file itself (keys and values). The partial index is None if the data file does not exist (see `Manifest`).
+    Defined at module level so that it can be run in worker processes.
+    """
+    if has_hint:
+        hint_file = HintFile(
+            path=HintFile.get_path(data_file_path=file_path), read_only=True
+        )
+        try:
+            partial_index = hint_file.build_partial_index()
+        except FileNotFoundError:
+            partial_index = None
+        if partial_index is not None:
+            return file_path, partial_index
+
+    data_file = DataFile(path=file_path)
+    try:
+        partial_index = data_file.build_partial_index()
+    except FileNotFoundError:
+        partial_index = None
+    return data_file.path, partial_index
+
+
+def _write_hint_file(
+    data_file_path: str, partial_index: KeyDir.PartialIndex, manifest: Manifest
+) -> None:
+    """Writes the hint file of a rotated data file, and records it in the manifest. If the data file has been merged
+    (and thus deleted) in the meantime, the hint file is deleted as well.
+    """
+    hint_file = HintFile(path=HintFile.get_path(data_file_path=data_file_path))
+    hint_file.write_partial_index(partial_index=partial_index)
+    hint_file.close()
+    if not os.path.exists(data_file_path):
+        try:
+            hint_file.discard()
+        except FileNotFoundError:
+            pass
+        return
+    manifest.add_hint(path=data_file_path)
 
 
 class Storage:
-    def __init__(self, directory: str, max_file_size: int):
+    # Values less than this number of bytes apart are fetched with a single read by `multi_get`
+    DEFAULT_MAX_READ_GAP = 4096
+
+    def __init__(
+        self,
+        directory: str,
+        max_file_size: int,
+        max_open_files: int = FileHandlePool.DEFAULT_MAX_OPEN_FILES,
+        use_mmap: bool = False,
+        max_read_gap: int = DEFAULT_MAX_READ_GAP,
+        durability_policy: DurabilityPolicy = DurabilityPolicy.FLUSH_PER_WRITE,
+        group_commit_interval_ms: float = GroupCommitter.DEFAULT_INTERVAL_MS,
+        compact_key_dir: bool = False,
+        rebuild_workers: int = 1,
+        verify_checksums: bool = False,
+        compression_policy: CompressionPolicy or None = None,
+        merge_compression_policy: CompressionPolicy or None = None,
+        value_cache_size: int = 0,
+    ):
         self.directory = directory
-        self.active_data_file = ActiveDataFile(path=f"{self.directory}/active.data")
+        self.durability_policy = durability_policy
+        self.group_commit_interval_ms = group_commit_interval_ms
+        # Immutable data files of the store, in order (the directory is never listed)
+        self.manifest = Manifest.load(directory=directory)
+        self.active_data_file = self._open_active_file(
+            path=f"{self.directory}/active.data"
+        )
         self.max_file_size = max_file_size
-        self.key_dir = KeyDir()
+        # Serializes writers: appends to the active file, rotations and key_dir updates
+        self._write_lock = threading.Lock()
+        # Incremented by every rotation: the active file is re-created at the same path, so entries pointing at it are
+        # only comparable within the same generation of the file (see `_is_entry_still_valid`)
+        self._nb_rotations = 0
+        # The compact key_dir trades some CPU on lookups for a much smaller memory footprint per key
+        self.key_dir = CompactKeyDir() if compact_key_dir else KeyDir()
+        self.file_handle_pool = FileHandlePool(max_open_files=max_open_files)
+        # When enabled, immutable (rotated or merged) files are read through memory mappings
+        self.use_mmap = use_mmap
+        self.max_read_gap = max_read_gap
+        # Number of processes parsing files in parallel when rebuilding the index
+        self.rebuild_workers = rebuild_workers
+        # When enabled, reads verify the checksum of the records holding the values
+        self.verify_checksums = verify_checksums
+        # How values are compressed when written, and when copied by merges (defaults to the same as writes)
+        self.compression_policy = compression_policy
+        self.merge_compression_policy = (
+            merge_compression_policy
+            if merge_compression_policy is not None
+            else compression_policy
+        )
+        # Number of bytes of each data file that are not live anymore (overwritten or deleted records, tombstones):
+        # used to decide which files are worth merging
+        self.dead_bytes: dict[str, int] = defaultdict(int)
+        self.metrics = Metrics()
+        # When set (in bytes), the most recently read values are kept in memory (see `ValueCache`)
+        self.value_cache = (
+            ValueCache(max_size=value_cache_size, metrics=self.metrics)
+            if value_cache_size > 0
+            else None
+        )
+        # Entries of the records appended to the active file: they are written to its hint file once it is rotated, in
+        # the background (so that the index of rotated files can be rebuilt without reading their values)
+        self._active_file_index: KeyDir.PartialIndex = {}
+        # Started by the first rotation, and stopped once its hint files are written (see `_wait_for_hint_files`)
+        self._hint_file_writer: ThreadPoolExecutor or None = None
         self.rebuild_index()
 
-    def _generate_new_active_file(self) -> None:
+    def _get_new_immutable_file_path(self) -> str:
         # Using time in nanoseconds to avoid filename collisions
         timestamp_in_ns = int(time() * 1_000_000)
-        immutable_file_path = f"{self.directory}/{timestamp_in_ns}.data"
+        return f"{self.directory}/{timestamp_in_ns}.data"
+
+    def _create_active_file(self, path: str) -> ActiveDataFile:
+        return ActiveDataFile(
+            path=path,
+            durability_policy=self.durability_policy,
+            group_commit_interval_ms=self.group_commit_interval_ms,
+        )
+
+    def _open_active_file(self, path: str) -> ActiveDataFile:
+        """An active file is never re-opened: if the store was stopped (or crashed) while a file was active, that file
+        becomes immutable and a new active file is created.
+        A crash may have left a partially written record at the end of that file: the file is truncated right before
+        the first corrupted or incomplete record (or batch). A file written in a format this version of the store does
+        not know is left untouched (`UnsupportedFormatError` is raised).
+        """
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            previous_active_file = DataFile(path=path)
+            previous_active_file.close()
+            valid_size = previous_active_file.get_valid_size()
+            if valid_size < os.path.getsize(path):
+                os.truncate(path, valid_size)
+            if valid_size > 0:
+                immutable_file_path = self._get_new_immutable_file_path()
+                self.manifest.add(path=immutable_file_path, size=valid_size)
+                os.rename(src=path, dst=immutable_file_path)
+        return self._create_active_file(path=path)
+
+    def _generate_new_active_file(self) -> None:
+        immutable_file_path = self._get_new_immutable_file_path()
+        self.manifest.add(path=immutable_file_path, size=self.active_data_file.size)
         self.active_data_file.convert_to_immutable(new_path=immutable_file_path)
+        # The pooled descriptor (if any) now points to the renamed file, not to the new active one
+        self.file_handle_pool.invalidate(path=self.active_data_file.path)
+        # Constant time: the key_dir only re-assigns the id of the active file to its new path
         self.key_dir.update_file_path(
             previous_path=self.active_data_file.path, new_path=immutable_file_path
         )
-        self.active_data_file = ActiveDataFile(self.active_data_file.path)
+        self.dead_bytes[immutable_file_path] = self.dead_bytes.pop(
+            self.active_data_file.path, 0
+        )
+        if self._hint_file_writer is None:
+            self._hint_file_writer = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="pytcask-hint-writer"
+            )
+        self._hint_file_writer.submit(
+            _write_hint_file,
+            data_file_path=immutable_file_path,
+            partial_index=self._active_file_index,
+            manifest=self.manifest,
+        )
+        self._active_file_index = {}
+        self.active_data_file = self._create_active_file(
+            path=self.active_data_file.path
+        )
+        # Only counted once the new active file exists: a reader that sees the same count before and after reading
+        # from the active file has not read from a file created by this rotation
+        self._nb_rotations += 1
+        self.metrics.increment("file_rotations")
 
-    def _append_to_active_file(self, data_file_item: DataFileItem) -> File.Offset:
-        new_line_size = data_file_item.size
-        expected_file_size = self.active_data_file.size + new_line_size
+    def _wait_for_hint_files(self) -> None:
+        """Waits until the hint files of all the files rotated so far have been written, and stops the writer thread
+        (the next rotation starts a new one).
+        """
+        with self._write_lock:
+            hint_file_writer, self._hint_file_writer = self._hint_file_writer, None
+        if hint_file_writer is not None:
+            hint_file_writer.shutdown(wait=True)
+
+    def _rotate_active_file_if_too_big(self, nb_bytes_to_append: int) -> None:
+        expected_file_size = self.active_data_file.size + nb_bytes_to_append
         is_active_file_too_big = expected_file_size > self.max_file_size
 
         if is_active_file_too_big:
             self._generate_new_active_file()
 
+    def _append_to_active_file(self, data_file_item: DataFileItem) -> File.Offset:
+        self._rotate_active_file_if_too_big(nb_bytes_to_append=data_file_item.size)
+
         value_position_offset = self.active_data_file.append(
             data_file_item=data_file_item
         )
+        self.metrics.increment("bytes_written", data_file_item.size)
         return value_position_offset
 
-    def _get_index_rebuild_files(self) -> tuple[list[DataFile], list[HintFile]]:
-        hint_files = []
-        unmerged_data_files = []
-        for filename in os.listdir(self.directory):
-            file_path = f"{self.directory}/{filename}"
-            file = DataFile(path=file_path)
-            if file.type == FileType.HINT:
-                hint_files.append(HintFile(path=file_path, read_only=True))
-            if file.type == FileType.UNMERGED_DATA:
-                unmerged_data_files.append(file)
-        return unmerged_data_files, hint_files
+    @staticmethod
+    def get_record_size(key: Item.Key, value_size: int) -> int:
+        """Returns the size of the record storing a value of `value_size` bytes for `key`."""
+        encoded_key = bytes(key, encoding=ENCODING)
+        return DataFileItem.METADATA_SIZE + len(encoded_key) + value_size
+
+    def _mark_previous_record_as_dead(self, key: Item.Key) -> None:
+        """Counts the record the key_dir points at for `key` (if any) as dead: it is about to be overwritten or
+        deleted. Must be called with the write lock held, before updating the key_dir.
+        """
+        key_dir_entry = self.key_dir.get(key)
+        if key_dir_entry is not None:
+            self.dead_bytes[key_dir_entry.file_path] += self.get_record_size(
+                key=key, value_size=key_dir_entry.value_size
+            )
+
+    def _compute_dead_bytes(self) -> None:
+        """Computes the number of dead bytes of each data file from the key_dir: all bytes of a file that the key_dir
+        does not point at are dead.
+        """
+        live_bytes = defaultdict(int)
+        for key, key_dir_entry in self.key_dir:
+            live_bytes[key_dir_entry.file_path] += self.get_record_size(
+                key=key, value_size=key_dir_entry.value_size
+            )
+        self.dead_bytes = defaultdict(int)
+        for file_path in self._get_data_file_paths():
+            self.dead_bytes[file_path] = self.get_file_size(
+                path=file_path
+            ) - live_bytes.get(file_path, 0)
+
+    def _is_entry_still_valid(
+        self, key: Item.Key, key_dir_entry: KeyDir.KeyDirEntry, nb_rotations: int
+    ) -> bool:
+        """Checks, after reading a value, that the key_dir entry used to read it has not changed in the meantime.
+
+        Concurrency model: any number of readers, one writer at a time (`_write_lock`) and a background merge. Readers
+        take no lock: they look up the key_dir, read the value, and then check that the entry is still the same. If it
+        is not, the value may have been read from a file that was renamed (the active file, by a rotation), replaced at
+        the same path (the new active file) or deleted (by a merge) in the meantime: the read has to be retried.
+        As long as the entry has not changed, the value read is the one it points at: files are never modified in place,
+        and a file deleted while being read remains readable through the descriptor pinned by the reader.
+        Entries pointing at the active file are the exception: each rotation re-creates the file at the same path, and
+        a later generation of it may hold the same entry. The read is thus also retried if the active file was rotated
+        since the entry was looked up (`nb_rotations` is the number of rotations seen before the lookup).
+        """
+        if self.key_dir.get(key) != key_dir_entry:
+            return False
+        return (
+            key_dir_entry.file_path != self.active_data_file.path
+            or self._nb_rotations == nb_rotations
+        )
+
+    def _cache_value(
+        self,
+        key: Item.Key,
+        value: Item.Value,
+        key_dir_entry: KeyDir.KeyDirEntry,
+        nb_rotations: int,
+    ) -> None:
+        """Caches a value read from disk, unless it has been overwritten (or deleted) since its entry was looked up.
+        Merges only move records without changing their value: cached values remain valid (and are not touched).
+        """
+        if self.value_cache is not None:
+            self.value_cache.put_if(
+                key=key,
+                value=value,
+                condition=lambda: self._is_entry_still_valid(
+                    key=key, key_dir_entry=key_dir_entry, nb_rotations=nb_rotations
+                ),
+            )
+
+    def _update_cached_value(self, key: Item.Key, value: Item.Value or None) -> None:
+        """Write-through update of the value cache. Must be called with the write lock held, after the key_dir update,
+        so that cached values are updated in the order of the writes.
+        """
+        if self.value_cache is not None:
+            self.value_cache.update(key=key, value=value)
+
+    def _read(self, path: str, start: File.Offset, size: int) -> bytes:
+        self.metrics.increment("bytes_read", size)
+        if path == self.active_data_file.path:
+            self.active_data_file.flush_pending_writes()
+        # The active file keeps growing, so it cannot be mapped
+        if self.use_mmap and path != self.active_data_file.path:
+            return self.file_handle_pool.read_mapped(path=path, start=start, size=size)
+        return self.file_handle_pool.read(path=path, start=start, size=size)
+
+    @staticmethod
+    def _get_record_start(
+        key: Item.Key, key_dir_entry: KeyDir.KeyDirEntry
+    ) -> File.Offset:
+        """Returns the position of the record holding the value.
+        Whole records are read (not only values): the header tells how the value is encoded, and holds its checksum.
+        """
+        encoded_key_size = len(bytes(key, encoding=ENCODING))
+        return (
+            key_dir_entry.value_position - encoded_key_size - DataFileItem.METADATA_SIZE
+        )
+
+    def _decode_value(
+        self,
+        data: bytes,
+        key: Item.Key,
+        key_dir_entry: KeyDir.KeyDirEntry,
+        data_start: File.Offset,
+    ) -> Item.Value:
+        """Extracts the (decompressed) value of the entry from `data`, read from position `data_start` of its file.
+        Raises a `CorruptedRecordError` if checksums are verified and the record is corrupted.
+        """
+        record_start = self._get_record_start(key=key, key_dir_entry=key_dir_entry)
+        return DataFileItem.decode_value(
+            data,
+            offset=record_start - data_start,
+            verify_checksum=self.verify_checksums,
+        )
+
+    def _coalesce_reads(
+        self, entries: list[tuple[Item.Key, KeyDir.KeyDirEntry]]
+    ) -> Iterator[tuple[File.Offset, File.Offset, list]]:
+        """Groups entries (sorted by value position) into ranges of bytes to read at once.
+        Yields tuples (start, end, entries of the range).
+        """
+        start, end, range_entries = None, None, []
+        for key, key_dir_entry in entries:
+            read_start = self._get_record_start(key=key, key_dir_entry=key_dir_entry)
+            read_end = key_dir_entry.value_position + key_dir_entry.value_size
+            if range_entries and read_start - end > self.max_read_gap:
+                yield start, end, range_entries
+                range_entries = []
+            if not range_entries:
+                start, end = read_start, read_end
+            end = max(end, read_end)
+            range_entries.append((key, key_dir_entry))
+        if range_entries:
+            yield start, end, range_entries
+
+    def _get_data_file_paths(self) -> list[str]:
+        """Returns the paths of all the data files, from oldest to most recent, so that the most recent record of each
+        key wins when they are read in that order (see `Manifest.get_order`).
+        """
+        return [*self.manifest.get_paths(), self.active_data_file.path]
+
+    def get_file_size(self, path: str) -> int:
+        """Returns the size of a data file (as recorded in the manifest for immutable files)."""
+        if path == self.active_data_file.path:
+            # The active file may be closed (or truncated) behind the store's back: its size is read from disk
+            return os.path.getsize(path)
+        return self.manifest.entries[path].size
+
+    def get_file_order(self, path: str) -> tuple[float, int]:
+        """Returns the position of a data file in the history of the store (see `Manifest.get_order`)."""
+        return self.manifest.get_order(path=path)
+
+    def _has_hint_file(self, path: str) -> bool:
+        entry = self.manifest.entries.get(path)
+        return entry is not None and entry.has_hint
+
+    def _skip_missing_files(
+        self, partial_indexes: Iterator[tuple[str, KeyDir.PartialIndex or None]]
+    ) -> Iterator[tuple[str, KeyDir.PartialIndex]]:
+        """Skips (and removes from the manifest) the files that do not exist: the store crashed after recording them
+        but before renaming them into the store.
+        """
+        missing_file_paths = []
+        for file_path, partial_index in partial_indexes:
+            if partial_index is None:
+                missing_file_paths.append(file_path)
+                continue
+            yield file_path, partial_index
+        self.manifest.remove(paths=missing_file_paths)
+
+    @contextmanager
+    def lock_writes(self) -> Iterator[None]:
+        """Holds the write lock while the block runs: no write, rotation or checkpoint happens meanwhile. Used by merges
+        to update the key_dir and to remove merged files.
+        """
+        with self._write_lock:
+            yield
+
+    def get_immutable_file_paths(self) -> list[str]:
+        """Returns the paths of all data files except the active one.
+        The manifest is read with the write lock held: a file being rotated is only listed once the key_dir points at
+        its new path (otherwise, a merge would consider all its records as dead).
+        """
+        with self._write_lock:
+            return [
+                file_path
+                for file_path in self._get_data_file_paths()
+                if file_path != self.active_data_file.path
+            ]
+
+    def _locate_snapshot_files(self, snapshot: KeyDirSnapshot) -> dict or None:
+        """Returns the current path of each file covered by the snapshot (None if one of them is missing).
+
+        Files are identified by their sequence number in the manifest, which is never given twice. Immutable files are
+        never renamed: they must still be listed at the same path, with the same sequence number. The file that was
+        active at checkpoint time has been renamed since then if it became immutable: it is the file listed with the
+        sequence number it was expected to get. If that number has been given but is not listed anymore, the file has
+        been rotated then removed (merged).
+        """
+        paths_per_sequence = {
+            entry.sequence: path for path, entry in self.manifest.entries.items()
+        }
+        current_paths = {}
+        for covered_file in snapshot.covered_files:
+            if not covered_file.was_active:
+                entry = self.manifest.entries.get(covered_file.path)
+                if entry is None or entry.sequence != covered_file.sequence:
+                    return None
+                current_path = covered_file.path
+            elif covered_file.sequence in paths_per_sequence:
+                current_path = paths_per_sequence[covered_file.sequence]
+                if File.get_type(current_path) == FileType.MERGED_DATA:
+                    return None
+            elif covered_file.sequence <= self.manifest.get_last_sequence():
+                return None
+            else:
+                current_path = self.active_data_file.path
+            if (
+                not os.path.exists(current_path)
+                or self.get_file_size(path=current_path) < covered_file.covered_size
+            ):
+                return None
+            current_paths[covered_file.path] = current_path
+        return current_paths
+
+    def _rebuild_index_from_snapshot(self) -> bool:
+        """Loads the key_dir from the last snapshot, then replays the records written after the checkpoint.
+
+        Returns False (leaving the key_dir untouched) if there is no usable snapshot, i.e. if there is none, or if some
+        files it covers have been deleted or if a merged file has been created since the checkpoint.
+        """
+        snapshot = KeyDirSnapshot.read(
+            path=f"{self.directory}/{KeyDirSnapshot.FILENAME}"
+        )
+        if snapshot is None:
+            return False
+        current_paths = self._locate_snapshot_files(snapshot=snapshot)
+        if current_paths is None:
+            return False
+        new_file_paths = set(self._get_data_file_paths()) - set(current_paths.values())
+        if any(File.get_type(path) == FileType.MERGED_DATA for path in new_file_paths):
+            return False
+
+        self.key_dir.rebuild(partial_indexes=[])
+        for covered_file in snapshot.covered_files:
+            self.key_dir.update_many(
+                file_path=current_paths[covered_file.path],
+                entries=snapshot.entries_per_file[covered_file.path],
+            )
+
+        # Replay records appended to covered files after the checkpoint, then files created after the checkpoint
+        for covered_file in snapshot.covered_files:
+            current_path = current_paths[covered_file.path]
+            if self.get_file_size(path=current_path) == covered_file.covered_size:
+                continue
+            data_file = DataFile(path=current_path)
+            data_file.close()
+            self.key_dir.merge_partial_index(
+                file_path=data_file.path,
+                partial_index=data_file.build_partial_index(
+                    start=covered_file.covered_size
+                ),
+            )
+        for file_path, partial_index in self._skip_missing_files(
+            _build_partial_index(
+                file_path=file_path, has_hint=self._has_hint_file(path=file_path)
+            )
+            for file_path in sorted(new_file_paths, key=self.get_file_order)
+        ):
+            self.key_dir.merge_partial_index(
+                file_path=file_path, partial_index=partial_index
+            )
+        return True
+
+    def _rebuild_index_from_files(self) -> None:
+        file_paths = self._get_data_file_paths()
+        has_hints = [self._has_hint_file(path=file_path) for file_path in file_paths]
+
+        if self.rebuild_workers > 1 and len(file_paths) > 1:
+            with ProcessPoolExecutor(max_workers=self.rebuild_workers) as executor:
+                # Partial indexes are merged as soon as they are available, in the order of the files
+                self.key_dir.rebuild(
+                    partial_indexes=self._skip_missing_files(
+                        executor.map(_build_partial_index, file_paths, has_hints)
+                    )
+                )
+        else:
+            self.key_dir.rebuild(
+                partial_indexes=self._skip_missing_files(
+                    map(_build_partial_index, file_paths, has_hints)
+                )
+            )
 
     # ~~~~~~~~~~~~~~~~~~~
     # ~~~ API
     # ~~~~~~~~~~~~~~~~~~~
 
+    @instrumented("append")
     def append(
         self,
         key: Item.Key,
@@ -69,59 +536,329 @@ class Storage:
         2. Add the key to the keyDir in-memory structure.
         """
         item = Item(key=key, value=value)
-        data_file_item = DataFileItem.from_item(item=item)
-        active_file_value_position_offset = self._append_to_active_file(
-            data_file_item=data_file_item
+        data_file_item = DataFileItem.from_item(
+            item=item, compression_policy=self.compression_policy
         )
-        self.key_dir.update(
-            key=key,
-            file_path=self.active_data_file.path,
-            value_position=active_file_value_position_offset,
-            value_size=data_file_item.value_size,
-            timestamp=data_file_item.timestamp,
+        with self._write_lock:
+            active_file_value_position_offset = self._append_to_active_file(
+                data_file_item=data_file_item
+            )
+            self._mark_previous_record_as_dead(key=key)
+            self.key_dir.update(
+                key=key,
+                file_path=self.active_data_file.path,
+                value_position=active_file_value_position_offset,
+                value_size=data_file_item.value_size,
+                timestamp=data_file_item.timestamp,
+            )
+            self._active_file_index[key] = (
+                active_file_value_position_offset,
+                data_file_item.value_size,
+                data_file_item.timestamp,
+            )
+            self._update_cached_value(key=key, value=value)
+            wait_for_commit = self.active_data_file.get_commit_waiter()
+        wait_for_commit()
+
+    @instrumented("write_batch")
+    def write_batch(self, items: list[tuple[Item.Key, Item.Value or None]]) -> None:
+        """Atomically writes a batch of key-value pairs (a `None` value deletes the key).
+
+        The whole batch is encoded into one buffer, enclosed between a BEGIN and a COMMIT marker, and appended to the
+        active file with a single write (the active file is rotated at most once, before the write, so that a batch
+        never spans two files). If the batch is not fully written, its items are ignored when rebuilding the index.
+        """
+        if not items:
+            return
+
+        data_file_items = [
+            (
+                DataFileItem.from_item(
+                    item=Item(key=key, value=value),
+                    compression_policy=self.compression_policy,
+                )
+                if value is not None
+                else DataFileItem.from_tombstone(tombstone=Tombstone(key=key))
+            )
+            for key, value in items
+        ]
+        buffer = bytearray(
+            sum(data_file_item.size for data_file_item in data_file_items)
+            + 2 * DataFileItem.METADATA_SIZE
         )
+        offset = BatchMarker.begin(nb_items=len(data_file_items)).pack_into(buffer)
+        # Last write wins within a batch: only the final state of each key is used to update the key_dir
+        updated_entries = {}  # Value positions are relative to the start of the batch
+        deleted_keys = set()
+        final_values = dict(items)
+        for data_file_item in data_file_items:
+            key = data_file_item.key
+            if data_file_item.is_tombstone:
+                updated_entries.pop(key, None)
+                deleted_keys.add(key)
+            else:
+                deleted_keys.discard(key)
+                updated_entries[key] = (
+                    offset + data_file_item.value_position,
+                    data_file_item.value_size,
+                    data_file_item.timestamp,
+                )
+            offset = data_file_item.pack_into(buffer, offset=offset)
+        BatchMarker.commit(nb_items=len(data_file_items)).pack_into(buffer, offset)
+
+        with self._write_lock:
+            self._rotate_active_file_if_too_big(nb_bytes_to_append=len(buffer))
+            batch_offset = self.active_data_file.append_bytes(data=buffer)
+            self.metrics.increment("bytes_written", len(buffer))
+            for key in [*updated_entries, *deleted_keys]:
+                self._mark_previous_record_as_dead(key=key)
+            # Only the final record of each updated key is live in the batch (markers and tombstones are dead)
+            self.dead_bytes[self.active_data_file.path] += len(buffer) - sum(
+                self.get_record_size(key=key, value_size=value_size)
+                for key, (_, value_size, _) in updated_entries.items()
+            )
+            self.key_dir.update_many(
+                file_path=self.active_data_file.path,
+                entries=[
+                    (key, batch_offset + value_position, value_size, timestamp)
+                    for key, (value_position, value_size, timestamp) in (
+                        updated_entries.items()
+                    )
+                ],
+            )
+            self.key_dir.delete_many(keys=list(deleted_keys))
+            for key, (value_position, value_size, timestamp) in updated_entries.items():
+                self._active_file_index[key] = (
+                    batch_offset + value_position,
+                    value_size,
+                    timestamp,
+                )
+            for key in deleted_keys:
+                self._active_file_index[key] = None
+            for key, value in final_values.items():
+                self._update_cached_value(key=key, value=value)
+            wait_for_commit = self.active_data_file.get_commit_waiter()
+        wait_for_commit()
 
+    @instrumented("get")
     def get(self, key: Item.Key) -> Item.Value or None:
         """Returns the value for the key searched.
         If there is no such key in the database, returns None.
+
+        Reads do not take any lock (see `_is_entry_still_valid`): if the entry changed while its value was being read,
+        the read is simply retried.
+        With `verify_checksums`, raises a `CorruptedRecordError` if the record holding the value is corrupted (values
+        served from the value cache are not verified again). A record cut short by the end of its file (truncated file)
+        always raises a `CorruptedRecordError`.
         """
-        key_dir_entry = self.key_dir.get(key)
-        if not key_dir_entry:
-            return None
+        if self.value_cache is not None:
+            value = self.value_cache.get(key)
+            if value is not None:
+                return value
 
-        return File.read(
-            path=key_dir_entry.file_path,
-            start=key_dir_entry.value_position,
-            end=key_dir_entry.value_position + key_dir_entry.value_size,
-        )
+        missing_file_entry = None
+        while True:
+            nb_rotations = self._nb_rotations
+            key_dir_entry = self.key_dir.get(key)
+            if not key_dir_entry:
+                return None
+
+            start = self._get_record_start(key=key, key_dir_entry=key_dir_entry)
+            end = key_dir_entry.value_position + key_dir_entry.value_size
+            try:
+                data = self._read(
+                    path=key_dir_entry.file_path, start=start, size=end - start
+                )
+            except FileNotFoundError:
+                # The file is being renamed (rotation) or deleted (merge): both happen with the write lock held, and
+                # the key_dir points at the new location of the value once the lock is released. The active file is
+                # re-created by every rotation though: an identical entry may point at a record of the next one.
+                if (
+                    key_dir_entry == missing_file_entry
+                    and key_dir_entry.file_path != self.active_data_file.path
+                ):
+                    raise
+                missing_file_entry = key_dir_entry
+                with self._write_lock:
+                    pass
+                continue
+            if len(data) < end - start:
+                if not self._is_entry_still_valid(
+                    key=key, key_dir_entry=key_dir_entry, nb_rotations=nb_rotations
+                ):
+                    # Read from a new active file (the previous one was rotated) that does not hold the record yet
+                    continue
+                # The entry still points at that record: the file itself is truncated
+                raise CorruptedRecordError(
+                    f"Record of {key} is truncated in {key_dir_entry.file_path}"
+                )
+            if self._is_entry_still_valid(
+                key=key, key_dir_entry=key_dir_entry, nb_rotations=nb_rotations
+            ):
+                value = self._decode_value(
+                    data=data, key=key, key_dir_entry=key_dir_entry, data_start=start
+                )
+                self._cache_value(
+                    key=key,
+                    value=value,
+                    key_dir_entry=key_dir_entry,
+                    nb_rotations=nb_rotations,
+                )
+                return value
+
+    @instrumented("multi_get")
+    def multi_get(self, keys: list[Item.Key]) -> dict[Item.Key, Item.Value or None]:
+        """Returns the values for all the keys searched (None for keys that are not in the database).
+
+        All key_dir entries are resolved first and grouped by file. Within each file, values are read in the order of
+        their position, and values that are close to each other (less than `max_read_gap` bytes apart) are fetched
+        with a single read. Values found in the value cache are not read.
+        """
+        values = {key: None for key in keys}
+        nb_rotations = self._nb_rotations
+        entries_per_file = defaultdict(list)
+        for key in values:
+            if self.value_cache is not None:
+                values[key] = self.value_cache.get(key)
+                if values[key] is not None:
+                    continue
+            key_dir_entry = self.key_dir.get(key)
+            if key_dir_entry:
+                entries_per_file[key_dir_entry.file_path].append((key, key_dir_entry))
 
+        for file_path, entries in entries_per_file.items():
+            entries.sort(key=lambda key_and_entry: key_and_entry[1].value_position)
+            for start, end, read_entries in self._coalesce_reads(entries=entries):
+                try:
+                    data = self._read(path=file_path, start=start, size=end - start)
+                except FileNotFoundError:
+                    data = None
+                if data is not None and len(data) < end - start:
+                    # Read from a new active file that does not hold the records yet: they are read one by one
+                    data = None
+                for key, key_dir_entry in read_entries:
+                    if data is None or not self._is_entry_still_valid(
+                        key=key, key_dir_entry=key_dir_entry, nb_rotations=nb_rotations
+                    ):
+                        # The key was updated or moved (e.g. merged) in the meantime
+                        values[key] = self.get(key=key)
+                        continue
+                    values[key] = self._decode_value(
+                        data=data,
+                        key=key,
+                        key_dir_entry=key_dir_entry,
+                        data_start=start,
+                    )
+                    self._cache_value(
+                        key=key,
+                        value=values[key],
+                        key_dir_entry=key_dir_entry,
+                        nb_rotations=nb_rotations,
+                    )
+
+        return values
+
+    def __contains__(self, key: Item.Key) -> bool:
+        return self.key_dir.get(key) is not None
+
+    def keys(self) -> list[Item.Key]:
+        """Returns all the keys of the database (a snapshot: keys written afterwards are not included)."""
+        return self.key_dir.get_keys()
+
+    @instrumented("delete")
     def delete(self, key: Item.Key) -> None:
         """Deletes a record (by adding a tombstone)."""
         data_file_item = DataFileItem.from_tombstone(tombstone=Tombstone(key=key))
-        self._append_to_active_file(data_file_item=data_file_item)
-        self.key_dir.delete(key=key)
+        with self._write_lock:
+            self._append_to_active_file(data_file_item=data_file_item)
+            self._mark_previous_record_as_dead(key=key)
+            self.dead_bytes[self.active_data_file.path] += data_file_item.size
+            self.key_dir.delete(key=key)
+            self._active_file_index[key] = None
+            self._update_cached_value(key=key, value=None)
+            wait_for_commit = self.active_data_file.get_commit_waiter()
+        wait_for_commit()
+
+    def close(self) -> None:
+        """Closes the active file (making all its records durable) and all the file descriptors used for reads, once the
+        hint files of the rotated files have been written.
+        """
+        with self._write_lock:
+            self.active_data_file.close()
+        self._wait_for_hint_files()
+        self.file_handle_pool.close()
 
     def clear(self, delete_directory: bool = False) -> None:
         """Clears the storage space by deleting all the data files.
         The main purpose of this method is to be used to clean up after running tests.
         """
+        self._wait_for_hint_files()
+        self.file_handle_pool.close()
+        if self.value_cache is not None:
+            self.value_cache.clear()
+        self.manifest.clear()
         for filename in os.listdir(self.directory):
             file_path = f"{self.directory}/{filename}"
             os.remove(file_path)
         if delete_directory:
             os.rmdir(self.directory)
 
+    def checkpoint(self) -> None:
+        """Writes a snapshot of the key_dir, along with the list of data files (and offsets in them) that it covers.
+        On the next boot, the key_dir will be loaded from that snapshot, and only the records written after the
+        checkpoint will be read.
+        """
+        with self._write_lock:
+            # Copying the key_dir is much faster than encoding it: writers are only blocked during the copy
+            key_dir = self.key_dir.copy()
+            self.active_data_file.flush_pending_writes()
+            # The active file gets the next sequence number when it is rotated (rotations hold the write lock)
+            next_sequence = self.manifest.get_last_sequence() + 1
+            covered_files = [
+                KeyDirSnapshot.CoveredFile(
+                    path=path,
+                    sequence=(
+                        next_sequence
+                        if path == self.active_data_file.path
+                        else self.manifest.entries[path].sequence
+                    ),
+                    covered_size=self.get_file_size(path=path),
+                    was_active=path == self.active_data_file.path,
+                )
+                for path in self._get_data_file_paths()
+            ]
+
+        entries_per_file = defaultdict(list)
+        for key, key_dir_entry in key_dir:
+            entries_per_file[key_dir_entry.file_path].append(
+                (
+                    key,
+                    key_dir_entry.value_position,
+                    key_dir_entry.value_size,
+                    key_dir_entry.timestamp,
+                )
+            )
+        snapshot = KeyDirSnapshot(
+            covered_files=covered_files, entries_per_file=entries_per_file
+        )
+        snapshot.write(path=f"{self.directory}/{KeyDirSnapshot.FILENAME}")
+
     def rebuild_index(self):
         """Builds the key_dir index.
 
-        The key_dir index is built by:
-        - Reading all hint files (to speed up the index build)
-        - Reading all data files that don't have a hint file associated
-        - For each file read, adding the entry in the key_dir.
+        If a snapshot of the key_dir has been written (see `checkpoint`) and is still valid, it is loaded and only the
+        records written after it are read. Otherwise, the key_dir index is built by:
+        - Reading the hint file of each data file (hint files are written when files are rotated or merged), i.e. only
+        keys and metadata
+        - Reading the data files that don't have a complete hint file associated (e.g. the active file)
+        - For each file read, building a partial index of the file (the most recent entry or tombstone for each key).
+        Files are parsed in parallel if `rebuild_workers` is greater than 1.
+        - Merging the partial indexes, from oldest to most recent file (see `Manifest.get_order`).
+
+        The number of dead bytes of each file is then computed from the rebuilt key_dir.
 
         This should be called at boot up.
         """
-        data_files_without_hint_files, hint_files = self._get_index_rebuild_files()
-        self.key_dir.rebuild(
-            hint_files=hint_files, data_files=data_files_without_hint_files
-        )
+        if not self._rebuild_index_from_snapshot():
+            self._rebuild_index_from_files()
+        self._compute_dead_bytes()
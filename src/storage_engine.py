@@ -1,3 +1,8 @@
+import threading
+
+from src.io_handling.compression import CompressionPolicy
+from src.io_handling.durability import DurabilityPolicy
+from src.merge_scheduler import MergePolicy, MergeScheduler
 from src.storage import Storage
 
 
@@ -9,13 +14,73 @@ class StorageEngine:
         self,
         directory: str = DEFAULT_DIRECTORY,
         max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+        rebuild_workers: int = 1,
+        checkpoint_interval: float or None = None,
+        merge_policy: MergePolicy or None = None,
+        durability_policy: DurabilityPolicy = DurabilityPolicy.FLUSH_PER_WRITE,
+        verify_checksums: bool = False,
+        compression_policy: CompressionPolicy or None = None,
+        merge_compression_policy: CompressionPolicy or None = None,
+        value_cache_size: int = 0,
     ):
-        self.storage = Storage(directory=directory, max_file_size=max_file_size)
-        self._boot_up()
-        # TODO: add call to merge (=> contains the merge worker)
-
-    def _boot_up(self):
-        print("Starting boot up process...")
-        print("Building index...")
-        self.storage.rebuild_index()
-        print("Boot up completed!")
+        self.storage = Storage(
+            directory=directory,
+            max_file_size=max_file_size,
+            rebuild_workers=rebuild_workers,
+            durability_policy=durability_policy,
+            verify_checksums=verify_checksums,
+            compression_policy=compression_policy,
+            merge_compression_policy=merge_compression_policy,
+            value_cache_size=value_cache_size,
+        )
+        # The index is built (from the last snapshot, or by parsing the files) by the storage itself, once
+
+        # When set, fragmented files are merged in the background, following the policy
+        self.merge_scheduler = None
+        if merge_policy is not None:
+            self.merge_scheduler = MergeScheduler(
+                storage=self.storage,
+                merge_policy=merge_policy,
+                file_size_threshold=max_file_size,
+            )
+            self.merge_scheduler.start()
+
+        # When set, a snapshot of the key_dir is written every `checkpoint_interval` seconds (and when closing)
+        self.checkpoint_interval = checkpoint_interval
+        self._stop_event = threading.Event()
+        self._checkpoint_thread = None
+        if checkpoint_interval is not None:
+            self._checkpoint_thread = threading.Thread(
+                target=self._checkpoint_periodically, daemon=True
+            )
+            self._checkpoint_thread.start()
+
+    def _checkpoint_periodically(self):
+        while not self._stop_event.wait(timeout=self.checkpoint_interval):
+            self.storage.checkpoint()
+
+    def stats(self) -> dict:
+        """Returns the metrics of the storage (see `Metrics`): latency histograms of the operations (including merges),
+        counters (bytes written and read, file rotations, cache hits, ...), the size of the key_dir, the size of the
+        value cache (in bytes) and the dead bytes per file.
+        Use `src.metrics.render_prometheus` to expose them to Prometheus.
+        """
+        return {
+            **self.storage.metrics.to_dict(),
+            "key_dir_size": len(self.storage.key_dir),
+            "value_cache_size": (
+                self.storage.value_cache.size
+                if self.storage.value_cache is not None
+                else 0
+            ),
+            "dead_bytes": dict(self.storage.dead_bytes),
+        }
+
+    def close(self):
+        if self.merge_scheduler is not None:
+            self.merge_scheduler.stop()
+        self._stop_event.set()
+        if self._checkpoint_thread is not None:
+            self._checkpoint_thread.join()
+            self.storage.checkpoint()
+        self.storage.close()
@@ -0,0 +1,100 @@
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from src.item import Item
+from src.metrics import Metrics
+
+
+class ValueCache:
+    """LRU cache of values, bounded by a byte budget (the total size of the cached values) rather than by a number of
+    entries: a few large values cannot take the memory of many small ones unnoticed.
+
+    Only the values count towards the budget (keys and bookkeeping add a roughly constant overhead per entry), and
+    values larger than the whole budget are never cached. Hits, misses and evictions are counted in `metrics` (if
+    given), so that the budget can be sized from the hit ratio.
+    """
+
+    def __init__(self, max_size: int, metrics: Metrics or None = None):
+        self.max_size = max_size
+        self.size = 0
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._hits = self.metrics.counters["cache_hits"]
+        self._misses = self.metrics.counters["cache_misses"]
+        self._evictions = self.metrics.counters["cache_evictions"]
+        # Least recently used values first
+        self._values: OrderedDict[Item.Key, Item.Value] = OrderedDict()
+        # Serializes the changes of the cached values (lookups take no lock)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def get(self, key: Item.Key) -> Item.Value or None:
+        """Lookups take no lock (it would cost more than the lookup itself): each operation on the (C implemented)
+        ordered dict is atomic, and the value may only be evicted between the lookup and its move to the end.
+        """
+        value = self._values.get(key)
+        if value is None:
+            self._misses.increment()
+            return None
+        try:
+            self._values.move_to_end(key)
+        except KeyError:
+            pass
+        self._hits.increment()
+        return value
+
+    def _set(self, key: Item.Key, value: Item.Value) -> None:
+        """Must be called with the lock held."""
+        self._remove(key=key)
+        if len(value) > self.max_size:
+            return
+        self._values[key] = value
+        self.size += len(value)
+        nb_evictions = 0
+        while self.size > self.max_size:
+            _, evicted_value = self._values.popitem(last=False)
+            self.size -= len(evicted_value)
+            nb_evictions += 1
+        if nb_evictions:
+            self._evictions.increment(amount=nb_evictions)
+
+    def _remove(self, key: Item.Key) -> None:
+        """Must be called with the lock held."""
+        value = self._values.pop(key, None)
+        if value is not None:
+            self.size -= len(value)
+
+    def put_if(
+        self,
+        key: Item.Key,
+        value: Item.Value,
+        condition: Callable[[], bool] = lambda: True,
+    ) -> None:
+        """Caches a value read from disk, provided that `condition()` holds once the cache is locked.
+
+        The condition is meant to check that the value read is still the current one: as writers update the cache
+        (see `update`) after the key_dir, a value is either cached before the update (and then replaced by it), or not
+        cached at all. A stale value can thus never outlive a write.
+        """
+        with self._lock:
+            if condition():
+                self._set(key=key, value=value)
+
+    def update(self, key: Item.Key, value: Item.Value or None) -> None:
+        """Write-through: replaces the cached value of the key, if any (a None value removes it).
+        Keys that are not cached are not added: a value that was just written is not necessarily read soon.
+        """
+        with self._lock:
+            if key not in self._values:
+                return
+            if value is None:
+                self._remove(key=key)
+            else:
+                self._set(key=key, value=value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+            self.size = 0